@@ -0,0 +1,95 @@
+import argparse
+import time
+
+from src.network import frame
+
+from .common import (
+    connect_raw_peer,
+    raise_fd_limit,
+    recv_data_frame,
+    start_handler,
+    stop_handlers,
+    wait_for,
+)
+
+# * Cost of sending one message to every peer of a hub node
+# *   per-peer send : Node.send_to_node for each peer, payload encoded each time
+# *   broadcast     : Node.broadcast, payload encoded once and frame shared
+# * Time is only the call, writing to socket is done by connection after it
+# * Every peer receive each round before the next, so queue never build up
+# * Run from repository root: python -m benchmarks.bench_broadcast [--asyncio]
+
+PAYLOAD = {"timestamp": "12:00:00", "content": "x" * 2000, "meta": list(range(50))}
+
+
+def measure(sockets, rounds: int, send) -> float:
+    """
+    :param sockets:     socket of every peer, drained after each round
+    :param rounds:      Amount of round
+    :param send:        func() that send PAYLOAD to every peer
+
+    :return:            average second spent in send
+    """
+    total = 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        send()
+        total += time.perf_counter() - start
+        for sock in sockets:
+            recv_data_frame(sock)
+    return total / rounds
+
+
+def run(peers: int, rounds: int, port: int, use_asyncio: bool):
+    hub = start_handler(
+        "hub", port, use_asyncio=use_asyncio, max_connection=peers, backlog=128
+    )
+    sockets = list()
+    try:
+        for i in range(peers):
+            sockets.append(connect_raw_peer(port, "peer{:04d}".format(i)))
+        if not wait_for(lambda: len(hub.connections) == peers):
+            raise RuntimeError(
+                "Only {} of {} peers registered".format(len(hub.connections), peers)
+            )
+
+        node = hub.node
+        per_peer = measure(
+            sockets,
+            rounds,
+            lambda: [node.send_to_node(n, PAYLOAD) for n in hub.connections.all()],
+        )
+        broadcast = measure(sockets, rounds, lambda: node.broadcast(PAYLOAD))
+
+        start = time.perf_counter()
+        for _ in range(peers):
+            frame.encode_payload(PAYLOAD)
+        encode = time.perf_counter() - start
+    finally:
+        stop_handlers(hub)
+        for sock in sockets:
+            sock.close()
+
+    print("{} peers, average of {} rounds:".format(peers, rounds))
+    for name, seconds in (
+        ("per-peer send", per_peer),
+        ("broadcast", broadcast),
+        ("{} encodes".format(peers), encode),
+    ):
+        print("  {:16s}{:8.2f} ms".format(name, seconds * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--peers", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--port", type=int, default=21401)
+    parser.add_argument("--asyncio", action="store_true", help="use AsyncNode")
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    run(args.peers, args.rounds, args.port, args.asyncio)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import argparse
+import datetime
+import timeit
+
+from src.encrypt.elgamal import ElGamal
+from src.network import compression, envelope, frame
+
+# * Chat message encode + decode, envelope against the json path it replaced
+# *   json text     : {"timestamp": iso, "content": text} through json
+# *   glued bytes   : ciphertext + iso timestamp + 2 bytes type, split on marker
+# *   envelope      : envelope.pack_envelope, unpack_envelope
+# * Then compressed size of each envelope kind, with and without dictionary
+# * Run from repository root: python -m benchmarks.bench_envelope
+
+SENDER = "alice"
+TEXTS = (
+    "hello there, how are you doing today?",
+    "did you get the file i sent this morning",
+    "meeting moved to 3pm, same room as last week",
+    "lol yes that is exactly what i meant",
+    "can you check the logs on the staging box when you have a minute",
+    "ok thanks, talk to you tomorrow",
+)
+
+
+def json_text(text: str, sent: datetime.datetime):
+    payload, content_type = frame.encode_payload(
+        {"timestamp": sent.isoformat(), "content": text}
+    )
+    message = frame.decode_payload(payload, content_type)
+    return message["content"], datetime.datetime.fromisoformat(message["timestamp"])
+
+
+def envelope_text(text: str, sent: datetime.datetime):
+    payload, content_type = frame.encode_payload(
+        envelope.pack_envelope(envelope.ENVELOPE_TEXT, SENDER, text.encode("utf-8"))
+    )
+    message = envelope.unpack_envelope(frame.decode_payload(payload, content_type))
+    return message.payload.decode("utf-8"), datetime.datetime.fromtimestamp(
+        message.timestamp / 1e9
+    )
+
+
+def glued_encrypted(ciphertext: bytes, sent: datetime.datetime):
+    packed = ciphertext + sent.isoformat().encode("utf-8") + b"eg"
+    data, scheme = packed[:-2], packed[-2:]
+    body, stamp = data.split(ElGamal.encrypted_message_bytes)
+    return body, scheme.decode("ascii"), datetime.datetime.fromisoformat(stamp.decode())
+
+
+def envelope_encrypted(ciphertext: bytes, sent: datetime.datetime):
+    message = envelope.unpack_envelope(
+        envelope.pack_envelope(
+            envelope.ENVELOPE_ENCRYPTED, SENDER, ciphertext, scheme=b"eg"
+        )
+    )
+    return (
+        message.payload,
+        message.scheme,
+        datetime.datetime.fromtimestamp(message.timestamp / 1e9),
+    )
+
+
+def best_us(func, number: int) -> float:
+    """
+    :return:        best of 3 runs, microsecond per call
+    """
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e6
+
+
+def ratio(codec, packets) -> float:
+    """
+    :return:        compressed bytes / raw bytes over every packet
+    """
+    raw = sum(len(packet) for packet in packets)
+    compressed = sum(
+        len(compression.compress_payload(codec, packet, threshold=0)[0])
+        for packet in packets
+    )
+    return compressed / raw
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=200000, help="calls per run")
+    args = parser.parse_args()
+
+    sent = datetime.datetime.now()
+    key = ElGamal()
+    text = TEXTS[0]
+    ciphertext = ElGamal.pack_to_bytes_message(text, key.public_key)
+
+    print("round trip, best of 3 x {}:".format(args.number))
+    for name, func in (
+        ("json text", lambda: json_text(text, sent)),
+        ("envelope text", lambda: envelope_text(text, sent)),
+        ("glued encrypted", lambda: glued_encrypted(ciphertext, sent)),
+        ("envelope encrypted", lambda: envelope_encrypted(ciphertext, sent)),
+    ):
+        print("  {:20s}{:6.2f} us".format(name, best_us(func, args.number)))
+
+    packed = envelope.pack_envelope(envelope.ENVELOPE_TEXT, SENDER, text.encode())
+    print(
+        "  {:20s}{:6.2f} us".format(
+            "envelope pack",
+            best_us(
+                lambda: envelope.pack_envelope(
+                    envelope.ENVELOPE_TEXT, SENDER, text.encode()
+                ),
+                args.number,
+            ),
+        )
+    )
+    print(
+        "  {:20s}{:6.2f} us".format(
+            "envelope unpack",
+            best_us(lambda: envelope.unpack_envelope(packed), args.number),
+        )
+    )
+
+    json_size = len(
+        frame.encode_payload({"timestamp": sent.isoformat(), "content": text})[0]
+    )
+    print("size of text: json {} B, envelope {} B".format(json_size, len(packed)))
+
+    # * Fresh key and timestamp for each, like separate session
+    kinds = {"text": list(), "public key": list(), "encrypted": list()}
+    for i in range(60):
+        text = TEXTS[i % len(TEXTS)]
+        key = ElGamal()
+        kinds["text"].append(
+            envelope.pack_envelope(envelope.ENVELOPE_TEXT, SENDER, text.encode())
+        )
+        kinds["public key"].append(
+            envelope.pack_envelope(
+                envelope.ENVELOPE_PUBLIC_KEY,
+                SENDER,
+                key.pack_public_key(),
+                scheme=b"eg",
+            )
+        )
+        kinds["encrypted"].append(
+            envelope.pack_envelope(
+                envelope.ENVELOPE_ENCRYPTED,
+                SENDER,
+                ElGamal.pack_to_bytes_message(text, key.public_key),
+                scheme=b"eg",
+            )
+        )
+
+    print("compressed / raw:")
+    for name, packets in kinds.items():
+        print(
+            "  {:12s}zlib {:.3f}, zlib-dict2 {:.3f}".format(
+                name,
+                ratio(compression.get_codec("zlib"), packets),
+                ratio(compression.get_codec("zlib-dict2"), packets),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
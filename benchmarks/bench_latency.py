@@ -0,0 +1,74 @@
+import argparse
+import threading
+import time
+
+from .common import percentile, start_handler, stop_handlers, wait_for
+
+# * Round trip latency of one chat message between two node on loopback
+# * Echo node send every message back, only one message is in flight at a time
+# * So each sample is read path + write path of both node, nothing queued
+# * Run from repository root: python -m benchmarks.bench_latency [--asyncio]
+# * Number in user-002 commit, 100 byte str, threaded:
+# *   100 ms sleep in NodeConnection.run   : p50 100.4 ms, p99 104.3 ms
+# *   selector                             : p50 0.053 ms, p99 0.090 ms
+
+
+def run(rounds: int, size: int, port: int, use_asyncio: bool):
+    """
+    :return:        sorted list of round trip time in second
+    """
+    received = threading.Event()
+
+    def sender_callback(event_type, source_id, dest_id, data):
+        if event_type == "node_message":
+            received.set()
+
+    def echo_callback(event_type, source_id, dest_id, data):
+        if event_type == "node_message":
+            echo.send_to_all_nodes(data)
+
+    sender = start_handler("sender", port, sender_callback, use_asyncio)
+    echo = start_handler("echo", port + 1, echo_callback, use_asyncio)
+    try:
+        sender.connect_to_node("127.0.0.1", port + 1)
+        if not wait_for(lambda: len(sender.connections) and len(echo.connections)):
+            raise RuntimeError("Nodes did not connect")
+
+        message = "x" * size
+        samples = list()
+        for _ in range(rounds):
+            received.clear()
+            start = time.perf_counter()
+            sender.send_to_all_nodes(message)
+            if not received.wait(5):
+                raise RuntimeError("Echo did not come back")
+            samples.append(time.perf_counter() - start)
+    finally:
+        stop_handlers(sender, echo)
+
+    samples.sort()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=1000)
+    parser.add_argument("--size", type=int, default=100, help="bytes of message")
+    parser.add_argument("--port", type=int, default=20601)
+    parser.add_argument("--asyncio", action="store_true", help="use AsyncNode")
+    args = parser.parse_args()
+
+    samples = run(args.rounds, args.size, args.port, args.asyncio)
+    print(
+        "{} rounds, {} bytes: rtt p50 {:.3f} ms, p99 {:.3f} ms, max {:.3f} ms".format(
+            len(samples),
+            args.size,
+            percentile(samples, 0.50) * 1000,
+            percentile(samples, 0.99) * 1000,
+            samples[-1] * 1000,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import argparse
+import time
+
+from .common import (
+    connect_raw_peer,
+    raise_fd_limit,
+    recv_data_frame,
+    rss_mb,
+    start_handler,
+    stop_handlers,
+    wait_for,
+)
+
+# * Many peer connected to one hub node, memory of the hub process as it grow
+# * Peer is a bare socket that did the handshake, so memory is mostly the hub
+# * Then a few broadcast round, every peer must get each, memory must stay flat
+# * Run from repository root: python -m benchmarks.bench_peers [--asyncio]
+# * Peer stay silent, so keep it under heartbeat_timeout, 15 second
+
+
+def format_rss(rss) -> str:
+    return "unknown" if rss is None else "{:.0f} MB".format(rss)
+
+
+def run(peers: int, rounds: int, port: int, use_asyncio: bool):
+    hub = start_handler(
+        "hub", port, use_asyncio=use_asyncio, max_connection=peers, backlog=128
+    )
+    sockets = list()
+    try:
+        print("start rss {}".format(format_rss(rss_mb())))
+        start = time.perf_counter()
+        for i in range(peers):
+            sockets.append(connect_raw_peer(port, "peer{:04d}".format(i)))
+            if (i + 1) % max(peers // 4, 1) == 0:
+                print("{} peers rss {}".format(i + 1, format_rss(rss_mb())))
+
+        if not wait_for(lambda: len(hub.connections) == peers):
+            raise RuntimeError(
+                "Only {} of {} peers registered".format(len(hub.connections), peers)
+            )
+        print(
+            "{} peers connected in {:.2f} s".format(
+                peers, time.perf_counter() - start
+            )
+        )
+
+        for round in range(rounds):
+            message = "round {}".format(round)
+            hub.send_to_all_nodes(message)
+            for sock in sockets:
+                if recv_data_frame(sock) != message.encode("utf-8"):
+                    raise RuntimeError("Peer got wrong message")
+            print("round {} delivered, rss {}".format(round, format_rss(rss_mb())))
+    finally:
+        stop_handlers(hub)
+        for sock in sockets:
+            sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--peers", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--port", type=int, default=21001)
+    parser.add_argument("--asyncio", action="store_true", help="use AsyncNode")
+    args = parser.parse_args()
+
+    limit = raise_fd_limit()
+    if limit is not None and limit < args.peers * 4:
+        print("Open file limit {} might be too low".format(limit))
+    run(args.peers, args.rounds, args.port, args.asyncio)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import socket
+import time
+
+from src.network import NetworkHandler, frame, handshake
+
+try:
+    import resource
+except ImportError:
+    # * Not on windows
+    resource = None
+
+
+def start_handler(id: str, port: int, callback=None, use_asyncio=False, **kwargs):
+    """
+    Start NetworkHandler on loopback, debug print off
+
+    :param id:          ID of the node
+    :param port:        Port to listen on
+    :param callback:    func(type, source_id, dest_id, data), None to drop events
+    :param use_asyncio: Run AsyncNode instead of Node
+    :param kwargs:      Other NetworkHandler argument, ex: max_connection
+
+    :return:            NetworkHandler that is running
+    """
+    handler = NetworkHandler(
+        "127.0.0.1",
+        port,
+        callback=callback,
+        id=id,
+        use_asyncio=use_asyncio,
+        **kwargs,
+    )
+    handler.debug = False
+    handler.node.debug = False
+    handler.start()
+    return handler
+
+
+def stop_handlers(*handlers):
+    """
+    Stop every handler, then wait for all of them
+    """
+    for handler in handlers:
+        handler.stop()
+    for handler in handlers:
+        handler.join()
+
+
+def wait_for(condition, timeout: float = 10.0):
+    """
+    Wait until condition() is true
+
+    :param condition:   func() -> bool
+    :param timeout:     Second to wait at most
+
+    :return:            True if condition is met before timeout
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def percentile(samples, fraction: float):
+    """
+    :param samples:     sorted list of sample
+    :param fraction:    0 - 1, ex: 0.99 for p99
+
+    :return:            sample at fraction of samples
+    """
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+def raise_fd_limit():
+    """
+    Raise soft limit of open file to hard limit, every peer need a few
+
+    :return:            soft limit of open file, None if it is unknown
+    """
+    if resource is None:
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
+def rss_mb():
+    """
+    :return:            Resident memory of this process in MB, None if unknown
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def connect_raw_peer(port: int, id: str, timeout: float = 5.0) -> socket.socket:
+    """
+    Connect and handshake with node on loopback as a bare socket
+    Cost of a peer on our side is a socket, not a whole node
+
+    :param port:        Port of node
+    :param id:          ID we give in hello
+    :param timeout:     Second for connect and handshake
+
+    :return:            socket.socket, handshake is done
+    """
+    deadline = time.monotonic() + timeout
+    sock = socket.create_connection(("127.0.0.1", port), timeout=timeout)
+    # * Node index connection by (host, port) too, so each need it own port
+    port = sock.getsockname()[1]
+    handshake.send_hello(sock, {"id": id, "port": port}, deadline)
+    handshake.recv_hello(sock, deadline)
+    return sock
+
+
+def recv_data_frame(sock: socket.socket, timeout: float = 10.0) -> bytes:
+    """
+    Receive next FRAME_DATA frame, other frame like route and ping is skipped
+
+    :param sock:        socket.socket from connect_raw_peer
+    :param timeout:     Second to wait at most
+
+    :return:            payload of the frame
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        header = handshake.recv_exactly(sock, frame.HEADER_SIZE, deadline)
+        frame_type, _, _, length = frame.unpack_header(header)
+        payload = handshake.recv_exactly(sock, length, deadline)
+        if frame_type == frame.FRAME_DATA:
+            return payload
@@ -1,4 +1,6 @@
+import collections
 import datetime
+import os
 import socket
 import random
 import threading
@@ -10,7 +12,25 @@ import json
 
 from src.encrypt.elgamal import ElGamal
 from src.termui import TerminalUi
-from src.network import NetworkHandler
+from src.network import EventType, NetworkHandler, envelope, flowcontrol, frame
+
+# * Stage of a chat message, from user input on sender to paint on receiver
+# *   encode, encrypt, send     : on sender, each is time spent in it
+# *   recv                      : input on sender to arrival here, wall clock
+# *   parse, decrypt, store     : on receiver, store is buffer to storage
+# *   render                    : storage to paint in TerminalUi.update_log
+# *   total                     : input on sender to paint, wall clock
+LATENCY_STAGES = (
+    "encode",
+    "encrypt",
+    "send",
+    "recv",
+    "parse",
+    "decrypt",
+    "store",
+    "render",
+    "total",
+)
 
 
 class MainController(threading.Thread):
@@ -30,8 +50,13 @@ class MainController(threading.Thread):
 
         # * data_buffer  -> Unsorted list, data append
         # * data_storage -> sorted list
+        # * data_ready   -> set when data_buffer has new data, wake run loop
+        # * data_lock    -> guard both list, data is added from many thread
+        # * only run loop render it, see print_data_routine
         self.data_buffer = []
         self.data_storage = []
+        self.data_ready = threading.Event()
+        self.data_lock = threading.Lock()
 
         # * text_buffer -> sorted str
         self.text_buffer = []
@@ -40,24 +65,39 @@ class MainController(threading.Thread):
         # * Network flag & networking info
         self.is_online = False
         self.is_port_valid = False
-        self.have_peer = False
         self.host = socket.gethostbyname(socket.gethostname())
         self.port = None
 
         # * Peer Info
-        self.peer_id = None
-        self.peer_connection = None
+        # * peers, peer_id -> list of NodeConnection, newest last
+        # * peer might have two, ex: inbound and outbound while reconnecting
+        # * state of peer_id is kept until it last connection is gone
+        # * max_peers, max amount of peer for each direction
+        self.peers = dict()
+        self.max_peers = 8
+
+        # * Flow control, pause shorter than flow_log_threshold second is not shown
+        # * so steady backpressure does not flood the log
+        # * paused_since, (NodeConnection, direction) -> time.monotonic() of pause
+        self.flow_log_threshold = 1.0
+        self.paused_since = dict()
 
         # * Encryption
         self.is_encrypted = False
         self.encryption_message_flag = None
         self.encryption = None
         self.encryption_type = None
-        self.has_sent_pub_key = False
+        self.pub_key_sent_to = set()  # peer_id that already have our pub_key
 
         self.peer_encryption_info = dict()  # peer_id, peer_encryption, peer_pubkey
         # peer_encryption object only for encrypt
 
+        # * Latency tracing, off until !latency on
+        # * latency, LatencyHistogram labelled by stage, None when off
+        # * pending_render, (sent ns, stored ns) of message not painted yet
+        self.latency = None
+        self.pending_render = collections.deque()
+
         # * Supported Encryption
         self.pub_key_ending_bytes = {"eg": bytes("5eg", "UTF-16")}
         self.pub_key_unpacking = {"eg": ElGamal.unpack_public_key}
@@ -72,6 +112,17 @@ class MainController(threading.Thread):
 
         super(MainController, self).__init__()
 
+    @property
+    def have_peer(self) -> bool:
+        """
+        Check whether we have at least one peer
+
+        :param self:    Attritbutes Instance
+
+        :return:        True if connected with any peer
+        """
+        return len(self.peers) > 0
+
     # * PROCESS USER INPUT
     def process_user_input(self, user_input: str):
         """
@@ -96,7 +147,7 @@ class MainController(threading.Thread):
                 port_valid = self.validate_port(port_candidate)
 
                 if ip_valid and port_valid:
-                    if not self.have_peer:
+                    if len(self.peers) < self.max_peers:
                         port_candidate = int(port_candidate)
                         self.network_handler.connect_to_node(
                             ip_candidate, port_candidate
@@ -108,7 +159,7 @@ class MainController(threading.Thread):
                             ),
                         )
                     else:
-                        self.add_data_buffer(" sys ", "Already have peer!")
+                        self.add_data_buffer(" sys ", "Peer limit reached!")
                 else:
                     # not valid
                     self.add_data_buffer(" sys ", "Invalid IP address and/or Port")
@@ -137,72 +188,78 @@ class MainController(threading.Thread):
                         ),
                     )
 
+        elif user_input.startswith("!latency"):
+            self.process_latency_command(user_input.split("!latency")[-1].strip())
+
+        elif user_input.startswith("!send"):
+            self.process_send_command(user_input.split("!send", 1)[-1].strip())
+
         else:
             # sending it to other if we have connection together and are online
-            timestamp = datetime.datetime.now()
+            timestamp_ns = time.time_ns()
             self.add_data_buffer(
-                source=self.username, message=user_input, timestamp=timestamp
+                source=self.username,
+                message=user_input,
+                timestamp=datetime.datetime.fromtimestamp(timestamp_ns / 1e9),
             )
 
-            online_status = self.is_online and self.have_peer
-            if online_status and self.is_encrypted and not self.has_sent_pub_key:
-                packed_pub_key = (
-                    self.encryption.pack_public_key()
-                    + str.encode(timestamp.isoformat())
-                    + str.encode(self.encryption_type, "utf-8")
-                )
-                # print(type(packed_pub_key))
-                self.send_to_peer(packed_pub_key, timestamp)
-
-                #! DEBUG
-                # print(
-                #     "{} : SENDING ENCRYPTION KEYS, with content type [{}], content -> {}".format(
-                #         timestamp, str(type(packed_pub_key))[8:-2], packed_pub_key
-                #     )
-                # )
-                self.has_sent_pub_key = True
-
-                # print(public_key)
-
-            if online_status:
-                # ALWAYS RETURN TRUE
-                if self.peer_id not in self.peer_encryption_info.keys():
-                    self.send_to_peer(user_input, timestamp)
-                    #! DEBUG
-                    # print(
-                    #     "{} : SENDING PLAIN TEXT,  with content type [{}], content -> {}".format(
-                    #         timestamp, str(type(user_input))[8:-2], user_input
-                    #     )
-                    # )
-                else:
-                    # which mean other have use encryption
-                    peer_pub_key = self.peer_encryption_info[self.peer_id]["public_key"]
-                    encrypt_message = self.peer_encryption_info[self.peer_id][
-                        "encryption_function"
-                    ](user_input, peer_pub_key)
-
-                    #  self.peer_encryption_info[self.peer_id]["encryption_type"]
-
-                    enc_type = self.peer_encryption_info[self.peer_id][
-                        "encryption_type"
-                    ]
-                    #! DEBUG
-                    # print(f"CROC {enc_type}")
-                    packed_enc_message = (
-                        encrypt_message
-                        + str.encode(timestamp.isoformat(), "utf-8")
-                        + str.encode(enc_type, "utf-8")
-                    )
-                    self.send_to_peer(packed_enc_message, timestamp)
+            if self.is_online:
+                for peer_id in list(self.peers.keys()):
+                    self.send_user_message(peer_id, user_input, timestamp_ns)
 
-                    #! DEBUG
-                    # print(
-                    #     "{} : SENDING ENCRYPTED DATA,  with content type [{}], content -> {}".format(
-                    #         timestamp, str(type(encrypt_message))[8:-2], encrypt_message
-                    #     )
-                    # )
+    def send_user_message(self, peer_id, user_input: str, timestamp_ns: int):
+        """
+        Send user input to one peer, packed in an envelope
+        Encrypted if that peer have sent us their public key
+
+        :param self:            Attributes Instance
+        :param peer_id:         Id of the peer
+        :param user_input:      Input from user
+        :param timestamp_ns:    Timestamp when user input is made, ns since epoch
+        """
+        if self.is_encrypted and peer_id not in self.pub_key_sent_to:
+            packed_pub_key = envelope.pack_envelope(
+                envelope.ENVELOPE_PUBLIC_KEY,
+                self.username,
+                self.encryption.pack_public_key(),
+                timestamp_ns,
+                scheme=self.encryption_type.encode("ascii"),
+            )
+            # * Control lane, so key is not stuck behind queued messages
+            self.send_to_peer(peer_id, packed_pub_key, stream=frame.STREAM_CONTROL)
+            self.pub_key_sent_to.add(peer_id)
+
+        peer_encryption = self.peer_encryption_info.get(peer_id, None)
+        if peer_encryption is None:
+            started_ns = time.perf_counter_ns()
+            packed_message = envelope.pack_envelope(
+                envelope.ENVELOPE_TEXT,
+                self.username,
+                user_input.encode("utf-8"),
+                timestamp_ns,
+            )
+            self.trace("encode", started_ns)
+        else:
+            # which mean other have use encryption
+            started_ns = time.perf_counter_ns()
+            encrypt_message = peer_encryption["encryption_function"](
+                user_input, peer_encryption["public_key"]
+            )
+            self.trace("encrypt", started_ns)
+
+            started_ns = time.perf_counter_ns()
+            packed_message = envelope.pack_envelope(
+                envelope.ENVELOPE_ENCRYPTED,
+                self.username,
+                encrypt_message,
+                timestamp_ns,
+                scheme=peer_encryption["encryption_type"].encode("ascii"),
+            )
+            self.trace("encode", started_ns)
 
-                # if encryption != None , then process it accordingly
+        started_ns = time.perf_counter_ns()
+        self.send_to_peer(peer_id, packed_message)
+        self.trace("send", started_ns)
 
     def process_username(self, username: str) -> str:
         """
@@ -252,98 +309,94 @@ class MainController(threading.Thread):
         :param network_data:            Data that is sent
         """
 
-        if isinstance(network_data, bytes):
-            # further processing, for example encryption
-            #! DEBUG
-            # print("FOUND some BYTES")
+        if envelope.is_envelope(network_data):
+            started_ns = time.perf_counter_ns()
+            try:
+                message = envelope.unpack_envelope(network_data)
+            except envelope.EnvelopeError:
+                self.add_data_buffer(source=" sys ", message="Invalid message")
+                return
+            self.trace("parse", started_ns)
+            self.trace("recv", message.timestamp, clock=time.time_ns)
+            self.process_envelope(source_id, message)
 
-            # get last two bytes -> encryption type
-            data, enc_type = network_data[:-2], network_data[-2:]
-
-            # identyfy
-            enc_type = bytes.decode(enc_type, "utf-8")
-
-            #! DEBUG
-            # print(f"DATA : {data}")
-            # print(f"ENCRYPTION TYPE : {enc_type}")
-
-            match enc_type:
-                case "eg":
-                    # check pub_key, enc_message
-                    if self.pub_key_ending_bytes[enc_type] in data:
-                        #! DEBUG
-                        # print("KEY RECEIVED")
-
-                        data, timestamp = data.split(
-                            self.pub_key_ending_bytes[enc_type]
-                        )
-
-                        pub_key = self.pub_key_unpacking[enc_type](data)
+        # * Raw str, sent without envelope
+        elif isinstance(network_data, str):
+            self.add_data_buffer(source=source_id, message=str(network_data))
 
-                        # so we now what our peer use as encryption
-                        self.peer_encryption_info[source_id] = {
-                            "encryption_type": "eg",
-                            "public_key": pub_key,
-                            "encryption_function": self.encryption_function[enc_type],
-                        }
-                    elif self.message_ending_bytes[enc_type] in data:
-                        #! DEBUG
-                        # print("MESSAGE RECEIVED")
+        else:
+            self.add_data_buffer(source=" sys ", message="Unidentified message")
 
-                        data, timestamp = data.split(
-                            self.message_ending_bytes[enc_type]
-                        )
+    def process_envelope(self, source_id, message: envelope.Envelope):
+        """
+        Process envelope from our peer
 
-                        timestamp = bytes.decode(timestamp)
+        :param self:            Attributes Instance
+        :param source_id:       Id of our peer, the sender
+        :param message:         envelope.Envelope that is received
+        """
+        timestamp = datetime.datetime.fromtimestamp(message.timestamp / 1e9)
 
-                        if self.is_encrypted:
-                            ciphers = self.encryption.unpack_encrypted_message(data)
-                            message = self.encryption.decrypt(ciphers)
+        # * sender is written by the peer, so it can be anyone
+        # * name shown is source_id, id the peer is connected or routed as
+        if message.sender != source_id:
+            self.add_data_buffer(
+                " sys ", "{} sent a message as {}".format(source_id, message.sender)
+            )
 
-                            self.add_data_buffer(
-                                source=source_id,
-                                message=message,
-                                timestamp=datetime.datetime.fromisoformat(timestamp),
-                            )
-                        else:
-                            print("Unknown bytes, we are not using encryption")
+        match message.kind:
+            case envelope.ENVELOPE_TEXT:
+                self.add_data_buffer(
+                    source=source_id,
+                    message=message.payload.decode("utf-8", errors="replace"),
+                    timestamp=timestamp,
+                    sent_ns=message.timestamp,
+                )
 
-                    # self.pub_key_unpacking = {"eg": ElGamal.unpack_public_key}
+            case envelope.ENVELOPE_PUBLIC_KEY if (
+                message.scheme in self.pub_key_unpacking
+            ):
+                pub_key = self.pub_key_unpacking[message.scheme](
+                    message.payload.removesuffix(
+                        self.pub_key_ending_bytes[message.scheme]
+                    )
+                )
 
-                case _:
-                    self.add_data_buffer(
-                        source=" sys ", message="Unidentified encrypted message"
+                # so we now what our peer use as encryption
+                self.peer_encryption_info[source_id] = {
+                    "encryption_type": message.scheme,
+                    "public_key": pub_key,
+                    "encryption_function": self.encryption_function[message.scheme],
+                }
+                return
+
+            case envelope.ENVELOPE_ENCRYPTED if (
+                self.is_encrypted and message.scheme == self.encryption_type
+            ):
+                started_ns = time.perf_counter_ns()
+                ciphers = self.encryption.unpack_encrypted_message(
+                    message.payload.removesuffix(
+                        self.message_ending_bytes[message.scheme]
                     )
-        elif isinstance(network_data, str):
-            self.add_data_buffer(source=source_id, message=str(network_data))
+                )
+                decrypted = self.encryption.decrypt(ciphers)
+                self.trace("decrypt", started_ns)
 
-        # Default send to peer data type
-        # but some error might occur and recv other type
-        elif isinstance(network_data, dict):
-            #! DEBUG
-            # print(type(network_data), type(network_data["content"]))
-            t = network_data["timestamp"]
-            d = str(type(network_data["content"]))[8:-2]
-            cont = network_data["content"]
-            # print(f"{t} : Receving dict, with content type [{d}], content -> {cont} ")
-
-            # anticipate if data send to peer is str or other
-            if isinstance(network_data["content"], str):
-                # cont = network_data["content"]
-
-                # print(f"{t} : Receving dict, with content type str")
                 self.add_data_buffer(
                     source=source_id,
-                    message=network_data["content"],
-                    timestamp=datetime.datetime.fromisoformat(
-                        network_data["timestamp"]
-                    ),
+                    message=decrypted,
+                    timestamp=timestamp,
+                    sent_ns=message.timestamp,
                 )
-            # if content != str, maybe encrpted ?????
-            # content == bytes than def encrypted ,
-            # either message, or pubkey
 
-            self.print_data_routine()
+            case envelope.ENVELOPE_ENCRYPTED:
+                print("Unknown bytes, we are not using encryption")
+                return
+
+            case _:
+                self.add_data_buffer(
+                    source=" sys ", message="Unidentified encrypted message"
+                )
 
     # * Validation
     def validate_ip(self, ip: str) -> bool:
@@ -377,44 +430,26 @@ class MainController(threading.Thread):
             return False
 
     # * Send to peer
-    def send_to_peer(self, data, timestamp: datetime.datetime):
+    def send_to_peer(self, peer_id, data: bytes, stream=None):
         """
-        Sending data to self.peer_connection, our peer
-        Data by default will be str or bytes
-        Str for raw message
-        Bytes for encrypted message & pubkey
+        Sending envelope to one of self.peers
 
         :param self:        Attributes Instance
-        :param data:        Data to send
-        :param timestamp:   Timestamp when data created
+        :param peer_id:     Id of the peer
+        :param data:        Envelope to send, from envelope.pack_envelope
+        :param stream:      frame.STREAM_*, None to pick by size
         """
 
-        # here add timestamp
-        # translate timestamp to iso
-
-        # data str is raw, no encryption
-        if isinstance(data, str):
-            package_format = {"timestamp": timestamp.isoformat(), "content": data}
-            self.network_handler.send_to_node(package_format, self.peer_connection)
-
-        # bytes can only be received from encryption class
-        # as encode_to_bytes function
-        elif isinstance(data, bytes):
-            # should it be further packed ?
-
-            # print(json.loads(data))
-            # package_format = {"timestamp": timestamp.isoformat(), "content": data}
-
-            # HERE NEED TO BE BYTES not
-            self.network_handler.send_to_node(data, self.peer_connection)
+        peer_connections = self.peers.get(peer_id, None)
+        if not peer_connections:
+            return
 
-        # dict -> sending pubkey
-        # {timestamp: datetime.datetime
-        #  content  :
-        # }
+        self.network_handler.send_to_node(data, peer_connections[-1], stream)
 
     # * add Data_Buffer && data storage && text_buffer
-    def add_data_buffer(self, source, message, timestamp=datetime.datetime.now()):
+    def add_data_buffer(
+        self, source, message, timestamp=datetime.datetime.now(), sent_ns=None
+    ):
         """
         Add data to self.data_buffer
         list of dict -> list<dict>
@@ -423,6 +458,8 @@ class MainController(threading.Thread):
         :param source:      Source of the data, originator
         :param message:     Message, data to display in view
         :param timestamp:   Timestamp, default: now
+        :param sent_ns:     Timestamp of message from peer, ns since epoch
+                            Traced to render when latency tracing is on
         """
 
         data = {
@@ -430,7 +467,11 @@ class MainController(threading.Thread):
             "timestamp": timestamp,
             "message": message,
         }
-        self.data_buffer.append(data)
+        if sent_ns is not None and self.latency is not None:
+            data["trace"] = (sent_ns, time.perf_counter_ns())
+        with self.data_lock:
+            self.data_buffer.append(data)
+        self.data_ready.set()
 
     def update_data_storage(self):
         """
@@ -439,13 +480,25 @@ class MainController(threading.Thread):
         Then added to the end of data_storage
 
         :param self:        Attributes Instance
+
+        :return:            list of (sent ns, stored ns) of traced data stored
         """
 
-        if len(self.data_buffer) > 0:
-            inter = self.data_buffer.copy()
-            inter = self.quicksort_dict_in_list(inter)
+        stored = []
+        with self.data_lock:
+            inter = self.data_buffer
             self.data_buffer = []
-            self.data_storage = self.data_storage + inter
+        if len(inter) > 0:
+            inter = self.quicksort_dict_in_list(inter)
+            with self.data_lock:
+                self.data_storage = self.data_storage + inter
+
+            for data in inter:
+                trace = data.pop("trace", None)
+                if trace is not None:
+                    self.trace("store", trace[1])
+                    stored.append((trace[0], time.perf_counter_ns()))
+        return stored
 
     def update_text_buffer(self, amount=30):
         """
@@ -456,7 +509,9 @@ class MainController(threading.Thread):
         :param amount:      Amount of data to be processed
         """
         self.text_buffer = []
-        for elm in self.data_storage.copy()[-1 * amount :]:
+        with self.data_lock:
+            data_storage = self.data_storage[-1 * amount :]
+        for elm in data_storage:
             self.text_buffer.append(self.create_text_from_data(elm))
 
     def reset_data_storage(self):
@@ -465,7 +520,8 @@ class MainController(threading.Thread):
 
         :param self:        Attributes Instance
         """
-        self.data_storage = []
+        with self.data_lock:
+            self.data_storage = []
 
     def pop_data_storage(self, n: int):
         """
@@ -476,8 +532,9 @@ class MainController(threading.Thread):
         :param n:           Amount of data to remove
         """
 
-        for i in range(n):
-            self.data_storage.pop()
+        with self.data_lock:
+            for i in range(n):
+                self.data_storage.pop()
 
     def create_text_from_data(self, data: dict):
         """
@@ -497,28 +554,36 @@ class MainController(threading.Thread):
 
     def print_data_routine(self):
         """
-        Method to print data to UI
+        Method to print data to UI, only run loop call it
+        Other thread add_data_buffer, that wake run loop
 
         :param self:        Attributes Instance
         """
 
-        self.update_data_storage()
+        stored = self.update_data_storage()
         self.update_text_buffer()
         self.terminal_ui.text_buffer = self.text_buffer
 
-    def update_peer_ui(self, info=None):
+        # * Only after text_buffer is set, so next paint is the one that show it
+        self.pending_render.extend(stored)
+
+    def update_peer_ui(self):
         """
-        Update peer id, to UI
+        Update peer info to UI
+        peer id when only one peer, amount of peer otherwise
 
         :param self:        Attributes Instance
-        :param info:        peer id, default:None
         """
-        if info is not None:
+        if len(self.peers) == 0:
+            self.terminal_ui.update_peer_info(self.terminal_ui.log_window_border)
+        elif len(self.peers) == 1:
             self.terminal_ui.update_peer_info(
-                self.terminal_ui.log_window_border, info=self.peer_id
+                self.terminal_ui.log_window_border, info=next(iter(self.peers))
             )
         else:
-            self.terminal_ui.update_peer_info(self.terminal_ui.log_window_border)
+            self.terminal_ui.update_peer_info(
+                self.terminal_ui.log_window_border, peer_count=len(self.peers)
+            )
 
     # * NETWORKING
     def get_port(self):
@@ -528,7 +593,6 @@ class MainController(threading.Thread):
         :param self:        Attributes Instance
         """
         self.add_data_buffer(" sys ", message="Pick a port : ")
-        self.print_data_routine()
 
     def start_network_handler(self):
         """
@@ -539,16 +603,17 @@ class MainController(threading.Thread):
         self.network_handler = NetworkHandler(
             self.host,
             self.port,
-            callback=self.network_callback_handler,
             id=self.username,
+            max_connection=self.max_peers,
         )
+        for event_type, handler in self.network_event_handlers().items():
+            self.network_handler.event_bus.subscribe(event_type, handler)
         self.network_handler.start()
 
         server_info = "Online @{}:{}".format(self.host, self.port)
         self.terminal_ui.update_server_info(
             win=self.terminal_ui.log_window_border, info=server_info
         )
-        self.print_data_routine()
 
     # * Thread
     def stop(self):
@@ -559,6 +624,7 @@ class MainController(threading.Thread):
         """
 
         self.terminate_flag.set()
+        self.data_ready.set()
 
     def run(self):
         """
@@ -570,19 +636,19 @@ class MainController(threading.Thread):
 
         # Get uname
         self.add_data_buffer(" sys ", message="Username max 5 char. : ")
-        self.print_data_routine()
 
         # start NetworkHandler
 
+        # * Only print when there is new data, instead of spinning
         while not self.terminate_flag.is_set():
+            self.data_ready.wait()
+            self.data_ready.clear()
             self.print_data_routine()
 
         # * Send stop request
         self.terminal_ui.stop()
         self.network_handler.stop()
 
-        time.sleep(1)
-
         # * When finished, join it
         self.terminal_ui.join()
         self.network_handler.join()
@@ -596,12 +662,13 @@ class MainController(threading.Thread):
         :param type:        type of callback called from terminal UI
         :param user_input:  User input from terminal UI
         """
-        if self.counter == 0:
+        if type == "log_painted":
+            self.log_painted()
+        elif self.counter == 0:
             self.username = self.process_username(user_input)
             self.counter = self.counter + 1
-            self.add_data_buffer(" sys ", "Welcome, {}".format(self.username))
             self.reset_data_storage()
-            self.print_data_routine()
+            self.add_data_buffer(" sys ", "Welcome, {}".format(self.username))
 
             # show username
             self.terminal_ui.update_user_info(
@@ -619,56 +686,285 @@ class MainController(threading.Thread):
             self.process_user_input(user_input=user_input)
             # print("user_input_callback: ", user_input)
 
-    def network_callback_handler(self, callback_type, source_id, dest_id, data):
+    def network_event_handlers(self) -> dict:
         """
-        Handle callback from Network Handler
+        Dispatch table of event from Network Handler
+        Handler run on event bus thread, not on the socket thread
 
         :param self:            Attributes Instance
-        :param callback_type:   type of callback called from Node
-        :param source_id:       source ID
-        :param dest_id:         destination ID
-        :param data:            data, that been sent from network handler
-
-        """
-        # (callback_type, source_id, dest_id, data)
-        match callback_type:
-            case "server_started":
-                self.is_online = True
-                self.add_data_buffer(" sys ", "Server started by {}".format(data))
-            case "outbound_node_connected":
-                # save peer_id
-                self.peer_id = dest_id
-                self.peer_connection = self.network_handler.conn_info[self.peer_id]
-                self.have_peer = True
-                self.add_data_buffer(" sys ", data)
-                self.update_peer_ui(info=self.peer_id)
-
-            case "outbound_node_disconnected":
-                # delete peer
-                self.peer_id = None
-                self.peer_connection = None
-                self.have_peer = False
-                self.add_data_buffer(" sys ", data)
-                self.update_peer_ui()
-
-            case "inbound_node_connected":
-                # save peer_id
-                self.peer_id = source_id
-                self.peer_connection = self.network_handler.conn_info[self.peer_id]
-                self.have_peer = True
-                self.add_data_buffer(" sys ", data)
-                self.update_peer_ui(info=self.peer_id)
-
-            case "inbound_node_disconnected":
-                # delete peer
-                self.peer_id = None
-                self.peer_connection = None
-                self.have_peer = False
-                self.add_data_buffer(" sys ", data)
-                self.update_peer_ui()
-
-            case "node_message":
-                self.process_network_message(source_id, dest_id, data)
+
+        :return:                dict of EventType -> func(event)
+        """
+        return {
+            EventType.SERVER_STARTED: self.on_server_started,
+            EventType.OUTBOUND_NODE_CONNECTED: self.on_outbound_node_connected,
+            EventType.OUTBOUND_NODE_DISCONNECTED: self.on_outbound_node_disconnected,
+            EventType.INBOUND_NODE_CONNECTED: self.on_inbound_node_connected,
+            EventType.INBOUND_NODE_DISCONNECTED: self.on_inbound_node_disconnected,
+            EventType.NODE_MESSAGE: self.on_node_message,
+            EventType.NODE_CONTROL: self.on_node_control,
+            EventType.NODE_FLOW_CONTROL: self.on_node_flow_control,
+            EventType.NODE_FILE_PROGRESS: self.on_node_file_progress,
+        }
+
+    def on_server_started(self, event):
+        """
+        Our node is listening, we are online
+
+        :param self:        Attributes Instance
+        :param event:       Event from Network Handler
+        """
+        self.is_online = True
+        self.add_data_buffer(" sys ", "Server started by {}".format(event.data))
+
+    def on_outbound_node_connected(self, event):
+        """
+        We connected to a peer
+
+        :param self:        Attributes Instance
+        :param event:       Event from Network Handler
+        """
+        self.add_peer(event.dest_id, event.connection)
+        self.add_data_buffer(" sys ", event.data)
+
+    def on_outbound_node_disconnected(self, event):
+        """
+        Peer we connected to is gone
+
+        :param self:        Attributes Instance
+        :param event:       Event from Network Handler
+        """
+        self.remove_peer(event.dest_id, event.connection)
+        self.add_data_buffer(" sys ", event.data)
+
+    def on_inbound_node_connected(self, event):
+        """
+        Peer connected to us
+
+        :param self:        Attributes Instance
+        :param event:       Event from Network Handler
+        """
+        self.add_peer(event.source_id, event.connection)
+        self.add_data_buffer(" sys ", event.data)
+
+    def on_inbound_node_disconnected(self, event):
+        """
+        Peer that connected to us is gone
+
+        :param self:        Attributes Instance
+        :param event:       Event from Network Handler
+        """
+        self.remove_peer(event.source_id, event.connection)
+        self.add_data_buffer(" sys ", event.data)
+
+    def on_node_message(self, event):
+        """
+        Message from a peer, direct or routed
+
+        :param self:        Attributes Instance
+        :param event:       Event from Network Handler
+        """
+        self.process_network_message(event.source_id, event.dest_id, event.data)
+
+    def on_node_control(self, event):
+        """
+        Control notice from a peer, ex: reason it is closing
+
+        :param self:        Attributes Instance
+        :param event:       Event from Network Handler
+        """
+        self.add_data_buffer(" sys ", "{}: {}".format(event.source_id, event.data))
+
+    def on_node_flow_control(self, event):
+        """
+        Byte budget of a peer is paused or resumed
+        Shown once resumed, only if it was paused for flow_log_threshold or more
+
+        :param self:        Attributes Instance
+        :param event:       Event from Network Handler
+        """
+        key = (event.connection, event.data["direction"])
+        if event.data["paused"]:
+            self.paused_since.setdefault(key, time.monotonic())
+            return
+
+        paused_since = self.paused_since.pop(key, None)
+        if paused_since is None:
+            return
+        paused_for = time.monotonic() - paused_since
+        if paused_for < self.flow_log_threshold:
+            return
+
+        self.add_data_buffer(
+            " sys ",
+            "{} {} was paused for {:.1f}s".format(
+                event.data["direction"], event.source_id, paused_for
+            ),
+        )
+
+    def on_node_file_progress(self, event):
+        """
+        File transfer with a peer made progress, is done, or failed
+
+        :param self:        Attributes Instance
+        :param event:       Event from Network Handler
+        """
+        progress = event.data
+        if progress["error"] is not None:
+            status = "stopped at {} bytes, {}".format(
+                progress["offset"], progress["error"]
+            )
+        elif progress["done"] and progress["path"] is not None:
+            status = "saved to {}".format(progress["path"])
+        elif progress["done"]:
+            status = "done"
+        else:
+            status = "{:.0%}".format(
+                progress["offset"] / progress["size"] if progress["size"] else 1
+            )
+        self.add_data_buffer(
+            " sys ",
+            "File {} {} {}: {}".format(
+                progress["name"],
+                "to" if progress["direction"] == "send" else "from",
+                event.source_id,
+                status,
+            ),
+        )
+
+    # * File transfer
+    def process_send_command(self, path: str):
+        """
+        Process !send command, send file at path to every peer
+        Sending same file again resume it where peer stopped
+
+        :param self:        Attributes Instance
+        :param path:        Text after !send, path of the file
+        """
+        if path == "":
+            self.add_data_buffer(" sys ", "Usage: !send <path>")
+        elif not os.path.isfile(path):
+            self.add_data_buffer(" sys ", "{} is not a file".format(path))
+        elif not self.have_peer:
+            self.add_data_buffer(" sys ", "No peer to send {} to".format(path))
+        elif self.network_handler.send_file(path):
+            self.add_data_buffer(" sys ", "Offering {}".format(os.path.basename(path)))
+        else:
+            self.add_data_buffer(" sys ", "Can't send {}".format(path))
+
+    # * Latency tracing
+    def process_latency_command(self, command: str):
+        """
+        Process !latency command
+        !latency on, !latency off, or !latency to show every stage
+
+        :param self:        Attributes Instance
+        :param command:     Text after !latency
+        """
+        match command:
+            case "on":
+                # * Kept in node metrics, so metrics dump has it too
+                self.latency = self.network_handler.node.metrics.latency(
+                    "message_stage_seconds",
+                    "Time spent by chat message in each stage",
+                    label="stage",
+                )
+                self.add_data_buffer(" sys ", "Latency tracing on")
+            case "off":
+                self.latency = None
+                self.pending_render.clear()
+                self.add_data_buffer(" sys ", "Latency tracing off")
+            case "":
+                self.show_latency()
+            case _:
+                self.add_data_buffer(" sys ", "Usage: !latency [on|off]")
+
+    def show_latency(self):
+        """
+        Show count, p50, p99 and max of every stage traced so far
+
+        :param self:        Attributes Instance
+        """
+        if self.latency is None:
+            self.add_data_buffer(" sys ", "Latency tracing is off, !latency on")
+            return
+
+        values = self.latency.values()
+        for stage in LATENCY_STAGES:
+            value = values.get(stage, None)
+            if value is None:
+                continue
+            self.add_data_buffer(
+                " sys ",
+                "{:<7} n={} p50={:.3f}ms p99={:.3f}ms max={:.3f}ms".format(
+                    stage,
+                    value["count"],
+                    value["percentiles"]["0.5"] * 1000,
+                    value["percentiles"]["0.99"] * 1000,
+                    value["max"] * 1000,
+                ),
+            )
+
+    def trace(self, stage: str, started_ns: int, clock=time.perf_counter_ns):
+        """
+        Record time since started_ns into stage, nothing when tracing is off
+
+        :param self:        Attributes Instance
+        :param stage:       One of LATENCY_STAGES
+        :param started_ns:  Start of the stage, read from clock
+        :param clock:       time.perf_counter_ns, or time.time_ns across host
+        """
+        latency = self.latency
+        if latency is not None:
+            latency.observe_ns(clock() - started_ns, stage)
+
+    def log_painted(self):
+        """
+        TerminalUi painted text_buffer, every pending message is rendered
+
+        :param self:        Attributes Instance
+        """
+        while self.pending_render:
+            sent_ns, stored_ns = self.pending_render.popleft()
+            self.trace("render", stored_ns)
+            self.trace("total", sent_ns, clock=time.time_ns)
+
+    # * Peer
+    def add_peer(self, peer_id, connection):
+        """
+        Save newly connected peer
+
+        :param self:        Attributes Instance
+        :param peer_id:     Id of the peer
+        :param connection:  NodeConnection with the peer, None is ignored
+        """
+        if connection is None:
+            return
+        self.peers.setdefault(peer_id, []).append(connection)
+        self.update_peer_ui()
+
+    def remove_peer(self, peer_id, connection):
+        """
+        Forget disconnected connection of peer
+        Every state of peer is deleted once it last connection is gone
+
+        :param self:        Attributes Instance
+        :param peer_id:     Id of the peer
+        :param connection:  NodeConnection that is disconnected
+        """
+        for direction in (flowcontrol.SEND, flowcontrol.RECV):
+            self.paused_since.pop((connection, direction), None)
+
+        peer_connections = self.peers.get(peer_id, [])
+        if connection in peer_connections:
+            peer_connections.remove(connection)
+        if peer_connections:
+            return
+
+        self.peers.pop(peer_id, None)
+        self.peer_encryption_info.pop(peer_id, None)
+        self.pub_key_sent_to.discard(peer_id)
+        self.update_peer_ui()
 
     # * Utils
     def quicksort_dict_in_list(self, unsorted_list, key="timestamp") -> list:
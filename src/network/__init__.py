@@ -9,6 +9,28 @@ __all__ = [
     "nodeconnection",
     "NetworkHandler",
     "networkhandler",
+    "AsyncNode",
+    "AsyncNodeConnection",
+    "asyncnode",
+    "ConnectionRegistry",
+    "connectionregistry",
+    "DedupCache",
+    "gossip",
+    "RoutingTable",
+    "routing",
+    "compression",
+    "envelope",
+    "ByteBudget",
+    "flowcontrol",
+    "RttEstimator",
+    "heartbeat",
+    "MetricsRegistry",
+    "metrics",
+    "Event",
+    "EventBus",
+    "EventType",
+    "eventbus",
+    "filetransfer",
 ]
 
 
@@ -19,3 +41,11 @@ __all__ = [
 from .node import Node
 from .nodeconnection import NodeConnection
 from .networkhandler import NetworkHandler
+from .asyncnode import AsyncNode, AsyncNodeConnection
+from .connectionregistry import ConnectionRegistry
+from .gossip import DedupCache
+from .routing import RoutingTable
+from .flowcontrol import ByteBudget
+from .heartbeat import RttEstimator
+from .metrics import MetricsRegistry
+from .eventbus import Event, EventBus, EventType
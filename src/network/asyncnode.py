@@ -0,0 +1,856 @@
+import asyncio
+import collections
+import concurrent.futures
+import threading
+import time
+
+from . import filetransfer, flowcontrol, frame, heartbeat
+from .connectionregistry import INBOUND, OUTBOUND
+from .handshake import MAX_HELLO_SIZE, HandshakeError, pack_hello, unpack_hello
+from .node import Node
+
+
+class AsyncNodeConnection:
+    def __init__(
+        self, main_node, reader, writer, id: str, host: str, port: int, codec=None
+    ):
+        """
+        Constructor of AsyncNodeConnection class
+        Counterpart of NodeConnection that lives on AsyncNode event loop
+        Instead of having its own thread
+
+        :param main_node:       AsyncNode object, Node that create this connection
+        :param reader:          asyncio.StreamReader connected to other client
+        :param writer:          asyncio.StreamWriter connected to other client
+        :param id:              ID of other client
+        :param host:            IP address of other client
+        :param port:            Port of other client
+        :param codec:           Compression codec agreed on handshake, None for no
+        """
+
+        # * Main node, creator of this AsyncNodeConnection instances
+        self.main_node = main_node
+
+        # * stream pair, connected to other client
+        self.reader = reader
+        self.writer = writer
+
+        # * id   : id of other client
+        # * host : host of other client
+        # * port : port of other client
+        self.id = str(id)
+        self.host = host
+        self.port = port
+
+        # * codec, compress payload bigger than main_node.compression_threshold
+        self.codec = codec
+
+        # * send_budget, bytes handed to event loop, not written to socket yet
+        # * recv_budget, bytes of frame that is being processed
+        self.send_budget = flowcontrol.ByteBudget(
+            flowcontrol.SEND,
+            main_node.send_high_watermark,
+            main_node.send_low_watermark,
+            main_node.send_buffer_limit,
+            on_change=self.budget_changed,
+        )
+        self.recv_budget = flowcontrol.ByteBudget(
+            flowcontrol.RECV,
+            main_node.recv_high_watermark,
+            main_node.recv_low_watermark,
+            on_change=self.budget_changed,
+        )
+
+        # * latency, rtt and jitter from ping, last time node sent anything
+        self.latency = heartbeat.RttEstimator()
+
+        # * parsed_size, encoded bytes of last packet parsed by parse_packet
+        # * event made from it hold that much of recv_budget, whatever it type
+        self.parsed_size = 0
+
+        # * can_read, cleared while reading is paused
+        # * StreamReader stop reading socket when it buffer is full
+        self.can_read = asyncio.Event()
+        self.can_read.set()
+
+        # * can_send, cleared while send budget is paused
+        self.can_send = asyncio.Event()
+        self.can_send.set()
+
+        # * File transfer, transfer id -> filetransfer.FileTransfer
+        # * sending_files, accepted outgoing file, sent by file_task in turn
+        self.outgoing_files = dict()
+        self.incoming_files = dict()
+        self.sending_files = collections.deque()
+        self.file_task = None
+
+        # * Transport tell writer to pause as soon as anything is buffered
+        # * So drain wait until buffer is empty, and budget can be released
+        # * unflushed, bytes written to transport that is not released yet
+        self.writer.transport.set_write_buffer_limits(high=0)
+        self.unflushed = 0
+        self.drain_task = None
+
+        self.main_node.debug_print(
+            "AsyncNodeConnection : Started with {} @{}:{}".format(
+                self.id, self.host, self.port
+            )
+        )
+
+    async def run(self):
+        """
+        Coroutine that receive data until other client disconnect
+        When data received, node_message from main_node will be invoked
+
+        :param self:    Instances attributes
+        """
+        try:
+            while True:
+                try:
+                    await self.can_read.wait()
+                    header = await self.reader.readexactly(frame.HEADER_SIZE)
+                    frame_type, content_type, flags, length = frame.unpack_header(
+                        header
+                    )
+                    self.check_length(length)
+                    packet = await self.reader.readexactly(length)
+
+                    frame_size = frame.HEADER_SIZE + length
+                    self.main_node.metric_bytes_received.inc(frame_size, self.id)
+                    self.main_node.metric_frames_received.inc(1, self.id)
+                    self.main_node.metric_message_bytes.observe(
+                        frame_size, flowcontrol.RECV
+                    )
+                    self.recv_budget.acquire(frame_size)
+                    try:
+                        self.main_node.node_frame(
+                            self, frame_type, content_type, flags, packet
+                        )
+                    finally:
+                        self.recv_budget.release(frame_size)
+
+                # * Other client closed the connection
+                except asyncio.IncompleteReadError:
+                    break
+
+                except frame.FrameError as e:
+                    self.main_node.node_frame_error(self, e)
+                    break
+
+                except (ConnectionError, OSError) as e:
+                    self.main_node.debug_print("Unexpected Error: {}".format(str(e)))
+                    break
+
+        finally:
+            # Stopping AsyncNodeConnection
+            self.writer.close()
+            if self.file_task is not None:
+                self.file_task.cancel()
+            self.main_node.node_disconnected(self)
+            self.main_node.debug_print("AsyncNodeConnection: Stopped")
+
+    def check_length(self, length: int):
+        """
+        Check frame length from header, before payload is read
+        StreamReader would buffer whatever length other node claim
+
+        :param self:        Instances attributes
+        :param length:      payload length from frame header
+        """
+        if length > self.main_node.max_frame_size:
+            raise frame.FrameSizeError(
+                "Frame of {} bytes, max is {}".format(
+                    length, self.main_node.max_frame_size
+                )
+            )
+        if frame.HEADER_SIZE + length > self.main_node.max_recv_buffer:
+            raise frame.BufferLimitError(
+                "Frame of {} bytes does not fit in {} bytes buffer".format(
+                    frame.HEADER_SIZE + length, self.main_node.max_recv_buffer
+                )
+            )
+
+    def stop(self, drain: bool = True):
+        """
+        Stop this connection, safe to call from any thread
+
+        :param self:        Instances attributes
+        :param drain:       Write buffered frames first, transport close do it
+                            False when other node is gone or not responding
+        """
+        if drain:
+            self.main_node.call_soon(self.writer.close)
+        else:
+            self.main_node.call_soon(self.writer.transport.abort)
+
+    def write(self, encoded_data: bytes):
+        """
+        Write encoded data to transport, must run on event loop
+
+        :param self:            Instances attributes
+        :param encoded_data:    bytes, a complete frame
+        """
+        if self.writer.is_closing():
+            self.send_budget.release(len(encoded_data))
+            return
+        self.writer.write(encoded_data)
+        self.unflushed += len(encoded_data)
+        self.main_node.metric_send_calls.inc(1, self.id)
+        self.main_node.metric_frames_sent.inc(1, self.id)
+        self.main_node.metric_message_bytes.observe(
+            len(encoded_data), flowcontrol.SEND
+        )
+        self.release_flushed()
+
+    def release_flushed(self):
+        """
+        Release budget of bytes that transport has written, must run on event loop
+        If some is still buffered, wait until transport is drained
+
+        :param self:        Instances attributes
+        """
+        buffered = self.writer.transport.get_write_buffer_size()
+        if self.unflushed > buffered:
+            self.send_budget.release(self.unflushed - buffered)
+            self.main_node.metric_bytes_sent.inc(self.unflushed - buffered, self.id)
+            self.unflushed = buffered
+
+        if buffered > 0 and self.drain_task is None:
+            self.drain_task = asyncio.ensure_future(self.wait_drained())
+
+    async def wait_drained(self):
+        """
+        Coroutine that wait until transport write buffer is empty
+
+        :param self:        Instances attributes
+        """
+        try:
+            await self.writer.drain()
+
+        # * Connection lost, run will clean up
+        except (ConnectionError, OSError):
+            return
+
+        finally:
+            self.drain_task = None
+        self.release_flushed()
+
+    @property
+    def reading_paused(self) -> bool:
+        """
+        Reading from other node is paused while it is over recv budget
+        Not on send budget, two node sending to each other would wait forever
+
+        :param self:    Instances attributes
+
+        :return:        True if paused
+        """
+        return self.recv_budget.paused
+
+    def budget_changed(self, budget):
+        """
+        Byte budget is paused or resumed, safe to call from any thread
+
+        :param self:        Instances attributes
+        :param budget:      flowcontrol.ByteBudget that changed
+        """
+        self.main_node.node_flow_control(self, budget)
+        if budget is self.send_budget:
+            self.main_node.call_soon(self.update_sending)
+        else:
+            self.main_node.call_soon(self.update_reading)
+
+    def update_reading(self):
+        """
+        Pause or resume run, must run on event loop
+
+        :param self:        Instances attributes
+        """
+        if self.reading_paused:
+            self.can_read.clear()
+        else:
+            self.can_read.set()
+
+    def update_sending(self):
+        """
+        Pause or resume send_file_chunks, must run on event loop
+
+        :param self:        Instances attributes
+        """
+        if self.send_budget.paused:
+            self.can_send.clear()
+        else:
+            self.can_send.set()
+
+    def start_file(self, transfer):
+        """
+        Start sending chunk of an accepted file, must run on event loop
+
+        :param self:        Instances attributes
+        :param transfer:    filetransfer.OutgoingFile, from offset
+        """
+        if transfer not in self.sending_files:
+            self.sending_files.append(transfer)
+        if self.file_task is None:
+            self.file_task = asyncio.ensure_future(self.send_file_chunks())
+
+    def close_file(self, transfer):
+        """
+        Close file of a stopped outgoing transfer
+        Chunk is read into memory before it is queued, so file can go right away
+
+        :param self:        Instances attributes
+        :param transfer:    filetransfer.OutgoingFile, that is cancelled
+        """
+        transfer.close()
+
+    async def send_file_chunks(self):
+        """
+        Coroutine that send chunk of sending files, while send budget allow it
+        Chunk is read from file, loop.sendfile can't share transport with write
+
+        :param self:        Instances attributes
+        """
+        try:
+            while self.sending_files and not self.writer.is_closing():
+                transfer = self.sending_files[0]
+                if transfer.queued_all or transfer.error is not None:
+                    self.sending_files.popleft()
+                    continue
+
+                # * Event is only cleared on next loop turn, budget is checked now
+                if self.send_budget.paused:
+                    self.can_send.clear()
+                    await self.can_send.wait()
+                    continue
+
+                try:
+                    entries, count = transfer.chunk(use_sendfile=False)
+                except OSError as e:
+                    self.main_node.cancel_file(
+                        self, transfer, filetransfer.SEND, str(e)
+                    )
+                    continue
+
+                if not self.send_frame(*entries):
+                    self.main_node.cancel_file(
+                        self, transfer, filetransfer.SEND, "send buffer is full"
+                    )
+                    continue
+                transfer.offset += count
+                self.main_node.file_progress(self, transfer, filetransfer.SEND)
+
+        finally:
+            self.file_task = None
+
+    def send(self, data, encoding="utf-8", stream=None):
+        """
+        Sending data to connected Node, safe to call from any thread
+        Data is handed to event loop, so caller never wait for socket
+
+        :param self:        Instances attributes
+        :param data:        str, dict as json, or bytes
+        :param encoding:    encoding method
+        :param stream:      frame.STREAM_*, None to pick by size
+
+        :return:            True if data is handed to event loop, False if dropped
+        """
+        try:
+            payload, content_type = frame.encode_payload(data, encoding)
+            encoded_data = self.main_node.pack_data(
+                payload, self.codec, content_type, stream
+            )
+
+        # * Invalid datatype, or non serialize data in dict so dumps failed
+        except TypeError as type_error:
+            self.main_node.debug_print(
+                "asyncnodeconnection send: Invalid data, \n{}".format(type_error)
+            )
+            return False
+
+        return self.send_frame(encoded_data)
+
+    def send_frame(self, encoded_frame: bytes):
+        """
+        Send a frame that is already packed, safe to call from any thread
+
+        :param self:            Instances attributes
+        :param encoded_frame:   bytes, a complete frame from frame.pack_frame
+
+        :return:                True if frame is handed to event loop, False if dropped
+        """
+        if not self.send_budget.acquire(len(encoded_frame)):
+            self.main_node.debug_print(
+                "asyncnodeconnection send: Send budget of {} is full".format(self.id)
+            )
+            return False
+
+        self.main_node.call_soon(self.write, encoded_frame)
+        return True
+
+    def parse_packet(self, packet: bytes, content_type: int):
+        """
+        Parse packet that received
+
+        :param self:            Instances attributes
+        :param packet:          packet received type:bytes
+        :param content_type:    type of the packet, from frame header
+
+        :return:                parsed data, dict, str or bytes
+        """
+        self.parsed_size = len(packet)
+        return frame.decode_payload(packet, content_type)
+
+    # ? MAGIC FUNCTION
+    def __str__(self) -> str:
+        return "AsyncNodeConnection: {}:{} <-> {}:{} ({})".format(
+            self.main_node.host, self.main_node.port, self.host, self.port, self.id
+        )
+
+    def __hash__(self):
+        # Hash main_node.id + self.id
+        return hash(self.main_node.id + self.id)
+
+
+class AsyncNode(Node):
+    def __init__(
+        self, host, port, max_connection=1, id=None, callback=None, backlog=None
+    ):
+        """
+        AsyncNode class, constructor
+        Same callbacks as Node, but every connection is served
+        from one asyncio event loop, running on this thread
+
+        :param host:            The host we wanted Node to be started
+        :param port:            The port of node we wanted
+        :param max_connection:  Max amount of connection for this node to have
+        :param id:              ID for this Node
+        :param callback:        A func, that have (flag, Node, NodeConn, data)
+        :param backlog:         Amount of pending connection for listen
+        """
+        # * event loop, only available when run is called
+        # * loop_ready is set when loop can take connection
+        self.loop = None
+        self.loop_ready = threading.Event()
+        self.stop_event = None
+
+        # * buffer limit of StreamReader
+        self.stream_limit = 2**20
+
+        super(AsyncNode, self).__init__(
+            host=host,
+            port=port,
+            max_connection=max_connection,
+            id=id,
+            callback=callback,
+            backlog=backlog,
+        )
+
+    def init_handshakes(self, handshake_workers=None):
+        """
+        Handshake run on event loop, no pool, selector or wakeup pair like Node
+
+        :param self:                Instances attributes
+        :param handshake_workers:   unused, there is no handshake thread
+        """
+        # * handshake_writers, writer of stream that is still in handshake
+        # * dropped at once on stop, handshake is not worth waiting for
+        # * inbound_handshakes, inbound one of it, counted to max_connection
+        self.handshake_writers = set()
+        self.inbound_handshakes = 0
+
+    @property
+    def handshake_count(self) -> int:
+        """
+        :return:        Amount of connection still in handshake
+        """
+        return len(self.handshake_writers)
+
+    def stop(self):
+        """
+        Stop this AsyncNode
+
+        :param self:        Instances attributes
+        """
+        self.node_request_to_stop()
+        self.terminate_flag.set()
+        if self.stop_event is not None:
+            self.call_soon(self.stop_event.set)
+
+    def call_soon(self, func, *args):
+        """
+        Schedule func on event loop, safe to call from any thread
+
+        :param self:        Instances attributes
+        :param func:        function to call
+        :param args:        argument for func
+        """
+        if self.loop is None:
+            return
+        try:
+            self.loop.call_soon_threadsafe(func, *args)
+
+        # * Loop already closed, nothing to schedule
+        except RuntimeError:
+            self.debug_print("call_soon: Event loop is closed")
+
+    def send_frames(self, frames: list) -> int:
+        """
+        Send packed frames, every writer is fed on a single event loop callback
+
+        :param self:        Instances attributes
+        :param frames:      list of (AsyncNodeConnection, encoded frame)
+
+        :return:            Amount of frame handed to event loop
+        """
+        frames = [
+            (node, encoded_frame)
+            for node, encoded_frame in frames
+            if node.send_budget.acquire(len(encoded_frame))
+        ]
+        self.call_soon(self.write_frames, frames)
+        return len(frames)
+
+    @staticmethod
+    def write_frames(frames: list):
+        """
+        Write frames to their connection, must run on event loop
+
+        :param frames:      list of (AsyncNodeConnection, encoded frame)
+        """
+        for node, encoded_frame in frames:
+            node.write(encoded_frame)
+
+    def run(self):
+        """
+        Run AsyncNode event loop from threading.Thread parent class
+
+        :param self:        Instances attributes
+        """
+        asyncio.run(self.serve())
+        self.reconnect_scheduler.join()
+        self.heartbeat_monitor.join()
+        self.debug_print("Node {} has stopped".format(self.id))
+
+    async def serve(self):
+        """
+        Main coroutine, accept connection until stop is requested
+
+        :param self:        Instances attributes
+        """
+        self.stop_event = asyncio.Event()
+        self.loop = asyncio.get_running_loop()
+
+        server = await asyncio.start_server(
+            self.handle_inbound,
+            sock=self.sock,
+            limit=self.stream_limit,
+            backlog=self.backlog,
+        )
+        self.loop_ready.set()
+        self.reconnect_scheduler.start()
+        self.heartbeat_monitor.start()
+
+        if not self.terminate_flag.is_set():
+            await self.stop_event.wait()
+
+        self.debug_print("Node Stopping...")
+        self.reconnect_scheduler.stop()
+        self.heartbeat_monitor.stop()
+        server.close()
+
+        # * Close every connection, let their run coroutine finish
+        # * close write what is buffered first, abort does not
+        for writer in list(self.handshake_writers):
+            writer.transport.abort()
+        for node in self.all_nodes:
+            node.writer.close()
+
+        # * Give them shutdown_timeout to write what is buffered
+        # * Then drop connection that is still writing, and wait it to end
+        # * Only task left after that is connect that is not connected yet
+        pending = [
+            task
+            for task in asyncio.all_tasks()
+            if task is not asyncio.current_task()
+        ]
+        for timeout in (self.shutdown_timeout, self.shutdown_timeout):
+            if not pending:
+                break
+            done, pending = await asyncio.wait(pending, timeout=timeout)
+            for node in self.all_nodes:
+                node.writer.transport.abort()
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        await server.wait_closed()
+
+    async def handle_inbound(self, reader, writer):
+        """
+        Handle new inbound stream, handshake then receive data
+
+        :param self:        Instances attributes
+        :param reader:      asyncio.StreamReader of the new connection
+        :param writer:      asyncio.StreamWriter of the new connection
+        """
+        self.debug_print(
+            "Total inbound connection: {}".format(str(self.connections.count(INBOUND)))
+        )
+
+        # * Handshake in progress hold a slot too, like inbound_handshakes of Node
+        total_inbound = self.connections.count(INBOUND) + self.inbound_handshakes
+        if total_inbound >= self.max_connection:
+            self.debug_print("New Connection closed: Exceed connection allowed")
+            writer.close()
+            return
+
+        connected_node_host, connected_node_port = writer.get_extra_info("peername")[
+            :2
+        ]
+
+        deadline = time.monotonic() + self.handshake_timeout
+        self.handshake_writers.add(writer)
+        self.inbound_handshakes += 1
+        try:
+            # * Receive info from other node
+            hello = await asyncio.wait_for(
+                self.read_hello(reader), timeout=self.handshake_timeout
+            )
+            connected_node_id = str(hello["id"])
+            connected_node_port = hello.get("port", connected_node_port)
+
+            # * send our ID, they already know our host and port
+            reply, codec = self.reply_hello(hello)
+            writer.write(pack_hello(reply))
+            await writer.drain()
+            self.handshake_done(deadline, INBOUND)
+
+        except (asyncio.TimeoutError, HandshakeError, ConnectionError, OSError) as e:
+            self.debug_print("handle_inbound: Handshake failed. {}".format(str(e)))
+            writer.close()
+            return
+
+        finally:
+            self.handshake_writers.discard(writer)
+            self.inbound_handshakes -= 1
+
+        # * Stopped while in handshake
+        if self.terminate_flag.is_set():
+            writer.transport.abort()
+            return
+
+        node = self.create_new_connection(
+            reader=reader,
+            writer=writer,
+            id=connected_node_id,
+            host=connected_node_host,
+            port=connected_node_port,
+            codec=codec,
+        )
+        self.connections.add(node, INBOUND)
+        self.inbound_node_connected(node)
+
+        await node.run()
+
+    async def read_hello(self, reader) -> dict:
+        """
+        Read handshake info of other node from reader
+
+        :param self:        Instances attributes
+        :param reader:      asyncio.StreamReader of the connection
+
+        :return:            dict, info of other node
+        """
+        try:
+            header = await reader.readexactly(frame.HEADER_SIZE)
+            frame_type, content_type, flags, length = frame.unpack_header(header)
+            if length > MAX_HELLO_SIZE:
+                raise HandshakeError("Hello frame too big, {} bytes".format(length))
+            payload = await reader.readexactly(length)
+
+        except asyncio.IncompleteReadError:
+            raise HandshakeError("Connection closed during handshake")
+        except frame.FrameError as e:
+            raise HandshakeError(str(e))
+
+        return unpack_hello(frame_type, payload)
+
+    def create_new_connection(
+        self, reader, writer, id: str, host: str, port: int, codec=None
+    ):
+        """
+        Create new connection to Node
+
+        :param self:    Instances attributes
+        :param reader:  asyncio.StreamReader that have connection with us
+        :param writer:  asyncio.StreamWriter that have connection with us
+        :param id:      ID of other client
+        :param host:    Host of other client
+        :param port:    Port of other client
+        :param codec:   Compression codec agreed on handshake
+
+        :return:        AsyncNodeConnection intances
+        """
+        return AsyncNodeConnection(
+            main_node=self,
+            reader=reader,
+            writer=writer,
+            id=id,
+            host=host,
+            port=port,
+            codec=codec,
+        )
+
+    def connect_with_node(self, host, port, reconnect=False):
+        """
+        Try to connect with node @host:port
+        Blocking wrapper around open_connection, must not be called from event loop
+
+        :param host:        IP address of node we are trying to connect
+        :param port:        Port number
+        :param reconnect:   bool value, a flag for reconnect
+
+        :return:            bool value of success in connecting effort
+        """
+        if not self.loop_ready.wait(timeout=self.handshake_timeout):
+            self.debug_print("connect_with_node: Event loop is not running")
+            return False
+
+        return self.connect_with_node_async(host, port, reconnect).result()
+
+    def connect_with_node_async(self, host, port, reconnect=False):
+        """
+        Try to connect with node @host:port on event loop
+        Caller does not wait for connect and handshake, only for loop to start
+
+        :param host:        IP address of node we are trying to connect
+        :param port:        Port number
+        :param reconnect:   bool value, a flag for reconnect
+
+        :return:            concurrent.futures.Future of open_connection result
+        """
+        if not self.loop_ready.wait(timeout=self.handshake_timeout):
+            self.debug_print("connect_with_node_async: Event loop is not running")
+            future = concurrent.futures.Future()
+            future.set_result(False)
+            return future
+
+        return asyncio.run_coroutine_threadsafe(
+            self.open_connection(host, port, reconnect), self.loop
+        )
+
+    async def open_connection(self, host, port, reconnect=False):
+        """
+        Coroutine to connect with node @host:port
+
+        :param host:        IP address of node we are trying to connect
+        :param port:        Port number
+        :param reconnect:   bool value, a flag for reconnect
+
+        :return:            bool value of success in connecting effort
+                            False if connection failed
+                            True  if connection success or already connected
+        """
+        func_name = "open_connection"
+        if self.host == host and self.port == port:
+            print("{}: Cannot connect with yourself".format(func_name))
+            return False
+
+        node = self.connections.get_by_address(host, port)
+        if node is not None:
+            print(
+                "{}: Already connected with this node ({})".format(func_name, node.id)
+            )
+            return True
+
+        if self.connections.count(OUTBOUND) >= self.max_connection:
+            self.debug_print(
+                "{}: Exceed outbound connection allowed".format(func_name)
+            )
+            return False
+
+        writer = None
+        deadline = time.monotonic() + self.handshake_timeout
+        try:
+            self.debug_print("connecting to {}:{}".format(host, port))
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port, limit=self.stream_limit),
+                timeout=self.handshake_timeout,
+            )
+            self.handshake_writers.add(writer)
+
+            # * Basic info exchange, same as Node
+            writer.write(pack_hello(self.hello_info()))
+            await writer.drain()
+            hello = await asyncio.wait_for(
+                self.read_hello(reader), timeout=self.handshake_timeout
+            )
+            connected_node_id = str(hello["id"])
+            codec = self.hello_codec(hello)
+            self.handshake_done(deadline, OUTBOUND)
+
+        except (asyncio.TimeoutError, HandshakeError, ConnectionError, OSError) as e:
+            self.debug_print(
+                "AsyncNode.{}: Could not connect with node. {}".format(
+                    func_name, str(e)
+                )
+            )
+            if writer is not None:
+                writer.close()
+            return False
+
+        finally:
+            self.handshake_writers.discard(writer)
+
+        # * Stopped while in handshake
+        if self.terminate_flag.is_set():
+            writer.transport.abort()
+            return False
+
+        node = self.connections.get(connected_node_id)
+        already_connected = self.id == connected_node_id or (
+            node is not None and node.host == host
+        )
+        if already_connected:
+            print(
+                "{}: This node ({}) is already connected".format(
+                    func_name, connected_node_id
+                )
+            )
+            writer.write(
+                frame.pack_frame(
+                    "CLOSING: Already have connection together".encode("utf-8"),
+                    content_type=frame.CONTENT_CONTROL,
+                )
+            )
+            writer.close()
+            return True
+
+        node = self.create_new_connection(
+            reader=reader,
+            writer=writer,
+            id=connected_node_id,
+            host=host,
+            port=port,
+            codec=codec,
+        )
+        asyncio.create_task(node.run())
+
+        self.connections.add(node, OUTBOUND)
+        self.outbound_node_connected(node)
+
+        if reconnect:
+            self.debug_print(
+                "{}: Reconnection check is enabled on node {}:{}".format(
+                    func_name, host, port
+                )
+            )
+            self.reconnect_scheduler.watch(host, port)
+        return True
+
+    # ? MAGIC FUNCTION
+    def __str__(self):
+        """
+        :return:        str representation for this AsyncNode instances
+        """
+        return "AsyncNode {} @{}:{}".format(self.id, self.host, self.port)
@@ -0,0 +1,191 @@
+import lzma
+import zlib
+
+from . import frame
+
+# * Payload smaller than this is sent as it is, compressing it cost more than it save
+COMPRESSION_THRESHOLD = 64
+
+# * Max size of one decompressed payload, so small frame can not blow up memory
+MAX_DECOMPRESSED_SIZE = 64 * 1024 * 1024
+
+# * Preset dictionary for "zlib-dict2", both side must have the exact same bytes
+# * Built from envelope.pack_envelope output, most common piece at the end:
+# *   common chat words, for ENVELOPE_TEXT payload
+# *   ElGamal public key json and its ending, ENVELOPE_PUBLIC_KEY payload
+# *   envelope header up to first timestamp byte, 0x18 from 2024-10 to 2027-01
+# *   ElGamal ciphertext json of digits and its ending, ENVELOPE_ENCRYPTED payload
+# * Changing it need a new codec name, or old node decompress with other bytes
+PRESET_DICTIONARY = b"".join(
+    (
+        b" the and you that have for not with this but what are was can just will",
+        b" know do so it is in to of a i me my we be on at ok yes no lol",
+        b'{"public_modulo": 29642713714185890658993225040683606410276131188059, '
+        b'"public_base": 27421383972473312967114394082124933792005390533943, '
+        b'"base_public_key": 5324515953515463710031021557578741156662606617161}',
+        b"\xff\xfe5\x00e\x00g\x00",
+        b"\xfe\x01\x02eg\x18",
+        b"\xfe\x01\x01\x00\x00\x18",
+        b"[3039562413483803429080295904586638245885892096923, "
+        b"[222619718790146803465205683215976754691612285202976, "
+        b"216197996132738722596017057738592809844738853899044]]",
+        b"\xff\xfe2\x00e\x00g\x00",
+        b"\xfe\x01\x03eg\x18",
+    )
+)
+
+
+class ZlibCodec:
+    def __init__(self, name: str, zdict: bytes = None, level: int = 6):
+        """
+        Deflate codec, raw stream without header
+        Every frame is compressed on its own, so frame can be shared by connection
+
+        :param self:        Instances attributes
+        :param name:        Name of the codec, sent on handshake
+        :param zdict:       Preset dictionary, None for no dictionary
+        :param level:       Compression level, 0 - 9
+        """
+        self.name = name
+        self.zdict = zdict
+        self.level = level
+
+    def compress(self, payload) -> bytes:
+        """
+        :param payload:     bytes or memoryview to compress
+
+        :return:            compressed bytes
+        """
+        if self.zdict is None:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        else:
+            compressor = zlib.compressobj(
+                self.level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=self.zdict
+            )
+        return compressor.compress(payload) + compressor.flush()
+
+    def decompress(self, packet, max_size: int = MAX_DECOMPRESSED_SIZE) -> bytes:
+        """
+        :param packet:      compressed bytes or memoryview
+        :param max_size:    Max size of decompressed bytes
+
+        :return:            decompressed bytes
+        """
+        if self.zdict is None:
+            decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        else:
+            decompressor = zlib.decompressobj(-zlib.MAX_WBITS, zdict=self.zdict)
+
+        try:
+            payload = decompressor.decompress(packet, max_size)
+        except zlib.error as e:
+            raise frame.FrameError("Invalid {} payload: {}".format(self.name, e))
+
+        if decompressor.unconsumed_tail:
+            raise frame.FrameSizeError("Decompressed payload is too large")
+        if not decompressor.eof:
+            raise frame.FrameError("Compressed payload is truncated")
+        return payload
+
+
+class LzmaCodec:
+    def __init__(self, name: str = "lzma", preset: int = 1):
+        """
+        LZMA codec, better ratio than zlib for big payload, but slower
+
+        :param self:        Instances attributes
+        :param name:        Name of the codec, sent on handshake
+        :param preset:      Compression preset, 0 - 9
+        """
+        self.name = name
+        self.preset = preset
+
+    def compress(self, payload) -> bytes:
+        """
+        :param payload:     bytes or memoryview to compress
+
+        :return:            compressed bytes
+        """
+        return lzma.compress(payload, format=lzma.FORMAT_XZ, preset=self.preset)
+
+    def decompress(self, packet, max_size: int = MAX_DECOMPRESSED_SIZE) -> bytes:
+        """
+        :param packet:      compressed bytes or memoryview
+        :param max_size:    Max size of decompressed bytes
+
+        :return:            decompressed bytes
+        """
+        decompressor = lzma.LZMADecompressor(format=lzma.FORMAT_XZ)
+        try:
+            payload = decompressor.decompress(packet, max_size)
+        except lzma.LZMAError as e:
+            raise frame.FrameError("Invalid {} payload: {}".format(self.name, e))
+
+        if not decompressor.eof:
+            if decompressor.needs_input:
+                raise frame.FrameError("Compressed payload is truncated")
+            raise frame.FrameSizeError("Decompressed payload is too large")
+        return payload
+
+
+# * Supported codec, in order of our preference
+CODECS = {
+    codec.name: codec
+    for codec in (
+        ZlibCodec("zlib-dict2", zdict=PRESET_DICTIONARY),
+        ZlibCodec("zlib"),
+        LzmaCodec("lzma"),
+    )
+}
+
+
+def get_codec(name):
+    """
+    Get codec by name
+
+    :param name:        Name of the codec, None for no compression
+
+    :return:            codec, None if name is None
+    """
+    if name is None:
+        return None
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise frame.FrameError("Unsupported compression {}".format(name))
+
+
+def negotiate(offered, supported) -> str:
+    """
+    Pick codec for a connection, first one offered by other node that we support
+
+    :param offered:     list of codec name from other node hello, None if absent
+    :param supported:   list of codec name we allow
+
+    :return:            codec name, None for no compression
+    """
+    if not isinstance(offered, list):
+        return None
+    for name in offered:
+        if name in supported and name in CODECS:
+            return name
+    return None
+
+
+def compress_payload(codec, payload, threshold: int = COMPRESSION_THRESHOLD):
+    """
+    Compress payload if it is worth it
+
+    :param codec:       codec of the connection, None for no compression
+    :param payload:     encoded payload, bytes
+    :param threshold:   payload smaller than this is not compressed
+
+    :return:            tuple of (payload, flags) for frame.pack_frame
+    """
+    if codec is None or len(payload) < threshold:
+        return payload, 0
+
+    compressed = codec.compress(payload)
+    if len(compressed) >= len(payload):
+        return payload, 0
+    return compressed, frame.FLAG_COMPRESSED
@@ -0,0 +1,149 @@
+import threading
+
+# * Direction of a connection
+# * inbound - (US) <- Them
+# * outbound- (US) -> Them
+INBOUND = "inbound"
+OUTBOUND = "outbound"
+
+
+class ConnectionRegistry:
+    def __init__(self):
+        """
+        Registry of every connection a Node have, safe to use from any thread
+        Connection is indexed by peer id, by (host, port) and by direction
+        So lookup, dedupe and count stay O(1) however many peer we have
+
+        :param self:        Instances attributes
+        """
+        self.lock = threading.Lock()
+
+        # * by_id, peer id -> connection
+        # * by_address, (host, port) -> connection
+        # * by_direction, direction -> {connection: None}, dict keep insert order
+        # * directions, connection -> direction
+        self.by_id = dict()
+        self.by_address = dict()
+        self.by_direction = {INBOUND: dict(), OUTBOUND: dict()}
+        self.directions = dict()
+
+    def __len__(self) -> int:
+        """
+        :return:        Total amount of connection
+        """
+        return len(self.directions)
+
+    def __contains__(self, connection) -> bool:
+        """
+        :return:        True if connection is registered
+        """
+        return connection in self.directions
+
+    def add(self, connection, direction: str):
+        """
+        Register connection, newest connection win on same id or address
+
+        :param self:        Instances attributes
+        :param connection:  NodeConnection, need id, host and port
+        :param direction:   INBOUND or OUTBOUND
+        """
+        with self.lock:
+            self.by_id[connection.id] = connection
+            self.by_address[(connection.host, connection.port)] = connection
+            self.by_direction[direction][connection] = None
+            self.directions[connection] = direction
+
+    def remove(self, connection):
+        """
+        Unregister connection
+
+        :param self:        Instances attributes
+        :param connection:  NodeConnection to remove
+
+        :return:            direction of removed connection
+                            None if connection is not registered
+        """
+        with self.lock:
+            direction = self.directions.pop(connection, None)
+            if direction is None:
+                return None
+
+            del self.by_direction[direction][connection]
+            if self.by_id.get(connection.id, None) is connection:
+                del self.by_id[connection.id]
+            address = (connection.host, connection.port)
+            if self.by_address.get(address, None) is connection:
+                del self.by_address[address]
+            return direction
+
+    def get(self, id: str):
+        """
+        Get connection by peer id
+
+        :param self:        Instances attributes
+        :param id:          Peer id
+
+        :return:            connection, None if not found
+        """
+        return self.by_id.get(id, None)
+
+    def get_by_address(self, host, port):
+        """
+        Get connection by host and port of the peer
+
+        :param self:        Instances attributes
+        :param host:        IP address of the peer
+        :param port:        Port of the peer
+
+        :return:            connection, None if not found
+        """
+        return self.by_address.get((host, port), None)
+
+    def direction(self, connection):
+        """
+        Get direction of a connection
+
+        :param self:        Instances attributes
+        :param connection:  NodeConnection
+
+        :return:            INBOUND, OUTBOUND or None if not registered
+        """
+        return self.directions.get(connection, None)
+
+    def count(self, direction: str = None) -> int:
+        """
+        Count connection
+
+        :param self:        Instances attributes
+        :param direction:   INBOUND, OUTBOUND or None for both
+
+        :return:            amount of connection
+        """
+        if direction is None:
+            return len(self.directions)
+        return len(self.by_direction[direction])
+
+    def all(self, direction: str = None) -> list:
+        """
+        Snapshot of connection, safe to iterate while registry change
+
+        :param self:        Instances attributes
+        :param direction:   INBOUND, OUTBOUND or None for both
+
+        :return:            list of connection
+        """
+        with self.lock:
+            if direction is None:
+                return list(self.directions.keys())
+            return list(self.by_direction[direction].keys())
+
+    def ids(self) -> list:
+        """
+        Snapshot of peer id
+
+        :param self:        Instances attributes
+
+        :return:            list of peer id
+        """
+        with self.lock:
+            return list(self.by_id.keys())
@@ -0,0 +1,126 @@
+import collections
+import struct
+import time
+
+# * Envelope layout, every chat message is sent in one, every field is big endian
+# *   magic         : 1 byte, ENVELOPE_MAGIC
+# *   version       : 1 byte, ENVELOPE_VERSION
+# *   kind          : 1 byte, ENVELOPE_*
+# *   scheme        : 2 bytes, encryption type, ex: b"eg", NO_SCHEME for none
+# *   timestamp     : 8 bytes, nanosecond since epoch
+# *   sender_length : 2 bytes, length of sender
+# *   payload_length: 4 bytes, length of payload
+# *   sender        : id of user that write the message, utf-8
+# *   payload       : depend on kind
+ENVELOPE_MAGIC = 0xFE
+ENVELOPE_VERSION = 1
+ENVELOPE_HEADER = struct.Struct("!BBB2sQHI")
+ENVELOPE_HEADER_SIZE = ENVELOPE_HEADER.size
+
+# * Kind of envelope
+# *   ENVELOPE_TEXT       : plain chat message, payload is utf-8 text
+# *   ENVELOPE_PUBLIC_KEY : public key of sender, payload is packed by scheme
+# *   ENVELOPE_ENCRYPTED  : encrypted chat message, payload is packed by scheme
+ENVELOPE_TEXT = 0x01
+ENVELOPE_PUBLIC_KEY = 0x02
+ENVELOPE_ENCRYPTED = 0x03
+
+NO_SCHEME = b"\x00\x00"
+
+Envelope = collections.namedtuple(
+    "Envelope", ["kind", "scheme", "timestamp", "sender", "payload"]
+)
+
+
+class EnvelopeError(Exception):
+    """
+    Raised when received bytes is not a valid envelope
+    """
+
+
+def pack_envelope(
+    kind: int,
+    sender: str,
+    payload: bytes,
+    timestamp: int = None,
+    scheme: bytes = NO_SCHEME,
+) -> bytes:
+    """
+    Pack message into an envelope
+
+    :param kind:        kind of envelope, ENVELOPE_*
+    :param sender:      id of user that write the message
+    :param payload:     bytes of the message
+    :param timestamp:   nanosecond since epoch, default now
+    :param scheme:      2 bytes encryption type, NO_SCHEME for none
+
+    :return:            bytes ready to be sent
+    """
+    if timestamp is None:
+        timestamp = time.time_ns()
+    encoded_sender = sender.encode("utf-8")
+    return b"".join(
+        (
+            ENVELOPE_HEADER.pack(
+                ENVELOPE_MAGIC,
+                ENVELOPE_VERSION,
+                kind,
+                scheme,
+                timestamp,
+                len(encoded_sender),
+                len(payload),
+            ),
+            encoded_sender,
+            payload,
+        )
+    )
+
+
+def is_envelope(data) -> bool:
+    """
+    :param data:        data received, after frame.decode_payload
+
+    :return:            True if data look like an envelope
+    """
+    return (
+        isinstance(data, bytes)
+        and len(data) >= ENVELOPE_HEADER_SIZE
+        and data[0] == ENVELOPE_MAGIC
+    )
+
+
+def unpack_envelope(data: bytes) -> Envelope:
+    """
+    Unpack envelope
+
+    :param data:        bytes of the envelope
+
+    :return:            Envelope, scheme is str, "" for NO_SCHEME
+    """
+    try:
+        (
+            magic,
+            version,
+            kind,
+            scheme,
+            timestamp,
+            sender_length,
+            payload_length,
+        ) = ENVELOPE_HEADER.unpack_from(data)
+    except struct.error:
+        raise EnvelopeError("Envelope is too short")
+
+    if magic != ENVELOPE_MAGIC or version != ENVELOPE_VERSION:
+        raise EnvelopeError("Unsupported envelope version {}".format(version))
+
+    payload_start = ENVELOPE_HEADER_SIZE + sender_length
+    if payload_start + payload_length != len(data):
+        raise EnvelopeError("Envelope length does not match")
+
+    try:
+        sender = data[ENVELOPE_HEADER_SIZE:payload_start].decode("utf-8")
+        scheme = scheme.rstrip(b"\x00").decode("ascii")
+    except UnicodeDecodeError:
+        raise EnvelopeError("Envelope sender or scheme is not valid")
+
+    return Envelope(kind, scheme, timestamp, sender, data[payload_start:])
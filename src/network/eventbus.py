@@ -0,0 +1,152 @@
+import collections
+import enum
+import threading
+
+
+class EventType(enum.Enum):
+    """
+    Type of event NetworkHandler publish to the bus
+    Value is the callback name Node use, ex: "node_message"
+    """
+
+    SERVER_STARTED = "server_started"
+    OUTBOUND_NODE_CONNECTED = "outbound_node_connected"
+    OUTBOUND_NODE_DISCONNECTED = "outbound_node_disconnected"
+    INBOUND_NODE_CONNECTED = "inbound_node_connected"
+    INBOUND_NODE_DISCONNECTED = "inbound_node_disconnected"
+    NODE_MESSAGE = "node_message"
+    NODE_CONTROL = "node_control"
+    NODE_FLOW_CONTROL = "node_flow_control"
+    NODE_GOSSIP_MESSAGE = "node_gossip_message"
+    NODE_FILE_PROGRESS = "node_file_progress"
+    NODE_REQUEST_TO_STOP = "node_request_to_stop"
+
+
+# * Event on the bus
+# *   type          : EventType
+# *   source_id     : where it started, other node or sys
+# *   dest_id       : where it going, ex: recv have us as dest_id
+# *   data          : formatted str, dict or bytes
+# *   connection    : NodeConnection it came from, None if not from one
+# *   size          : bytes held on recv_budget of connection until handled
+Event = collections.namedtuple(
+    "Event", ["type", "source_id", "dest_id", "data", "connection", "size"]
+)
+
+# * Bytes counted for every event besides it data
+# * So many small message pause the connection too, not only big one
+EVENT_OVERHEAD = 1024
+
+
+class EventBus(threading.Thread):
+    def __init__(self, maxsize: int = 4096):
+        """
+        Queue of Event, from network threads to one consumer thread
+        Network thread only publish, handler run on the consumer thread
+        One consumer take events in order, so ordering per peer is kept
+
+        Publish never wait, publisher might be the AsyncNode event loop
+        Event with size hold the recv_budget of it connection until handled
+        So a slow consumer pause reading from that connection instead,
+        that is what keep the queue bounded
+
+        :param self:        Instances attributes
+        :param maxsize:     Amount of events waiting that is expected at most
+                            Event published over it is counted in overflowed
+        """
+        self.maxsize = maxsize
+
+        # * handlers, EventType -> func(event), dispatch table
+        # * default_handler, func(event) for type without handler, None to drop
+        self.handlers = dict()
+        self.default_handler = None
+
+        # * events, waiting to be handled
+        self.events = collections.deque()
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+
+        # * overflowed, amount of event published while maxsize is reached
+        self.overflowed = 0
+
+        # * terminate flag, flag for thread termination
+        self.terminate_flag = threading.Event()
+
+        super(EventBus, self).__init__(daemon=True)
+
+    def __len__(self) -> int:
+        """
+        :return:        Amount of events waiting to be handled
+        """
+        return len(self.events)
+
+    def subscribe(self, event_type: EventType, handler):
+        """
+        Set handler of event_type, replacing the previous one
+
+        :param self:        Instances attributes
+        :param event_type:  EventType
+        :param handler:     func(event)
+        """
+        self.handlers[event_type] = handler
+
+    def publish(self, event: Event):
+        """
+        Add event to the end of queue, never wait
+        Backpressure is the recv_budget, it pause the connection, not the caller
+
+        :param self:        Instances attributes
+        :param event:       Event to publish
+        """
+        if event.size:
+            event.connection.recv_budget.acquire(event.size)
+
+        with self.lock:
+            if len(self.events) >= self.maxsize:
+                self.overflowed += 1
+            self.events.append(event)
+            self.not_empty.notify()
+
+    def run(self):
+        """
+        Run EventBus from threading.Thread parent class
+        Events published before stop are still handled
+
+        :param self:        Instances attributes
+        """
+        while True:
+            with self.not_empty:
+                while not self.events and not self.terminate_flag.is_set():
+                    self.not_empty.wait()
+                if not self.events:
+                    break
+                event = self.events.popleft()
+
+            self.dispatch(event)
+
+    def dispatch(self, event: Event):
+        """
+        Call handler of event, error is printed but does not stop the thread
+
+        :param self:        Instances attributes
+        :param event:       Event to handle
+        """
+        handler = self.handlers.get(event.type, self.default_handler)
+        try:
+            if handler is not None:
+                handler(event)
+        except Exception as e:
+            print("EventBus: {} handler failed, {}".format(event.type.name, e))
+        finally:
+            if event.size:
+                event.connection.recv_budget.release(event.size)
+
+    def stop(self):
+        """
+        Stop this EventBus, after every queued event is handled
+
+        :param self:        Instances attributes
+        """
+        with self.lock:
+            self.terminate_flag.set()
+            self.not_empty.notify_all()
@@ -0,0 +1,306 @@
+import hashlib
+import json
+import os
+import struct
+
+from . import frame
+from .sendqueue import FileRegion
+
+# * File transfer, file is streamed as many FRAME_FILE_CHUNK frames
+# * Control message is a FRAME_FILE frame, json dict with "type" and "id":
+# *   offer     : sender -> receiver, {"name", "size"}
+# *   accept    : receiver -> sender, {"offset"}, bytes it already have
+# *   done      : receiver -> sender, whole file is written
+# *   cancel    : either way, {"reason"}
+# * id is hex of transfer id, same file give same id, so it can be resumed
+OFFER = "offer"
+ACCEPT = "accept"
+DONE = "done"
+CANCEL = "cancel"
+
+# * Chunk payload layout, inside a FRAME_FILE_CHUNK frame
+# *   transfer_id   : 16 bytes
+# *   offset        : 8 bytes, position of data in file
+# *   data          : bytes of file
+CHUNK_HEADER = struct.Struct("!16sQ")
+CHUNK_SIZE = 256 * 1024
+
+# * Direction of a transfer
+SEND = "send"
+RECV = "recv"
+
+# * os.sendfile is not on every platform, ex: windows
+SENDFILE = hasattr(os, "sendfile")
+
+
+class FileTransferError(Exception):
+    """
+    Raised when file transfer message or chunk is invalid
+    """
+
+
+def transfer_id(path: str, stat: os.stat_result) -> bytes:
+    """
+    :return:        16 bytes id of file, changed when file is changed
+    """
+    key = "{}|{}|{}".format(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    return hashlib.sha1(key.encode("utf-8")).digest()[:16]
+
+
+def pack_file_control(message_type: str, id: bytes, **fields) -> bytes:
+    """
+    Pack file transfer control message into a FRAME_FILE frame
+
+    :param message_type: OFFER, ACCEPT, DONE or CANCEL
+    :param id:          transfer id
+    :param fields:      other field of the message, ex: offset
+
+    :return:            bytes ready to be sent
+    """
+    message = dict(fields, type=message_type, id=id.hex())
+    return frame.pack_frame(
+        json.dumps(message).encode("utf-8"),
+        frame_type=frame.FRAME_FILE,
+        content_type=frame.CONTENT_JSON,
+    )
+
+
+def unpack_file_control(packet) -> dict:
+    """
+    Unpack payload of a FRAME_FILE frame
+
+    :param packet:      payload of the frame, bytes or memoryview
+
+    :return:            dict of message, "id" is bytes
+    """
+    try:
+        message = json.loads(str(packet, "utf-8"))
+        message["id"] = bytes.fromhex(message["id"])
+    except (UnicodeDecodeError, ValueError, TypeError, KeyError):
+        raise frame.FrameError("File transfer message is invalid")
+
+    if len(message["id"]) != CHUNK_HEADER.size - 8 or message.get("type") not in (
+        OFFER,
+        ACCEPT,
+        DONE,
+        CANCEL,
+    ):
+        raise frame.FrameError("File transfer message is invalid")
+    return message
+
+
+def unpack_chunk(packet):
+    """
+    Unpack payload of a FRAME_FILE_CHUNK frame
+
+    :param packet:      payload of the frame, bytes or memoryview
+
+    :return:            tuple of (transfer id, offset, data as memoryview)
+    """
+    if len(packet) < CHUNK_HEADER.size:
+        raise frame.FrameError("File chunk is too short")
+
+    id, offset = CHUNK_HEADER.unpack_from(packet)
+    return id, offset, memoryview(packet)[CHUNK_HEADER.size :]
+
+
+class FileTransfer:
+    def __init__(self, id: bytes, name: str, size: int):
+        """
+        State of one file transfer, shared by both direction
+
+        :param self:        Instances attributes
+        :param id:          transfer id
+        :param name:        file name, without directory
+        :param size:        file size in bytes
+        """
+        self.id = id
+        self.name = name
+        self.size = size
+
+        # * offset, bytes queued by sender, or written by receiver
+        # * reported, last progress step given to application, -1 for none
+        # * done, whole file is received, path is where it is
+        # * error, why transfer is stopped, None while it is going
+        self.offset = 0
+        self.reported = -1
+        self.done = False
+        self.path = None
+        self.error = None
+        self.file = None
+
+    def progress_due(self, step: float) -> bool:
+        """
+        Check if progress passed another step since last time it is reported
+
+        :param self:        Instances attributes
+        :param step:        fraction of file between two report, ex: 0.1
+
+        :return:            True if it should be reported
+        """
+        reached = int(self.offset / self.size / step) if self.size else 0
+        if reached == self.reported and not self.done:
+            return False
+        self.reported = reached
+        return True
+
+    def snapshot(self, direction: str) -> dict:
+        """
+        :return:        dict of progress, given to application
+        """
+        return {
+            "id": self.id.hex(),
+            "name": self.name,
+            "direction": direction,
+            "offset": self.offset,
+            "size": self.size,
+            "done": self.done,
+            "path": self.path,
+            "error": self.error,
+        }
+
+    def close(self):
+        """
+        Close file of this transfer
+
+        :param self:        Instances attributes
+        """
+        if self.file is not None:
+            self.file.close()
+
+
+class OutgoingFile(FileTransfer):
+    def __init__(self, path: str, chunk_size: int = CHUNK_SIZE):
+        """
+        File we send, it is read chunk by chunk, only when it can be sent
+
+        :param self:        Instances attributes
+        :param path:        path of the file
+        :param chunk_size:  max bytes of file in one chunk
+        """
+        file = open(path, "rb")
+        stat = os.fstat(file.fileno())
+        super(OutgoingFile, self).__init__(
+            transfer_id(path, stat), os.path.basename(path), stat.st_size
+        )
+        self.file = file
+        self.chunk_size = chunk_size
+
+    @property
+    def queued_all(self) -> bool:
+        """
+        :return:        True if every chunk is queued
+        """
+        return self.offset >= self.size
+
+    def offer(self) -> bytes:
+        """
+        :return:        FRAME_FILE frame that offer this file
+        """
+        return pack_file_control(OFFER, self.id, name=self.name, size=self.size)
+
+    def chunk(self, use_sendfile: bool = SENDFILE):
+        """
+        Next chunk from offset, offset is not moved
+
+        :param self:            Instances attributes
+        :param use_sendfile:    Leave data in file as FileRegion, for os.sendfile
+
+        :return:                tuple of (list of send queue entry, bytes of file)
+                                entries together make one FRAME_FILE_CHUNK frame
+        """
+        count = min(self.chunk_size, self.size - self.offset)
+        header = frame.pack_header(
+            frame.FRAME_FILE_CHUNK,
+            frame.CONTENT_BINARY,
+            0,
+            CHUNK_HEADER.size + count,
+        ) + CHUNK_HEADER.pack(self.id, self.offset)
+
+        if use_sendfile:
+            return [header, FileRegion(self.file.fileno(), self.offset, count)], count
+
+        self.file.seek(self.offset)
+        data = self.file.read(count)
+        if len(data) != count:
+            raise OSError("File ended {} bytes early".format(count - len(data)))
+        return [header + data], count
+
+
+class IncomingFile(FileTransfer):
+    def __init__(self, directory: str, message: dict):
+        """
+        File we receive, written to directory as soon as chunk arrive
+        Partial file is kept as <id>.part, same offer later resume from it
+
+        :param self:        Instances attributes
+        :param directory:   directory where file is written
+        :param message:     offer message, from unpack_file_control
+        """
+        name = os.path.basename(str(message.get("name", "")))
+        size = message.get("size", None)
+        if name in ("", ".", "..") or not isinstance(size, int) or size < 0:
+            raise FileTransferError("File offer is invalid")
+        super(IncomingFile, self).__init__(message["id"], name, size)
+
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.part_path = os.path.join(directory, "{}.part".format(self.id.hex()))
+
+        # * Unbuffered, chunk is written from receive buffer straight to file
+        fd = os.open(self.part_path, os.O_RDWR | os.O_CREAT, 0o644)
+        self.file = open(fd, "r+b", buffering=0)
+        self.offset = min(os.fstat(fd).st_size, size)
+        self.file.truncate(self.offset)
+
+    @property
+    def complete(self) -> bool:
+        """
+        :return:        True if every byte is written
+        """
+        return self.offset >= self.size
+
+    def write(self, offset: int, data):
+        """
+        Write chunk at offset, chunk come in order
+
+        :param self:        Instances attributes
+        :param offset:      position of data in file
+        :param data:        bytes or memoryview
+        """
+        if offset != self.offset:
+            raise FileTransferError(
+                "Chunk at {} but {} is expected".format(offset, self.offset)
+            )
+        if offset + len(data) > self.size:
+            raise FileTransferError("Chunk is past end of file")
+
+        self.file.seek(offset)
+        with memoryview(data) as view:
+            while view:
+                written = self.file.write(view)
+                view = view[written:]
+        self.offset += len(data)
+
+    def finish(self) -> str:
+        """
+        Close file and move it to it name, never replace existing file
+
+        :param self:        Instances attributes
+
+        :return:            path of received file
+        """
+        self.close()
+        base, extension = os.path.splitext(self.name)
+        path = os.path.join(self.directory, self.name)
+        copy = 1
+        while os.path.exists(path):
+            path = os.path.join(
+                self.directory, "{} ({}){}".format(base, copy, extension)
+            )
+            copy += 1
+        os.replace(self.part_path, path)
+
+        self.done = True
+        self.path = path
+        return path
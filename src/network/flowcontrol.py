@@ -0,0 +1,87 @@
+import threading
+
+# * Direction of a byte budget
+# *   SEND  : bytes queued to other node, not written to socket yet
+# *   RECV  : bytes received from other node, not processed yet
+SEND = "send"
+RECV = "recv"
+
+
+class ByteBudget:
+    def __init__(
+        self,
+        direction: str,
+        high_watermark: int,
+        low_watermark: int,
+        limit: int = None,
+        on_change=None,
+    ):
+        """
+        Byte budget of one direction of one connection
+        Using it past high_watermark pause the connection,
+        it resume only when usage go back down to low_watermark
+        Gap between the two stop it from flapping on every frame
+
+        :param self:            Instances attributes
+        :param direction:       SEND or RECV
+        :param high_watermark:  Usage that pause the connection
+        :param low_watermark:   Usage that resume the connection
+        :param limit:           Max usage, acquire over it fail, None for no limit
+        :param on_change:       func(budget), called when paused change
+        """
+        if not 0 <= low_watermark <= high_watermark:
+            raise ValueError("low_watermark must be between 0 and high_watermark")
+
+        self.direction = direction
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.limit = limit
+        self.on_change = on_change
+        self.lock = threading.Lock()
+
+        self.used = 0
+        self.paused = False
+
+    def __len__(self) -> int:
+        """
+        :return:        Amount of bytes in use
+        """
+        return self.used
+
+    def acquire(self, amount: int) -> bool:
+        """
+        Use amount of bytes from the budget
+
+        :param self:        Instances attributes
+        :param amount:      Amount of bytes
+
+        :return:            True if acquired, False if it would go over limit
+        """
+        with self.lock:
+            if self.limit is not None and self.used + amount > self.limit:
+                return False
+            self.used += amount
+            changed = not self.paused and self.used >= self.high_watermark
+            if changed:
+                self.paused = True
+
+        # * Outside the lock, callback might use the budget
+        if changed and self.on_change is not None:
+            self.on_change(self)
+        return True
+
+    def release(self, amount: int):
+        """
+        Give back amount of bytes to the budget
+
+        :param self:        Instances attributes
+        :param amount:      Amount of bytes
+        """
+        with self.lock:
+            self.used = max(self.used - amount, 0)
+            changed = self.paused and self.used <= self.low_watermark
+            if changed:
+                self.paused = False
+
+        if changed and self.on_change is not None:
+            self.on_change(self)
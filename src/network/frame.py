@@ -0,0 +1,232 @@
+import json
+import struct
+
+# * Frame layout, every field is big endian
+# *   version       : 1 byte, FRAME_VERSION
+# *   frame_type    : 1 byte, FRAME_*
+# *   content_type  : 1 byte, CONTENT_*, how payload is decoded
+# *   flags         : 1 byte, FLAG_*
+# *   stream        : 1 byte, STREAM_*, logical channel of the frame
+# *   length        : 4 bytes, length of payload that follow the header
+# * No delimiter, so payload can contain any byte
+FRAME_VERSION = 3
+HEADER = struct.Struct("!BBBBBI")
+HEADER_SIZE = HEADER.size
+
+# * Default max payload size of one frame, after decompression too
+# * Length field allow 4 GiB, receiver must not trust it
+MAX_FRAME_SIZE = 4 * 1024 * 1024
+
+# * Frame type
+# *   FRAME_DATA    : data for application
+# *   FRAME_HELLO   : handshake, id and port exchange
+# *   FRAME_GOSSIP  : data flooded through the mesh, see gossip.py
+# *   FRAME_ROUTE   : route advertisement, see routing.py
+# *   FRAME_UNICAST : data routed to node that is not a neighbour
+# *   FRAME_PING    : liveness and rtt probe, see heartbeat.py
+# *   FRAME_PONG    : answer to FRAME_PING
+# *   FRAME_FILE    : file transfer control, see filetransfer.py
+# *   FRAME_FILE_CHUNK : part of a file, see filetransfer.py
+FRAME_DATA = 0x01
+FRAME_HELLO = 0x02
+FRAME_GOSSIP = 0x03
+FRAME_ROUTE = 0x04
+FRAME_UNICAST = 0x05
+FRAME_PING = 0x06
+FRAME_PONG = 0x07
+FRAME_FILE = 0x08
+FRAME_FILE_CHUNK = 0x09
+
+# * Content type, data frame carry the type of it payload
+# * So receiver never have to guess it
+# *   CONTENT_NONE      : not application data, ex: ping
+# *   CONTENT_BINARY    : bytes
+# *   CONTENT_TEXT      : str, utf-8
+# *   CONTENT_JSON      : dict, json utf-8
+# *   CONTENT_CONTROL   : str, utf-8, notice for Node not for application
+CONTENT_NONE = 0x00
+CONTENT_BINARY = 0x01
+CONTENT_TEXT = 0x02
+CONTENT_JSON = 0x03
+CONTENT_CONTROL = 0x04
+
+# * Stream, logical channel that share the connection, see sendqueue.py
+# * Sender keep a queue per stream, streams take turn on the socket by weight
+# * So frames of one stream keep their order, but never wait for other stream
+# *   STREAM_CONTROL    : connection management, ex: hello, route, ping
+# *   STREAM_CHAT       : application data
+# *   STREAM_BULK       : big transfer, ex: file chunk
+STREAM_CONTROL = 0x00
+STREAM_CHAT = 0x01
+STREAM_BULK = 0x02
+
+# * frame type -> stream it is sent on, STREAM_CHAT if not listed
+FRAME_STREAMS = {
+    FRAME_HELLO: STREAM_CONTROL,
+    FRAME_ROUTE: STREAM_CONTROL,
+    FRAME_PING: STREAM_CONTROL,
+    FRAME_PONG: STREAM_CONTROL,
+    FRAME_FILE: STREAM_CONTROL,
+    FRAME_FILE_CHUNK: STREAM_BULK,
+}
+
+# * Frame flags
+# *   FLAG_COMPRESSED   : payload is compressed by codec of the connection
+FLAG_COMPRESSED = 0x01
+
+
+class FrameError(Exception):
+    """
+    Raised when received bytes is not a valid frame
+    """
+
+
+class FrameSizeError(FrameError):
+    """
+    Raised when frame is bigger than max frame size
+    """
+
+
+class BufferLimitError(FrameError):
+    """
+    Raised when frame does not fit in max receive buffer
+    """
+
+
+def default_stream(frame_type: int, content_type: int) -> int:
+    """
+    :return:        stream a frame is sent on, when sender does not choose
+    """
+    if content_type == CONTENT_CONTROL:
+        return STREAM_CONTROL
+    return FRAME_STREAMS.get(frame_type, STREAM_CHAT)
+
+
+def pack_header(
+    frame_type: int, content_type: int, flags: int, length: int, stream: int = None
+) -> bytes:
+    """
+    Pack frame header, for payload that is sent apart from it
+
+    :param frame_type:      type of the frame, FRAME_*
+    :param content_type:    type of the payload, CONTENT_*
+    :param flags:           bit flags of the frame
+    :param length:          length of payload
+    :param stream:          STREAM_*, default by frame and content type
+
+    :return:                bytes of the header
+    """
+    if stream is None:
+        stream = default_stream(frame_type, content_type)
+    return HEADER.pack(FRAME_VERSION, frame_type, content_type, flags, stream, length)
+
+
+def pack_frame(
+    payload: bytes,
+    frame_type: int = FRAME_DATA,
+    flags: int = 0,
+    content_type: int = CONTENT_BINARY,
+    stream: int = None,
+) -> bytes:
+    """
+    Pack payload into a frame, header + payload
+
+    :param payload:         bytes to send
+    :param frame_type:      type of the frame, FRAME_*
+    :param flags:           bit flags of the frame
+    :param content_type:    type of the payload, CONTENT_*
+    :param stream:          STREAM_*, default by frame and content type
+
+    :return:                bytes ready to be sent
+    """
+    return pack_header(frame_type, content_type, flags, len(payload), stream) + payload
+
+
+def unpack_header(buffer, offset: int = 0):
+    """
+    Unpack frame header from buffer at offset
+    Buffer need to have at least HEADER_SIZE bytes after offset
+
+    :param buffer:      bytes, bytearray or memoryview
+    :param offset:      position of the header in buffer
+
+    :return:            tuple of (frame_type, content_type, flags, length)
+    """
+    version, frame_type, content_type, flags, _, length = HEADER.unpack_from(
+        buffer, offset
+    )
+    if version != FRAME_VERSION:
+        raise FrameError("Unsupported frame version {}".format(version))
+    return frame_type, content_type, flags, length
+
+
+def frame_stream(encoded_frame) -> int:
+    """
+    :return:        stream of a packed frame, from it header
+    """
+    return HEADER.unpack_from(encoded_frame)[4]
+
+
+def encode_payload(data, encoding="utf-8"):
+    """
+    Encode data that can be sent to bytes payload
+
+    :param data:        str, dict as json, or bytes
+    :param encoding:    encoding method
+
+    :return:            tuple of (encoded payload, content type)
+    """
+    if isinstance(data, str):
+        return data.encode(encoding), CONTENT_TEXT
+    elif isinstance(data, dict):
+        return json.dumps(data).encode(encoding), CONTENT_JSON
+    elif isinstance(data, bytes):
+        return data, CONTENT_BINARY
+    raise TypeError("Invalid datatype, str, dict or bytes is valid")
+
+
+def decode_text(packet) -> str:
+    """
+    :return:        packet as str
+    """
+    return str(packet, "utf-8")
+
+
+def decode_json(packet) -> dict:
+    """
+    :return:        packet as dict
+    """
+    return json.loads(str(packet, "utf-8"))
+
+
+# * content type -> function that decode payload of that type
+DECODERS = {
+    CONTENT_BINARY: bytes,
+    CONTENT_TEXT: decode_text,
+    CONTENT_JSON: decode_json,
+    CONTENT_CONTROL: decode_text,
+}
+
+
+def decode_payload(packet, content_type: int):
+    """
+    Decode payload that received, by it content type
+    packet is only read here, result never refer to it
+
+    :param packet:          payload of a frame, bytes or memoryview
+    :param content_type:    type of the payload, CONTENT_*
+
+    :return:                parsed data, dict, str or bytes
+    """
+    decoder = DECODERS.get(content_type, None)
+    if decoder is None:
+        raise FrameError("Unknown content type {}".format(content_type))
+
+    try:
+        return decoder(packet)
+
+    # * Sender lied about the content type
+    except ValueError as e:
+        raise FrameError(
+            "Invalid payload for content type {}: {}".format(content_type, e)
+        )
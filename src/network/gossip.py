@@ -0,0 +1,114 @@
+import collections
+import struct
+import threading
+
+from . import frame
+
+# * Gossip payload layout, inside a FRAME_GOSSIP frame
+# *   message_id    : 16 bytes, unique per message, uuid4
+# *   ttl           : 1 byte, hop left, relayed only while ttl > 1
+# *   origin_length : 1 byte, length of origin
+# *   origin        : id of node that create the message, utf-8
+# *   payload       : same as FRAME_DATA payload
+GOSSIP_HEADER = struct.Struct("!16sBB")
+GOSSIP_HEADER_SIZE = GOSSIP_HEADER.size
+
+DEFAULT_TTL = 16
+MAX_TTL = 255
+
+
+def pack_gossip(
+    message_id: bytes,
+    ttl: int,
+    origin: str,
+    payload,
+    content_type: int = frame.CONTENT_BINARY,
+) -> bytes:
+    """
+    Pack gossip message into a FRAME_GOSSIP frame
+
+    :param message_id:      16 bytes, id of the message
+    :param ttl:             hop left, 1 to MAX_TTL
+    :param origin:          id of node that create the message
+    :param payload:         encoded payload, bytes or memoryview
+    :param content_type:    type of the payload, frame.CONTENT_*
+
+    :return:                bytes ready to be sent
+    """
+    encoded_origin = origin.encode("utf-8")
+    if len(encoded_origin) > 255:
+        raise frame.FrameError("Gossip origin id is too long")
+    if not 0 < ttl <= MAX_TTL:
+        raise frame.FrameError("Gossip ttl {} out of range".format(ttl))
+
+    header = GOSSIP_HEADER.pack(message_id, ttl, len(encoded_origin))
+    return frame.pack_frame(
+        b"".join((header, encoded_origin, payload)),
+        frame_type=frame.FRAME_GOSSIP,
+        content_type=content_type,
+    )
+
+
+def unpack_gossip(packet):
+    """
+    Unpack payload of a FRAME_GOSSIP frame
+
+    :param packet:      payload of the frame, bytes or memoryview
+
+    :return:            tuple of (message_id, ttl, origin, payload as memoryview)
+    """
+    if len(packet) < GOSSIP_HEADER_SIZE:
+        raise frame.FrameError("Gossip frame is too short")
+
+    message_id, ttl, origin_length = GOSSIP_HEADER.unpack_from(packet)
+    payload_start = GOSSIP_HEADER_SIZE + origin_length
+    if len(packet) < payload_start:
+        raise frame.FrameError("Gossip origin is truncated")
+
+    with memoryview(packet) as view:
+        try:
+            origin = str(view[GOSSIP_HEADER_SIZE:payload_start], "utf-8")
+        except UnicodeDecodeError:
+            raise frame.FrameError("Gossip origin is not utf-8")
+        payload = view[payload_start:]
+
+    return message_id, ttl, origin, payload
+
+
+class DedupCache:
+    def __init__(self, capacity: int = 8192):
+        """
+        Bounded cache of message id already seen, least recently seen is evicted
+        Gossip relay forward a message only when it is new in here
+
+        :param self:        Instances attributes
+        :param capacity:    Max amount of message id to remember
+        """
+        self.capacity = capacity
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """
+        :return:        Amount of message id remembered
+        """
+        return len(self.entries)
+
+    def add(self, message_id: bytes) -> bool:
+        """
+        Remember message id
+
+        :param self:        Instances attributes
+        :param message_id:  id of the message
+
+        :return:            True if message id is new, False if already seen
+        """
+        with self.lock:
+            if message_id in self.entries:
+                self.entries.move_to_end(message_id)
+                return False
+
+            self.entries[message_id] = None
+            if len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+            return True
@@ -0,0 +1,158 @@
+import json
+import socket
+import time
+
+from . import frame
+
+# * Max payload size of a hello frame
+MAX_HELLO_SIZE = 4096
+
+
+class HandshakeError(Exception):
+    """
+    Raised when handshake with other node failed or took too long
+    """
+
+
+def pack_hello(info: dict) -> bytes:
+    """
+    Pack handshake info into a FRAME_HELLO frame
+
+    :param info:        dict, our info for other node
+
+    :return:            bytes ready to be sent
+    """
+    return frame.pack_frame(
+        json.dumps(info).encode("utf-8"),
+        frame_type=frame.FRAME_HELLO,
+        content_type=frame.CONTENT_JSON,
+    )
+
+
+def unpack_hello(frame_type: int, payload) -> dict:
+    """
+    Unpack handshake info from a frame
+
+    :param frame_type:  type of the frame received
+    :param payload:     payload of the frame received
+
+    :return:            dict, info of other node
+    """
+    if frame_type != frame.FRAME_HELLO:
+        raise HandshakeError("Expected hello frame, got type {}".format(frame_type))
+    try:
+        info = json.loads(str(payload, "utf-8"))
+    except (UnicodeDecodeError, json.decoder.JSONDecodeError) as e:
+        raise HandshakeError("Invalid hello frame, {}".format(str(e)))
+    if not isinstance(info, dict) or "id" not in info:
+        raise HandshakeError("Invalid hello frame, no id")
+    return info
+
+
+def try_unpack_hello(buffer):
+    """
+    Unpack handshake info from bytes received so far
+
+    :param buffer:      bytes or bytearray, received from other node
+
+    :return:            dict, info of other node
+                        None if hello frame is not complete yet
+    """
+    if len(buffer) < frame.HEADER_SIZE:
+        return None
+    try:
+        frame_type, content_type, flags, length = frame.unpack_header(buffer)
+    except frame.FrameError as e:
+        raise HandshakeError(str(e))
+
+    # * hello only carry id and port, anything big is not a hello
+    if length > MAX_HELLO_SIZE:
+        raise HandshakeError("Hello frame too big, {} bytes".format(length))
+
+    if len(buffer) < frame.HEADER_SIZE + length:
+        return None
+    payload = bytes(buffer[frame.HEADER_SIZE : frame.HEADER_SIZE + length])
+    return unpack_hello(frame_type, payload)
+
+
+def remaining_time(deadline: float) -> float:
+    """
+    Time left until deadline
+
+    :param deadline:    time.monotonic() value when handshake must be done
+
+    :return:            second left, raise HandshakeError if already passed
+    """
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise HandshakeError("Handshake deadline exceeded")
+    return remaining
+
+
+def recv_exactly(sock: socket.socket, size: int, deadline: float) -> bytes:
+    """
+    Receive exactly size bytes from sock before deadline
+    Never read more than size, so next frame stay in socket
+
+    :param sock:        socket.socket instances
+    :param size:        Amount of bytes to receive
+    :param deadline:    time.monotonic() value when handshake must be done
+
+    :return:            received bytes
+    """
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    try:
+        while received < size:
+            sock.settimeout(remaining_time(deadline))
+            amount = sock.recv_into(view[received:])
+            if amount == 0:
+                raise HandshakeError("Connection closed during handshake")
+            received += amount
+    except socket.timeout:
+        raise HandshakeError("Handshake deadline exceeded")
+    except OSError as e:
+        raise HandshakeError(str(e))
+    finally:
+        view.release()
+    return bytes(buffer)
+
+
+def send_hello(sock: socket.socket, info: dict, deadline: float):
+    """
+    Send our handshake info before deadline
+
+    :param sock:        socket.socket instances
+    :param info:        dict, our info for other node
+    :param deadline:    time.monotonic() value when handshake must be done
+    """
+    try:
+        sock.settimeout(remaining_time(deadline))
+        sock.sendall(pack_hello(info))
+    except socket.timeout:
+        raise HandshakeError("Handshake deadline exceeded")
+    except OSError as e:
+        raise HandshakeError(str(e))
+
+
+def recv_hello(sock: socket.socket, deadline: float) -> dict:
+    """
+    Receive handshake info of other node before deadline
+
+    :param sock:        socket.socket instances
+    :param deadline:    time.monotonic() value when handshake must be done
+
+    :return:            dict, info of other node
+    """
+    try:
+        header = recv_exactly(sock, frame.HEADER_SIZE, deadline)
+        frame_type, content_type, flags, length = frame.unpack_header(header)
+    except frame.FrameError as e:
+        raise HandshakeError(str(e))
+
+    # * hello only carry id and port, anything big is not a hello
+    if length > MAX_HELLO_SIZE:
+        raise HandshakeError("Hello frame too big, {} bytes".format(length))
+
+    return unpack_hello(frame_type, recv_exactly(sock, length, deadline))
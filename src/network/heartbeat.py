@@ -0,0 +1,172 @@
+import struct
+import threading
+import time
+
+from . import frame
+
+# * Ping payload layout, inside a FRAME_PING frame
+# *   timestamp : 8 bytes, time.monotonic_ns() of sender
+# * Pong echo the payload back, so only sender clock is used
+PING = struct.Struct("!Q")
+
+DEFAULT_INTERVAL = 5.0
+DEFAULT_TIMEOUT = 15.0
+
+
+def pack_ping(timestamp: int = None) -> bytes:
+    """
+    Pack ping into a FRAME_PING frame
+
+    :param timestamp:   time.monotonic_ns(), default now
+
+    :return:            bytes ready to be sent
+    """
+    if timestamp is None:
+        timestamp = time.monotonic_ns()
+    return frame.pack_frame(
+        PING.pack(timestamp),
+        frame_type=frame.FRAME_PING,
+        content_type=frame.CONTENT_NONE,
+    )
+
+
+def pack_pong(packet) -> bytes:
+    """
+    Pack pong into a FRAME_PONG frame, answer to a ping
+
+    :param packet:      payload of the FRAME_PING frame
+
+    :return:            bytes ready to be sent
+    """
+    unpack_ping(packet)
+    return frame.pack_frame(
+        bytes(packet), frame_type=frame.FRAME_PONG, content_type=frame.CONTENT_NONE
+    )
+
+
+def unpack_ping(packet) -> int:
+    """
+    Unpack payload of a FRAME_PING or FRAME_PONG frame
+
+    :param packet:      payload of the frame, bytes or memoryview
+
+    :return:            timestamp of the ping, time.monotonic_ns()
+    """
+    if len(packet) != PING.size:
+        raise frame.FrameError("Ping frame must be {} bytes".format(PING.size))
+    return PING.unpack_from(packet)[0]
+
+
+class RttEstimator:
+    def __init__(self, alpha: float = 0.125, beta: float = 0.25):
+        """
+        Round trip time of one connection, smoothed like TCP does (RFC 6298)
+        jitter is the smoothed deviation of rtt
+
+        :param self:        Instances attributes
+        :param alpha:       Weight of new sample in rtt
+        :param beta:        Weight of new sample in jitter
+        """
+        self.alpha = alpha
+        self.beta = beta
+
+        # * rtt, jitter, min_rtt in second, None until first pong
+        # * last_seen, time.monotonic() of last frame from other node
+        self.rtt = None
+        self.jitter = None
+        self.min_rtt = None
+        self.samples = 0
+        self.last_seen = time.monotonic()
+
+    def seen(self):
+        """
+        Frame received from other node, it is alive
+        """
+        self.last_seen = time.monotonic()
+
+    def idle(self) -> float:
+        """
+        :return:        Second since last frame from other node
+        """
+        return time.monotonic() - self.last_seen
+
+    def sample(self, rtt: float):
+        """
+        Add measured round trip time
+
+        :param self:        Instances attributes
+        :param rtt:         Round trip time in second
+        """
+        if self.rtt is None:
+            self.rtt = rtt
+            self.jitter = rtt / 2
+            self.min_rtt = rtt
+        else:
+            self.jitter += self.beta * (abs(self.rtt - rtt) - self.jitter)
+            self.rtt += self.alpha * (rtt - self.rtt)
+            self.min_rtt = min(self.min_rtt, rtt)
+        self.samples += 1
+
+    def snapshot(self) -> dict:
+        """
+        :return:        dict of rtt, jitter and min_rtt in ms, idle in second
+        """
+        return {
+            "rtt": None if self.rtt is None else self.rtt * 1000,
+            "jitter": None if self.jitter is None else self.jitter * 1000,
+            "min_rtt": None if self.min_rtt is None else self.min_rtt * 1000,
+            "samples": self.samples,
+            "idle": self.idle(),
+        }
+
+
+class HeartbeatMonitor(threading.Thread):
+    def __init__(self, node):
+        """
+        Ping every connection of node each node.heartbeat_interval
+        Connection that send nothing for node.heartbeat_timeout is stopped
+        Unless reading from it is paused, then we can't tell if it is silent
+        One thread serve every connection, ping is encoded once and shared
+
+        :param self:        Instances attributes
+        :param node:        Node or AsyncNode to watch
+        """
+        self.node = node
+
+        # * terminate flag, flag for thread termination
+        self.terminate_flag = threading.Event()
+
+        super(HeartbeatMonitor, self).__init__()
+
+    def run(self):
+        """
+        Run HeartbeatMonitor from threading.Thread parent class
+
+        :param self:        Instances attributes
+        """
+        while not self.terminate_flag.wait(self.node.heartbeat_interval):
+            self.node.broadcast_frame(pack_ping())
+
+            for connection in self.node.all_nodes:
+                # * We don't read from it, silence is our own backpressure
+                # * Timeout start over once reading is resumed
+                if connection.reading_paused:
+                    connection.latency.seen()
+                    continue
+
+                idle = connection.latency.idle()
+                if idle > self.node.heartbeat_timeout:
+                    self.node.debug_print(
+                        "HeartbeatMonitor: {} is silent for {:.1f}s".format(
+                            connection.id, idle
+                        )
+                    )
+                    connection.stop(drain=False)
+
+    def stop(self):
+        """
+        Stop this HeartbeatMonitor
+
+        :param self:        Instances attributes
+        """
+        self.terminate_flag.set()
@@ -0,0 +1,580 @@
+import bisect
+import json
+import os
+import threading
+import weakref
+
+# * Bucket upper bounds
+# * SIZE_BUCKETS, bytes of one message
+# * DURATION_BUCKETS, second
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+DURATION_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class CellOwner:
+    """
+    Kept only in thread local storage of a metric
+    It is collected when its thread exit, that retire the cell of the thread
+    """
+
+
+class Metric:
+    # * kind, metric type name used by prometheus
+    kind = None
+
+    def __init__(self, name: str, help: str, label: str = None):
+        """
+        Base of every metric
+        Every thread add into it own cell, so writer never wait for a lock
+        Cells are only summed when metric is read
+        Cell of exited thread is merged into retired, so cells stay one per thread
+
+        :param self:        Instances attributes
+        :param name:        Name of the metric, ex: network_bytes_sent_total
+        :param help:        One line description of the metric
+        :param label:       Name of the label, ex: peer, None for no label
+        """
+        self.name = name
+        self.help = help
+        self.label = label
+
+        # * local, cell of current thread, and its CellOwner
+        # * cells, cell of every live thread, id of cell -> label value -> value
+        # * retired, cells of exited thread added together, label value -> value
+        self.local = threading.local()
+        self.cells = dict()
+        self.retired = dict()
+        self.lock = threading.Lock()
+
+    def cell(self) -> dict:
+        """
+        :return:        Cell of current thread, created on first write
+        """
+        cell = getattr(self.local, "cell", None)
+        if cell is None:
+            cell = self.local.cell = dict()
+            self.local.owner = CellOwner()
+            with self.lock:
+                self.cells[id(cell)] = cell
+            weakref.finalize(self.local.owner, self.retire, cell)
+        return cell
+
+    def retire(self, cell: dict):
+        """
+        Merge cell of exited thread into retired, nothing write to it anymore
+
+        :param self:        Instances attributes
+        :param cell:        Cell of the thread
+        """
+        with self.lock:
+            self.cells.pop(id(cell), None)
+            for label, value in cell.items():
+                self.add_entry(self.retired, label, value)
+
+    def remove(self, label):
+        """
+        Drop series of label, ex: peer that is disconnected
+        Its value go to series without label, so total never go down
+
+        :param self:        Instances attributes
+        :param label:       Label value
+        """
+        if label is None:
+            return
+        with self.lock:
+            for cell in list(self.cells.values()) + [self.retired]:
+                value = cell.pop(label, None)
+                if value is not None:
+                    self.add_entry(self.retired, None, value)
+
+    def add_entry(self, into: dict, label, value):
+        """
+        Add value of one cell into into[label], kind of metric know how
+
+        :param self:        Instances attributes
+        :param into:        dict of label value -> value, changed in place
+        :param label:       Label value
+        :param value:       Value from a cell, never kept in into
+        """
+        raise NotImplementedError
+
+    def snapshot_cells(self) -> list:
+        """
+        :return:        list of (label value, value) from every cell
+        """
+        with self.lock:
+            cells = list(self.cells.values())
+            items = list(self.retired.items())
+        return items + [item for cell in cells for item in list(cell.items())]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: int = 1, label: str = None):
+        """
+        Add amount to counter
+
+        :param self:        Instances attributes
+        :param amount:      Amount to add
+        :param label:       Label value, ex: id of peer
+        """
+        cell = self.cell()
+        cell[label] = cell.get(label, 0) + amount
+
+    def add_entry(self, into: dict, label, value):
+        into[label] = into.get(label, 0) + value
+
+    def values(self) -> dict:
+        """
+        :return:        dict of label value -> total
+        """
+        totals = dict()
+        for label, value in self.snapshot_cells():
+            self.add_entry(totals, label, value)
+        return totals
+
+    def total(self) -> int:
+        """
+        :return:        Sum of every label
+        """
+        return sum(value for label, value in self.snapshot_cells())
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, func, label: str = None):
+        """
+        Gauge that is read from func when metric is collected
+        So value that already exist, ex: queue depth, cost nothing to keep
+
+        :param self:        Instances attributes
+        :param name:        Name of the metric
+        :param help:        One line description of the metric
+        :param func:        A func () -> number, or dict of label value -> number
+        :param label:       Name of the label, None for no label
+        """
+        super(Gauge, self).__init__(name, help, label)
+        self.func = func
+
+    def values(self) -> dict:
+        """
+        :return:        dict of label value -> value
+        """
+        value = self.func()
+        if isinstance(value, dict):
+            return value
+        return {None: value}
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets, label: str = None):
+        """
+        Histogram with fixed buckets
+
+        :param self:        Instances attributes
+        :param name:        Name of the metric
+        :param help:        One line description of the metric
+        :param buckets:     Sorted bucket upper bounds, +Inf is added
+        :param label:       Name of the label, None for no label
+        """
+        super(Histogram, self).__init__(name, help, label)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, label: str = None):
+        """
+        Add a value to histogram
+
+        :param self:        Instances attributes
+        :param value:       Observed value
+        :param label:       Label value
+        """
+        cell = self.cell()
+        entry = cell.get(label, None)
+        if entry is None:
+            # * [count of each bucket and +Inf, sum, count]
+            entry = cell[label] = [[0] * (len(self.buckets) + 1), 0, 0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def add_entry(self, into: dict, label, value):
+        counts, total, count = value
+        entry = into.setdefault(label, [[0] * len(counts), 0, 0])
+        for index, bucket_count in enumerate(counts):
+            entry[0][index] += bucket_count
+        entry[1] += total
+        entry[2] += count
+
+    def values(self) -> dict:
+        """
+        :return:        dict of label value -> {"buckets", "sum", "count"}
+                        buckets is cumulative, bound -> count, like prometheus
+        """
+        merged = dict()
+        for label, value in self.snapshot_cells():
+            self.add_entry(merged, label, value)
+
+        values = dict()
+        for label, (counts, total, count) in merged.items():
+            cumulative = 0
+            buckets = dict()
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                buckets[str(bound)] = cumulative
+            values[label] = {"buckets": buckets, "sum": total, "count": count}
+        return values
+
+
+class LatencyHistogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, label: str = None, precision: int = 7):
+        """
+        HDR style histogram of duration, bucket width grow with the value
+        Every power of two is split into 2 ** (precision - 1) buckets,
+        so any percentile is within 2 ** (1 - precision) of the real one
+        from 1 ns to hours, without picking bucket bounds beforehand
+
+        :param self:        Instances attributes
+        :param name:        Name of the metric
+        :param help:        One line description of the metric
+        :param label:       Name of the label, None for no label
+        :param precision:   Significant bits kept of each value, 7 -> 1.6 %
+        """
+        super(LatencyHistogram, self).__init__(name, help, label)
+        self.precision = precision
+        self.sub_buckets = 1 << precision
+        self.half = 1 << (precision - 1)
+
+    def bucket_index(self, value_ns: int) -> int:
+        """
+        :return:        Index of bucket that hold value_ns
+        """
+        shift = value_ns.bit_length() - self.precision
+        if shift <= 0:
+            return value_ns
+        # * (value_ns >> shift) keep precision bits, top one always set
+        sub_bucket = (value_ns >> shift) - self.half
+        return self.sub_buckets + (shift - 1) * self.half + sub_bucket
+
+    def bucket_bound(self, index: int) -> int:
+        """
+        :return:        Upper bound of bucket index, ns, exclusive
+        """
+        if index < self.sub_buckets:
+            return index + 1
+        shift, sub_bucket = divmod(index - self.sub_buckets, self.half)
+        return (self.half + sub_bucket + 1) << (shift + 1)
+
+    def observe(self, value: float, label: str = None):
+        """
+        Add a duration to histogram
+
+        :param self:        Instances attributes
+        :param value:       Duration in second
+        :param label:       Label value, ex: stage
+        """
+        self.observe_ns(int(value * 1e9), label)
+
+    def observe_ns(self, value_ns: int, label: str = None):
+        """
+        Add a duration to histogram, no float on the way
+
+        :param self:        Instances attributes
+        :param value_ns:    Duration in ns, negative is counted as 0
+        :param label:       Label value, ex: stage
+        """
+        value_ns = max(value_ns, 0)
+        cell = self.cell()
+        entry = cell.get(label, None)
+        if entry is None:
+            # * [count of each used bucket, sum ns, count, max ns]
+            entry = cell[label] = [dict(), 0, 0, 0]
+        counts = entry[0]
+        index = self.bucket_index(value_ns)
+        counts[index] = counts.get(index, 0) + 1
+        entry[1] += value_ns
+        entry[2] += 1
+        if value_ns > entry[3]:
+            entry[3] = value_ns
+
+    def add_entry(self, into: dict, label, value):
+        counts, total, count, maximum = value
+        entry = into.setdefault(label, [dict(), 0, 0, 0])
+        for index, bucket_count in list(counts.items()):
+            entry[0][index] = entry[0].get(index, 0) + bucket_count
+        entry[1] += total
+        entry[2] += count
+        entry[3] = max(entry[3], maximum)
+
+    def merged(self) -> dict:
+        """
+        :return:        dict of label value -> [counts, sum ns, count, max ns]
+                        every cell added together
+        """
+        merged = dict()
+        for label, value in self.snapshot_cells():
+            self.add_entry(merged, label, value)
+        return merged
+
+    def percentiles(self, quantiles=(0.5, 0.9, 0.99, 0.999), label=None) -> dict:
+        """
+        :param quantiles:   Quantiles to get, 0 to 1
+        :param label:       Label value
+
+        :return:            dict of quantile -> second, empty if nothing observed
+        """
+        entry = self.merged().get(label, None)
+        if entry is None:
+            return dict()
+        return self.entry_percentiles(entry, quantiles)
+
+    def entry_percentiles(self, entry, quantiles) -> dict:
+        """
+        :return:        dict of quantile -> second of one merged entry
+                        Bound of the bucket is used, capped at max
+        """
+        counts, total, count, maximum = entry
+        result = dict()
+        indexes = sorted(counts)
+        position = 0
+        cumulative = counts[indexes[0]] if indexes else 0
+        for quantile in sorted(quantiles):
+            rank = max(quantile * count, 1)
+            while cumulative < rank and position < len(indexes) - 1:
+                position += 1
+                cumulative += counts[indexes[position]]
+            bound = self.bucket_bound(indexes[position]) if indexes else 0
+            result[quantile] = min(bound, maximum) / 1e9
+        return result
+
+    def values(self) -> dict:
+        """
+        :return:        dict of label value -> {"buckets", "sum", "count",
+                        "max", "percentiles"}, duration in second
+                        buckets is cumulative like prometheus, used bucket only
+        """
+        values = dict()
+        for label, entry in self.merged().items():
+            counts, total, count, maximum = entry
+            cumulative = 0
+            buckets = dict()
+            for index in sorted(counts):
+                cumulative += counts[index]
+                buckets[str(self.bucket_bound(index) / 1e9)] = cumulative
+            buckets["+Inf"] = cumulative
+            values[label] = {
+                "buckets": buckets,
+                "sum": total / 1e9,
+                "count": count,
+                "max": maximum / 1e9,
+                "percentiles": {
+                    str(quantile): value
+                    for quantile, value in self.entry_percentiles(
+                        entry, (0.5, 0.9, 0.99, 0.999)
+                    ).items()
+                },
+            }
+        return values
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """
+        Every metric of one node, by name
+        Metric is created once, then used by any thread
+
+        :param self:        Instances attributes
+        """
+        self.metrics = dict()
+        self.lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        """
+        Add metric, or get the one that already has the name
+
+        :param self:        Instances attributes
+        :param metric:      Metric to add
+
+        :return:            Metric registered with that name
+        """
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, label: str = None) -> Counter:
+        return self.register(Counter(name, help, label))
+
+    def gauge(self, name: str, help: str, func, label: str = None) -> Gauge:
+        return self.register(Gauge(name, help, func, label))
+
+    def histogram(self, name: str, help: str, buckets, label=None) -> Histogram:
+        return self.register(Histogram(name, help, buckets, label))
+
+    def latency(self, name: str, help: str, label=None) -> LatencyHistogram:
+        return self.register(LatencyHistogram(name, help, label))
+
+    def remove_label(self, label: str, value):
+        """
+        Drop series of label value from every metric with that label
+        ex: remove_label("peer", id) once peer is disconnected
+
+        :param self:        Instances attributes
+        :param label:       Name of the label
+        :param value:       Label value
+        """
+        with self.lock:
+            metrics = list(self.metrics.values())
+        for metric in metrics:
+            if metric.label == label:
+                metric.remove(value)
+
+    def collect(self) -> list:
+        """
+        :return:        list of (metric, values) of every metric
+        """
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return [(metric, metric.values()) for metric in metrics]
+
+    def to_json(self) -> dict:
+        """
+        :return:        dict of name -> {"type", "help", "label", "values"}
+                        Value without label is under key ""
+        """
+        return {
+            metric.name: {
+                "type": metric.kind,
+                "help": metric.help,
+                "label": metric.label,
+                "values": {
+                    "" if label is None else str(label): value
+                    for label, value in values.items()
+                },
+            }
+            for metric, values in self.collect()
+        }
+
+    def to_prometheus(self) -> str:
+        """
+        :return:        Every metric in prometheus text exposition format
+        """
+        lines = []
+        for metric, values in self.collect():
+            lines.append("# HELP {} {}".format(metric.name, metric.help))
+            lines.append("# TYPE {} {}".format(metric.name, metric.kind))
+            for label, value in values.items():
+                labels = dict()
+                if label is not None and metric.label is not None:
+                    labels[metric.label] = label
+
+                if metric.kind != "histogram":
+                    lines.append(format_sample(metric.name, labels, value))
+                    continue
+
+                for bound, count in value["buckets"].items():
+                    lines.append(
+                        format_sample(
+                            metric.name + "_bucket", dict(labels, le=bound), count
+                        )
+                    )
+                lines.append(format_sample(metric.name + "_sum", labels, value["sum"]))
+                lines.append(
+                    format_sample(metric.name + "_count", labels, value["count"])
+                )
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str, format: str = "prometheus"):
+        """
+        Write every metric to path, replaced at once so reader never see half
+
+        :param self:        Instances attributes
+        :param path:        File path
+        :param format:      "prometheus" or "json"
+        """
+        if format == "json":
+            text = json.dumps(self.to_json(), indent=2)
+        else:
+            text = self.to_prometheus()
+
+        temp_path = "{}.tmp".format(path)
+        with open(temp_path, "w") as f:
+            f.write(text)
+        os.replace(temp_path, path)
+
+
+def format_sample(name: str, labels: dict, value) -> str:
+    """
+    :return:        One prometheus sample line, ex: name{peer="a"} 1
+    """
+    if not labels:
+        return "{} {}".format(name, value)
+    label_text = ",".join(
+        '{}="{}"'.format(
+            key,
+            str(label).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for key, label in labels.items()
+    )
+    return "{}{{{}}} {}".format(name, label_text, value)
+
+
+class MetricsDumper(threading.Thread):
+    def __init__(
+        self,
+        registry: MetricsRegistry,
+        path: str,
+        interval: float = 10.0,
+        format: str = "prometheus",
+    ):
+        """
+        Dump registry to a file every interval, ex: for node exporter textfile
+
+        :param self:        Instances attributes
+        :param registry:    MetricsRegistry to dump
+        :param path:        File path
+        :param interval:    Second between dump
+        :param format:      "prometheus" or "json"
+        """
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.format = format
+
+        # * terminate flag, flag for thread termination
+        self.terminate_flag = threading.Event()
+
+        super(MetricsDumper, self).__init__(daemon=True)
+
+    def run(self):
+        """
+        Run MetricsDumper from threading.Thread parent class
+        Last dump is written on stop, so the file is never older than stop
+
+        :param self:        Instances attributes
+        """
+        while not self.terminate_flag.wait(self.interval):
+            self.dump()
+        self.dump()
+
+    def dump(self):
+        """
+        Dump once, error is printed but does not stop the thread
+
+        :param self:        Instances attributes
+        """
+        try:
+            self.registry.dump(self.path, self.format)
+        except OSError as e:
+            print("MetricsDumper: Can't write {}, {}".format(self.path, e))
+
+    def stop(self):
+        """
+        Stop this MetricsDumper
+
+        :param self:        Instances attributes
+        """
+        self.terminate_flag.set()
@@ -1,9 +1,11 @@
 import datetime
 import threading
-import time
 import uuid
 
 from .node import Node
+from .asyncnode import AsyncNode
+from .eventbus import EVENT_OVERHEAD, Event, EventBus, EventType
+from .metrics import MetricsDumper
 
 # ? Is threading.Thread even needed ?
 # ? Our upperclass, main_controller can send using it function
@@ -13,16 +15,31 @@ from .node import Node
 
 
 class NetworkHandler(threading.Thread):
-    def __init__(self, host: str, port: str, callback=None, id=None, max_connection=1):
+    def __init__(
+        self,
+        host: str,
+        port: str,
+        callback=None,
+        id=None,
+        max_connection=1,
+        use_asyncio=False,
+        backlog=None,
+        event_queue_size=4096,
+    ):
         """
         Network Handler constructor
 
         :param self:            Attribute instances
         :param host:            IP address for networking
         :param port:            Port for networking
-        :param callback:        Function to handle output from NetworkHandler
+        :param callback:        func(type, source_id, dest_id, data), handle every
+                                event that has no handler in event_bus
         :param id:              ID for network handler
         :param max_connection:  max_connection to have
+        :param use_asyncio:     Use AsyncNode, one event loop for every connection
+                                instead of Node, one thread per connection
+        :param backlog:         Amount of pending connection for listen
+        :param event_queue_size:    Amount of event expected to wait in event_bus
         """
 
         self.debug = True
@@ -36,12 +53,23 @@ class NetworkHandler(threading.Thread):
             self.id = self.generate_random_id()
         self.callback = callback
 
+        # * event_bus, node callback is published here by network threads
+        # * and handled on event_bus thread, see event_bus.subscribe
+        self.event_bus = EventBus(maxsize=event_queue_size)
+        if callback is not None:
+            self.event_bus.default_handler = self.event_callback
+
         self.max_connection = max_connection
         self.current_connection = 0
+        self.use_asyncio = use_asyncio
+        self.backlog = backlog
         self.node = self.create_new_node()
 
-        # id + nodeConnection
-        self.conn_info = dict()
+        # * Connection registry of node, id -> NodeConnection and more
+        self.connections = self.node.connections
+
+        # * metrics_dumper, write node metrics to file, see start_metrics_dump
+        self.metrics_dumper = None
 
         super(NetworkHandler, self).__init__()
 
@@ -65,23 +93,31 @@ class NetworkHandler(threading.Thread):
         """
         Create new Node instances
 
-        :return:    Node class instances
+        :return:    Node or AsyncNode class instances
         """
-        return Node(
-            host=self.host, port=self.port, id=self.id, callback=self.node_callback
+        node_class = AsyncNode if self.use_asyncio else Node
+        return node_class(
+            host=self.host,
+            port=self.port,
+            id=self.id,
+            callback=self.node_callback,
+            max_connection=self.max_connection,
+            backlog=self.backlog,
         )
 
-    def send_to_node(self, data, node):
+    def send_to_node(self, data, node, stream=None):
         """
         Send data to node
 
         :param self:        Instances attributes
         :param data:        Data wanted to be send
         :param node:        NodeConnection
+        :param stream:      frame.STREAM_*, ex: STREAM_CONTROL to go first
+                            None to pick by size
         """
 
-        if node.id in self.conn_info.keys():
-            self.node.send_to_node(n=node, data=data)
+        if node in self.connections:
+            self.node.send_to_node(n=node, data=data, stream=stream)
 
     def send_to_all_nodes(self, data):
         """
@@ -91,26 +127,103 @@ class NetworkHandler(threading.Thread):
         :param data:        Data wanted to be send
         """
 
-        for conn_id in self.conn_info.keys():
-            self.send_to_node_with_id(conn_id, data)
+        # * Encoded once, every connection share the same frame
+        self.node.broadcast(data)
+
+    def gossip_to_all_nodes(self, data, ttl=None):
+        """
+        Send data to every node in the mesh, not only connected one
+        Each node relay it to it neighbours once
+
+        :param self:        Instances attributes
+        :param data:        Data wanted to be send
+        :param ttl:         Max amount of hop, None for node default
+
+        :return:            message id as hex str, None if data is invalid
+        """
+        return self.node.gossip(data, ttl=ttl)
+
+    def send_file(self, path, node=None) -> list:
+        """
+        Send file at path to node, or to every connected node
+        File is streamed in chunks, progress come as node_file_progress
+
+        :param self:        Instances attributes
+        :param path:        Path of the file
+        :param node:        NodeConnection, None for every connected node
+
+        :return:            list of transfer id as hex str, one per node
+        """
+        nodes = self.node.all_nodes if node is None else [node]
+        transfers = []
+        for n in nodes:
+            transfer_id = self.node.send_file(n, path)
+            if transfer_id is not None:
+                transfers.append(transfer_id)
+        return transfers
 
     def send_to_node_with_id(self, dest_id, data):
         """
         Send data to Node.id = dest_id
+        dest_id does not need to be our neighbour, node route it
 
         :param self:        Instances attributes
         :param dest_id:     Id of the Node destination
         :param data:        Data wanted to be send
         """
 
-        node_connection = self.conn_info.get(dest_id, None)
-        if node_connection is not None:
-            self.node.send_to_node(node_connection, data)
-        else:
+        # * Node route it, if dest is not our neighbour
+        if not self.node.send_to_node_with_id(dest_id, data):
             self.debug_print(
-                "send_to_node_with_id: No connection with such id {}".format(dest_id)
+                "send_to_node_with_id: Can't send to node with id {}".format(dest_id)
             )
 
+    def peer_latency(self, peer_id=None) -> dict:
+        """
+        Latency of connected peer, measured by heartbeat ping
+        rtt, jitter and min_rtt is in ms, None until first pong
+        idle is second since peer sent anything
+
+        :param self:        Instances attributes
+        :param peer_id:     Id of the peer, None for every peer
+
+        :return:            dict of peer id -> latency dict
+        """
+        if peer_id is None:
+            nodes = self.connections.all()
+        else:
+            node = self.connections.get(peer_id)
+            nodes = [] if node is None else [node]
+        return {node.id: node.latency.snapshot() for node in nodes}
+
+    def dropped_connection_counts(self) -> dict:
+        """
+        Amount of connection node dropped for invalid frame, by reason
+
+        :param self:        Instances attributes
+
+        :return:            dict of reason -> count
+        """
+        counts = dict.fromkeys(
+            ("oversized_frame", "buffer_overflow", "invalid_frame"), 0
+        )
+        counts.update(self.node.metric_dropped.values())
+        return counts
+
+    def start_metrics_dump(self, path, interval=10.0, format="prometheus"):
+        """
+        Dump node metrics to a file every interval, until this is stopped
+
+        :param self:        Instances attributes
+        :param path:        File path, replaced on every dump
+        :param interval:    Second between dump
+        :param format:      "prometheus" text or "json"
+        """
+        if self.metrics_dumper is not None:
+            self.metrics_dumper.stop()
+        self.metrics_dumper = MetricsDumper(self.node.metrics, path, interval, format)
+        self.metrics_dumper.start()
+
     def stop(self):
         """
         Stop this NetworkHandler
@@ -126,30 +239,40 @@ class NetworkHandler(threading.Thread):
 
         :param self:        Instances attributes
         """
-        elapsed_time = 0
         # * Start node
+        self.event_bus.start()
         self.node.start()
-        while not self.terminate_flag.is_set():
-            time.sleep(1)
-            elapsed_time = elapsed_time + 1
+
+        # * Block until stop, no polling
+        self.terminate_flag.wait()
 
         # * Stopping node
+        # * event_bus last, so disconnect event of every connection is handled
         self.node.stop()
+        self.node.join()
+        self.event_bus.stop()
+        self.event_bus.join()
+        if self.metrics_dumper is not None:
+            self.metrics_dumper.stop()
 
     def connect_to_node(self, host, port):
         """
         COnnect with other node with host and port
+        Connect and handshake is done in background, caller does not wait
 
         :param self:            Attributes instance
         :param host:            IP address to connect
         :param port:            Port to connect
+
+        :return:                concurrent.futures.Future of connection result
         """
-        self.node.connect_with_node(host=host, port=port, reconnect=True)
+        return self.node.connect_with_node_async(host=host, port=port, reconnect=True)
 
     # * Callback handler
     def node_callback(self, callback_type, main_node, node_connection, data):
         """
         Node callback handler, the function for handling callback on Node and NodeConnection class
+        Run on network thread, it only format data and publish it to event_bus
         Style guide :
             : callback_type         : Type of callback
             : source_id             : where is started us, other node, or sys
@@ -184,7 +307,6 @@ class NetworkHandler(threading.Thread):
                     node_connection.host,
                     node_connection.port,
                 )
-                self.conn_info[node_connection.id] = node_connection
 
             case "outbound_node_disconnected":
                 dest_id = node_connection.id
@@ -195,7 +317,6 @@ class NetworkHandler(threading.Thread):
                     node_connection.host,
                     node_connection.port,
                 )
-                self.conn_info.pop(node_connection.id, None)
 
             # * When we connected & diconnected with other node
             case "inbound_node_connected":
@@ -207,7 +328,6 @@ class NetworkHandler(threading.Thread):
                     node_connection.host,
                     node_connection.port,
                 )
-                self.conn_info[node_connection.id] = node_connection
 
             case "inbound_node_disconnected":
                 dest_id = main_node.id
@@ -218,7 +338,6 @@ class NetworkHandler(threading.Thread):
                     node_connection.host,
                     node_connection.port,
                 )
-                self.conn_info.pop(node_connection.id, None)
 
             # * When data received from other
             case "node_message":
@@ -227,6 +346,34 @@ class NetworkHandler(threading.Thread):
 
                 data = data
 
+            # * Control notice from other node, ex: reason it is closing
+            case "node_control":
+                dest_id = main_node.id
+                source_id = node_connection.id
+
+            # * Byte budget of a connection is paused or resumed
+            # * data is dict of direction, paused, used
+            case "node_flow_control":
+                dest_id = main_node.id
+                source_id = node_connection.id
+
+            # * Routed message is a message like any other for our user
+            # * source is node that create it, not the one forwarding it
+            case "node_routed_message":
+                callback_type = "node_message"
+                dest_id = main_node.id
+                source_id, data = data
+
+            # * When gossip received, source is node that create it
+            case "node_gossip_message":
+                dest_id = main_node.id
+                source_id, data = data
+
+            # * File transfer progress, data is dict from FileTransfer.snapshot
+            case "node_file_progress":
+                dest_id = main_node.id
+                source_id = node_connection.id
+
             # * node is stopping
             case "node_request_to_stop":
                 dest_id = main_node.id
@@ -241,10 +388,30 @@ class NetworkHandler(threading.Thread):
 
         # * Some callback are daemon
         # * So it's not escalated
-        if self.callback is not None and callback_type not in daemon_callback:
-            self.callback(callback_type, source_id, dest_id, data)
-        else:
+        if callback_type in daemon_callback:
             self.debug_print(data)
+            return
+
+        # * Message hold recv budget of connection until it is handled
+        # * Sized by it encoded payload, so dict is counted like str and bytes
+        event_type = EventType(callback_type)
+        size = 0
+        if event_type in (EventType.NODE_MESSAGE, EventType.NODE_GOSSIP_MESSAGE):
+            if node_connection is not None:
+                size = node_connection.parsed_size + EVENT_OVERHEAD
+
+        self.event_bus.publish(
+            Event(event_type, source_id, dest_id, data, node_connection, size)
+        )
+
+    def event_callback(self, event: Event):
+        """
+        Handle event that has no handler in event_bus, with self.callback
+
+        :param self:        Instances attributes
+        :param event:       Event from event_bus
+        """
+        self.callback(event.type.value, event.source_id, event.dest_id, event.data)
 
     @staticmethod
     def generate_random_id():
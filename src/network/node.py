@@ -1,26 +1,55 @@
+import concurrent.futures
+import selectors
 import threading
 import datetime
 import socket
 import time
 import uuid
 
+from . import (
+    compression,
+    filetransfer,
+    frame,
+    gossip,
+    heartbeat,
+    metrics,
+    routing,
+    sendqueue,
+)
+from .connectionregistry import INBOUND, OUTBOUND, ConnectionRegistry
+from .handshake import HandshakeError, recv_hello, send_hello, try_unpack_hello
 from .nodeconnection import NodeConnection
+from .reconnectscheduler import ReconnectScheduler
 
 
 class Node(threading.Thread):
-    def __init__(self, host, port, max_connection=1, id=None, callback=None):
+    def __init__(
+        self,
+        host,
+        port,
+        max_connection=1,
+        id=None,
+        callback=None,
+        backlog=None,
+        handshake_workers=None,
+    ):
         """
         Node class, construtor
 
         :param host:            The host we wanted Node to be started
         :param port:            The port of node we wanted
         :param max_connection:  Max amount of connection for this node to have
+                                on each direction, inbound and outbound
         :param id:              ID for this Node
         :param callback:        A func, that have (flag, Node, NodeConn, data)
                                 flag:       str, function that call the callback
                                 Node:       Node
                                 NodeConn:   NodeConnection
                                 data:       str, need to be parsed
+        :param backlog:         Amount of pending connection for listen
+                                default: max_connection, up to socket.SOMAXCONN
+        :param handshake_workers:   Amount of thread doing handshake concurrently
+                                    default: ThreadPoolExecutor default, by cpu count
         """
         # * init parent class
         super(Node, self).__init__()
@@ -42,7 +71,11 @@ class Node(threading.Thread):
             self.id = str(id)  # ehh it can always convert to str
 
         # * max connection
+        # * backlog, for listen
         self.max_connection = max_connection
+        if backlog is None:
+            backlog = min(max_connection, socket.SOMAXCONN)
+        self.backlog = max(backlog, 1)
 
         # * terminate flag, flag for thread termination
         self.terminate_flag = threading.Event()
@@ -50,31 +83,246 @@ class Node(threading.Thread):
         # * socket instance for node
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
-        # * connection with us
+        # * connection with us, indexed by id, (host, port) and direction
         # * inbound - (US) <- Them
         # * outbound- (US) -> Them
-        self.node_inbound = set()
-        self.node_outbound = set()
-
-        # * Number of recv message
-        self.message_count_recv = 0
+        self.connections = ConnectionRegistry()
+
+        # * metrics, every metric of this node, see init_metrics
+        self.metrics = metrics.MetricsRegistry()
+        self.init_metrics()
+
+        # * Limit of every connection, so memory per connection stay bounded
+        # * max_frame_size, max payload of one frame, after decompression too
+        # * max_recv_buffer, max bytes buffered for one connection
+        self.max_frame_size = frame.MAX_FRAME_SIZE
+        self.max_recv_buffer = frame.HEADER_SIZE + frame.MAX_FRAME_SIZE
+
+        # * gossip_cache, message id already seen, so each is relayed once
+        # * gossip_ttl, default hop limit of gossip message
+        self.gossip_cache = gossip.DedupCache()
+        self.gossip_ttl = gossip.DEFAULT_TTL
+
+        # * compression, codec name we offer on handshake, in preference order
+        # * compression_threshold, payload smaller than this is not compressed
+        self.compression = list(compression.CODECS)
+        self.compression_threshold = compression.COMPRESSION_THRESHOLD
+
+        # * Flow control, byte budget of every connection, see flowcontrol.py
+        # * Reading from node pause while it is over recv high watermark
+        # * Application is told when node is over send high watermark
+        # * send_buffer_limit, frame that does not fit in it is dropped
+        self.send_high_watermark = 1024 * 1024
+        self.send_low_watermark = 256 * 1024
+        self.send_buffer_limit = 8 * 1024 * 1024
+        self.recv_high_watermark = 1024 * 1024
+        self.recv_low_watermark = 256 * 1024
+
+        # * Stream, logical channel of a frame, see frame.py and sendqueue.py
+        # * stream_weights, share of socket each stream get while all are busy
+        # * stream_lanes, stream in high lane always go before the others
+        # * starvation_limit, bytes high lane send in a row while low lane wait
+        # * bulk_threshold, data payload this big is sent on STREAM_BULK
+        # * so it does not hold back chat, order with chat is not kept
+        # * notsent_lowat, max unsent bytes in kernel, None to leave it
+        self.stream_weights = dict(sendqueue.STREAM_WEIGHTS)
+        self.stream_lanes = dict(sendqueue.STREAM_LANES)
+        self.starvation_limit = 64 * 1024
+        self.bulk_threshold = 256 * 1024
+        self.notsent_lowat = 128 * 1024
+
+        # * routing_table, shortest path to node that is not our neighbour
+        # * routes_lock, held while a change is applied and advertised
+        # * pending_routes, node id whose route changed but is not sent yet
+        # * route_timer, send pending_routes after route_update_delay second
+        # * so a burst of connection is advertised once, not once per connection
+        self.routing_table = routing.RoutingTable(self.id)
+        self.routes_lock = threading.Lock()
+        self.pending_routes = set()
+        self.route_timer = None
+        self.route_update_delay = 0.1
+
+        # * File transfer, see filetransfer.py
+        # * download_dir, where received file is written
+        # * file_chunk_size, bytes of file in one FRAME_FILE_CHUNK frame
+        # * file_progress_step, progress is reported each this fraction of file
+        # * max_file_size, bigger offer is refused, so peer can't fill the disk
+        # * max_incoming_files, amount of file received at once, from every node
+        self.download_dir = "downloads"
+        self.file_chunk_size = filetransfer.CHUNK_SIZE
+        self.file_progress_step = 0.1
+        self.max_file_size = 4 * 1024 * 1024 * 1024
+        self.max_incoming_files = 8
+
+        # * frame_handlers, frame type -> method that handle it
+        self.frame_handlers = {
+            frame.FRAME_DATA: self.node_data,
+            frame.FRAME_GOSSIP: self.node_gossip,
+            frame.FRAME_UNICAST: self.node_unicast,
+            frame.FRAME_ROUTE: self.node_routes,
+            frame.FRAME_PING: self.node_ping,
+            frame.FRAME_PONG: self.node_pong,
+            frame.FRAME_FILE: self.node_file,
+            frame.FRAME_FILE_CHUNK: self.node_file_chunk,
+        }
+
+        # * handshake_timeout, deadline in second for one handshake
+        self.handshake_timeout = 5.0
+        self.init_handshakes(handshake_workers)
+
+        # * shutdown_timeout, max second a connection keep writing it queued
+        # * frames once stopped, so stopping node take at most about this long
+        self.shutdown_timeout = 1.0
 
         # * initialize server
         self.init_server()
 
-        # * List that need to be reconnected on connection was lost
-        self.reconnect_to_nodes = []
+        # * Scheduler for node that need to be reconnected on connection was lost
+        self.reconnect_scheduler = ReconnectScheduler(
+            callback=self.reconnect_node, retry_check=self.node_reconnection_error
+        )
+
+        # * Ping every connection each heartbeat_interval second
+        # * Connection silent for heartbeat_timeout second is dropped
+        self.heartbeat_interval = heartbeat.DEFAULT_INTERVAL
+        self.heartbeat_timeout = heartbeat.DEFAULT_TIMEOUT
+        self.heartbeat_monitor = heartbeat.HeartbeatMonitor(self)
+
+    def init_handshakes(self, handshake_workers=None):
+        """
+        Create what accept loop use to handshake, without blocking on one peer
+
+        :param self:                Instances attributes
+        :param handshake_workers:   Amount of thread in handshake_pool
+        """
+        # * pending_handshakes, accepted sock -> [client_adress, deadline, bytes]
+        # * their hello is read without blocking on accept thread
+        # * handshake_pool, finish handshake & connect_with_node_async
+        # * inbound_handshakes, hello read and handed to handshake_pool
+        # * still counted to max_connection until it is registered or closed
+        self.pending_handshakes = dict()
+        self.inbound_handshakes = 0
+        self.handshake_lock = threading.Lock()
+        self.handshake_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=handshake_workers, thread_name_prefix="handshake"
+        )
+
+        # * selector, wait for new connection and pending handshake
+        # * wakeup pair, writing to wakeup_send unblock selector, used by stop
+        self.selector = selectors.DefaultSelector()
+        self.wakeup_recv, self.wakeup_send = socket.socketpair()
+        self.wakeup_recv.setblocking(False)
+        self.wakeup_send.setblocking(False)
+
+    @property
+    def handshake_count(self) -> int:
+        """
+        :return:        Amount of accepted connection still in handshake
+        """
+        return len(self.pending_handshakes) + self.inbound_handshakes
+
+    def init_metrics(self):
+        """
+        Create every metric of this node
+        Counter labelled by peer is written by connection that own the peer
+
+        :param self:        Instances attributes
+        """
+        self.metric_bytes_received = self.metrics.counter(
+            "network_bytes_received_total", "Bytes received from peer", "peer"
+        )
+        self.metric_bytes_sent = self.metrics.counter(
+            "network_bytes_sent_total", "Bytes written to peer socket", "peer"
+        )
+        self.metric_frames_received = self.metrics.counter(
+            "network_frames_received_total", "Frames received from peer", "peer"
+        )
+        self.metric_frames_sent = self.metrics.counter(
+            "network_frames_sent_total", "Frames fully written to peer", "peer"
+        )
+        self.metric_recv_calls = self.metrics.counter(
+            "network_recv_calls_total", "recv syscall on peer socket", "peer"
+        )
+        self.metric_send_calls = self.metrics.counter(
+            "network_send_calls_total",
+            "send syscall on peer socket, transport write on asyncio",
+            "peer",
+        )
+        self.metric_dropped = self.metrics.counter(
+            "network_dropped_connections_total",
+            "Connection dropped for invalid frame",
+            "reason",
+        )
+        self.metric_message_bytes = self.metrics.histogram(
+            "network_message_bytes",
+            "Size of frame sent or received",
+            metrics.SIZE_BUCKETS,
+            "direction",
+        )
+        self.metric_handshake_seconds = self.metrics.histogram(
+            "network_handshake_seconds",
+            "Duration of successful handshake",
+            metrics.DURATION_BUCKETS,
+            "direction",
+        )
+        self.metrics.gauge(
+            "network_connections", "Connected peer", lambda: len(self.connections)
+        )
+        self.metrics.gauge(
+            "network_send_queue_bytes",
+            "Bytes queued to peer, not written yet",
+            lambda: {node.id: node.send_budget.used for node in self.all_nodes},
+            "peer",
+        )
+        self.metrics.gauge(
+            "network_pending_handshakes",
+            "Accepted connection waiting for hello",
+            lambda: self.handshake_count,
+        )
+
+    @property
+    def message_count_recv(self) -> int:
+        """
+        :return:            Number of frame received from every peer
+        """
+        return self.metric_frames_received.total()
+
+    def handshake_done(self, deadline: float, direction: str):
+        """
+        Record duration of successful handshake
+
+        :param self:        Instances attributes
+        :param deadline:    deadline of the handshake, start + handshake_timeout
+        :param direction:   INBOUND or OUTBOUND
+        """
+        self.metric_handshake_seconds.observe(
+            time.monotonic() - deadline + self.handshake_timeout, direction
+        )
 
     @property
-    def all_nodes(self):
+    def all_nodes(self) -> list:
         """
         Print all node that we connected
 
         :param self:        Instances attributes
 
-        :return:            concate of node_inbound and node_outbound set
+        :return:            snapshot of inbound and outbound connection
         """
-        return self.node_inbound | self.node_outbound
+        return self.connections.all()
+
+    @property
+    def node_inbound(self) -> list:
+        """
+        :return:            snapshot of inbound connection
+        """
+        return self.connections.all(INBOUND)
+
+    @property
+    def node_outbound(self) -> list:
+        """
+        :return:            snapshot of outbound connection
+        """
+        return self.connections.all(OUTBOUND)
 
     def debug_print(self, message: str):
         """
@@ -111,11 +359,11 @@ class Node(threading.Thread):
         # bind host and port to socket
         self.sock.bind((self.host, self.port))
 
-        # set timeout for socket, wait for n second to raise timeout exception
-        self.sock.settimeout(10.0)
+        # non blocking, selector tell us when there is connection to accept
+        self.sock.setblocking(False)
 
         # listen to n amount of connection
-        self.sock.listen(1)
+        self.sock.listen(self.backlog)
 
         if self.callback is not None:
             self.server_started()
@@ -128,104 +376,706 @@ class Node(threading.Thread):
         """
         self.node_request_to_stop()
         self.terminate_flag.set()
+        self.wakeup()
 
-    def run(self):
+    def wakeup(self):
         """
-        Run Node from threading.Thread parent class
+        Unblock selector of accept loop, safe to call from any thread
 
         :param self:        Instances attributes
         """
+        try:
+            self.wakeup_send.send(b"\x00")
 
-        while not self.terminate_flag.is_set():
-            try:
-                #! DEBUG
-                self.debug_print(
-                    "Node {}: Waiting for incoming connection".format(self.id)
-                )
+        # * Already pending wakeup, or node stopped
+        except OSError:
+            pass
 
-                # * conn:           a socket instance
-                # * client_address: tuple of (host, port)
-                conn, client_adress = self.sock.accept()
+    def run(self):
+        """
+        Run Node from threading.Thread parent class
 
-                #! DEBUG
-                self.debug_print(
-                    "Total inbound connection: {}".format(str(len(self.node_inbound)))
-                )
+        :param self:        Instances attributes
+        """
 
-                if len(self.node_inbound) < self.max_connection:
-                    connected_node_host = client_adress[0]
-                    connected_node_port = client_adress[1]
-                    # * Receive info from other node
-                    connected_node_id = conn.recv(4096).decode("utf-8")
-                    if ":" in connected_node_id:
-                        (
-                            connected_node_id,
-                            connected_node_port,
-                        ) = connected_node_id.split(":")
-
-                    # * send our ID, they already know our host and port
-                    conn.send(self.id.encode("utf-8"))
-
-                    # * Create new NodeConnection
-                    # * connection between client
-                    thread_client = self.create_new_connection(
-                        conn=conn,
-                        id=connected_node_id,
-                        host=connected_node_host,
-                        port=connected_node_port,
-                    )
-                    thread_client.start()
+        self.selector.register(self.sock, selectors.EVENT_READ)
+        self.selector.register(self.wakeup_recv, selectors.EVENT_READ)
+        self.reconnect_scheduler.start()
+        self.heartbeat_monitor.start()
 
-                    self.node_inbound.add(thread_client)
-                    self.inbound_node_connected(thread_client)
+        while not self.terminate_flag.is_set():
+            #! DEBUG
+            self.debug_print("Node {}: Waiting for incoming connection".format(self.id))
+
+            # * Block until next handshake deadline, stop wake it up
+            for key, mask in self.selector.select(timeout=self.handshake_wait()):
+                if key.fileobj is self.wakeup_recv:
+                    continue
+                if key.fileobj is self.sock:
+                    self.accept_connections()
                 else:
-                    self.debug_print("New Connection closed: Exceed connection allowed")
-                    conn.close()
-            except socket.timeout:
-                self.debug_print("Node: Connection timeout!")
+                    self.read_handshake(key.fileobj)
 
-            #! I cant anticipate what error will be raised
-            except Exception as e:
-                raise e
-
-            self.reconnect_nodes()
-            time.sleep(0.2)
+            self.expire_handshakes()
 
         self.debug_print("Node Stopping...")
+        self.reconnect_scheduler.stop()
+        self.reconnect_scheduler.join()
+        self.heartbeat_monitor.stop()
+        self.heartbeat_monitor.join()
+
+        # * No new handshake, wait for running one
+        for conn in list(self.pending_handshakes.keys()):
+            self.drop_handshake(conn)
+        self.handshake_pool.shutdown(wait=True, cancel_futures=True)
+        self.selector.close()
+        self.wakeup_recv.close()
+        self.wakeup_send.close()
 
         # * Send stop command to node
-        for node in self.node_inbound.copy():
-            node.stop()
-        for node in self.node_outbound.copy():
+        # * Each write it queued frames for up to shutdown_timeout, all at once
+        nodes = self.all_nodes
+        for node in nodes:
             node.stop()
 
-        # * sleep waiting for stop to be done
-        time.sleep(0.5)
-
         # * Join it all, waiting it
-        for node in self.node_inbound.copy():
-            node.join()
-        for node in self.node_outbound.copy():
+        for node in nodes:
             node.join()
 
-        self.sock.settimeout(None)
         self.sock.close()
         self.debug_print("Node {} has stopped".format(self.id))
 
     # * Sending Logic:
-    def send_to_node(self, n: NodeConnection, data):
+    def send_to_node(self, n: NodeConnection, data, stream=None):
         """
         Sending data to n
 
         :param self:            Attributes Instance
         :param n:               NodeConnection instances, that data need to go
         :param data:            Data to send
+        :param stream:          frame.STREAM_*, None to pick by size
         """
-        if n in self.node_inbound or n in self.node_outbound:
-            n.send(data=data)
+        if n in self.connections:
+            n.send(data=data, stream=stream)
         else:
             self.debug_print("send_to_node: Can't send data, node not found")
 
+    def send_to_node_with_id(self, dest_id: str, data, encoding="utf-8") -> bool:
+        """
+        Sending data to node with id, directly if it is our neighbour
+        Otherwise through neighbour on the shortest path
+
+        :param self:            Attributes Instance
+        :param dest_id:         ID of the node that data need to go
+        :param data:            Data to send
+        :param encoding:        encoding method
+
+        :return:                True if data is queued, False if dropped
+        """
+        node = self.connections.get(dest_id)
+        if node is not None:
+            return node.send(data, encoding)
+
+        node = self.connections.get(self.routing_table.next_hop(dest_id))
+        if node is None:
+            self.debug_print(
+                "send_to_node_with_id: No route to node {}".format(dest_id)
+            )
+            return False
+
+        try:
+            payload, content_type = frame.encode_payload(data, encoding)
+            encoded_frame = routing.pack_unicast(
+                dest_id, self.id, routing.MAX_DISTANCE, payload, content_type
+            )
+
+        except (TypeError, frame.FrameError) as e:
+            self.debug_print("send_to_node_with_id: Invalid data, \n{}".format(e))
+            return False
+        return node.send_frame(encoded_frame)
+
+    def pack_data(
+        self,
+        payload: bytes,
+        codec=None,
+        content_type: int = frame.CONTENT_BINARY,
+        stream: int = None,
+    ) -> bytes:
+        """
+        Pack encoded payload into a data frame, compressed if it is worth it
+        Payload of bulk_threshold or more is sent on STREAM_BULK
+
+        :param self:            Instances attributes
+        :param payload:         encoded payload, from frame.encode_payload
+        :param codec:           compression codec of the connection
+        :param content_type:    type of the payload, from frame.encode_payload
+        :param stream:          frame.STREAM_*, None to pick by size
+
+        :return:                bytes of the frame
+        """
+        if stream is None and len(payload) >= self.bulk_threshold:
+            stream = frame.STREAM_BULK
+
+        payload, flags = compression.compress_payload(
+            codec, payload, self.compression_threshold
+        )
+        return frame.pack_frame(
+            payload, flags=flags, content_type=content_type, stream=stream
+        )
+
+    def broadcast(self, data, encoding="utf-8", exclude=None) -> int:
+        """
+        Send data to every connection, data is encoded once
+        and compressed once per codec, connection share the same frame
+
+        :param self:        Instances attributes
+        :param data:        str, dict as json, or bytes
+        :param encoding:    encoding method
+        :param exclude:     connection that should not receive data
+
+        :return:            Amount of connection data is queued on
+        """
+        try:
+            payload, content_type = frame.encode_payload(data, encoding)
+
+        # * Invalid datatype, or non serialize data in dict so dumps failed
+        except TypeError as type_error:
+            self.debug_print("broadcast: Invalid data, \n{}".format(type_error))
+            return 0
+
+        encoded_frames = dict()
+        frames = []
+        for node in self.all_nodes:
+            if node is exclude:
+                continue
+            if node.codec not in encoded_frames:
+                encoded_frames[node.codec] = self.pack_data(
+                    payload, node.codec, content_type
+                )
+            frames.append((node, encoded_frames[node.codec]))
+        return self.send_frames(frames)
+
+    def broadcast_frame(self, encoded_frame: bytes, exclude=None) -> int:
+        """
+        Queue a packed frame on every connection
+
+        :param self:            Instances attributes
+        :param encoded_frame:   bytes, a complete frame
+        :param exclude:         connection that should not receive frame
+
+        :return:                Amount of connection frame is queued on
+        """
+        return self.send_frames(
+            [(node, encoded_frame) for node in self.all_nodes if node is not exclude]
+        )
+
+    def send_frames(self, frames: list) -> int:
+        """
+        Queue packed frames on their connection
+
+        :param self:        Instances attributes
+        :param frames:      list of (NodeConnection, encoded frame)
+
+        :return:            Amount of frame queued
+        """
+        sent = 0
+        for node, encoded_frame in frames:
+            if node.send_frame(encoded_frame):
+                sent += 1
+        return sent
+
+    def gossip(self, data, encoding="utf-8", ttl=None):
+        """
+        Flood data through the mesh, every node relay it once to it neighbours
+        So node that is not directly connected also receive it
+
+        :param self:        Instances attributes
+        :param data:        str, dict as json, or bytes
+        :param encoding:    encoding method
+        :param ttl:         Max amount of hop, default self.gossip_ttl
+
+        :return:            message id as hex str, None if data is invalid
+        """
+        message_id = uuid.uuid4().bytes
+        try:
+            payload, content_type = frame.encode_payload(data, encoding)
+            encoded_frame = gossip.pack_gossip(
+                message_id,
+                self.gossip_ttl if ttl is None else ttl,
+                self.id,
+                payload,
+                content_type,
+            )
+
+        except (TypeError, frame.FrameError) as e:
+            self.debug_print("gossip: Invalid data, \n{}".format(e))
+            return None
+
+        # * Our own message, should not be delivered back to us
+        self.gossip_cache.add(message_id)
+        self.broadcast_frame(encoded_frame)
+        return message_id.hex()
+
+    def send_file(self, n, path: str):
+        """
+        Offer file at path to n, it is streamed in chunks once n accept it
+        Offering same file again resume from what n already have
+
+        :param self:        Instances attributes
+        :param n:           NodeConnection instances, that file need to go
+        :param path:        path of the file
+
+        :return:            transfer id as hex str, None if file can't be sent
+        """
+        if n not in self.connections:
+            self.debug_print("send_file: Can't send file, node not found")
+            return None
+
+        try:
+            transfer = filetransfer.OutgoingFile(path, self.file_chunk_size)
+        except OSError as e:
+            self.debug_print("send_file: Can't read {}, \n{}".format(path, e))
+            return None
+
+        # * Same file is already being sent on this connection
+        if n.outgoing_files.setdefault(transfer.id, transfer) is not transfer:
+            transfer.close()
+            return transfer.id.hex()
+
+        if not n.send_frame(transfer.offer()):
+            n.outgoing_files.pop(transfer.id, None)
+            transfer.close()
+            return None
+        return transfer.id.hex()
+
+    # * Receiving Logic:
+    def node_frame(self, node, frame_type: int, content_type: int, flags: int, packet):
+        """
+        Frame received from node, dispatch it by frame type
+        packet might be a view into node receive buffer, so it must not be kept
+
+        :param self:            Instances attributes
+        :param node:            NodeConnection that receive the frame
+        :param frame_type:      type of the frame, frame.FRAME_*
+        :param content_type:    type of the payload, frame.CONTENT_*
+        :param flags:           bit flags of the frame
+        :param packet:          payload of the frame, bytes or memoryview
+        """
+        # * Any frame show that node is alive
+        node.latency.seen()
+
+        if flags & frame.FLAG_COMPRESSED:
+            if node.codec is None:
+                raise frame.FrameError("Compressed frame, but no codec is agreed")
+            packet = node.codec.decompress(packet, self.max_frame_size)
+
+        handler = self.frame_handlers.get(frame_type, None)
+        if handler is None:
+            self.debug_print(
+                "node_frame: Unknown frame type {} from {}".format(frame_type, node.id)
+            )
+            return
+        handler(node, content_type, packet)
+
+    def node_data(self, node, content_type: int, packet):
+        """
+        Data received from node, control is for us, other for application
+
+        :param self:            Instances attributes
+        :param node:            NodeConnection that receive the frame
+        :param content_type:    type of the payload, frame.CONTENT_*
+        :param packet:          payload of FRAME_DATA frame
+        """
+        if content_type == frame.CONTENT_CONTROL:
+            self.node_control(node, frame.decode_payload(packet, content_type))
+        else:
+            self.node_message(node, node.parse_packet(packet, content_type))
+
+    def node_ping(self, node, content_type: int, packet):
+        """
+        Ping received from node, answer it right away
+
+        :param self:            Instances attributes
+        :param node:            NodeConnection that send the ping
+        :param content_type:    unused, ping is not application data
+        :param packet:          payload of FRAME_PING frame
+        """
+        node.send_frame(heartbeat.pack_pong(packet))
+
+    def node_pong(self, node, content_type: int, packet):
+        """
+        Pong received from node, answer to our ping, measure rtt
+
+        :param self:            Instances attributes
+        :param node:            NodeConnection that send the pong
+        :param content_type:    unused, pong is not application data
+        :param packet:          payload of FRAME_PONG frame
+        """
+        sent = heartbeat.unpack_ping(packet)
+        node.latency.sample((time.monotonic_ns() - sent) / 1e9)
+
+    def node_gossip(self, node, content_type: int, packet):
+        """
+        Gossip received from node, deliver and relay it if it is new
+
+        :param self:            Instances attributes
+        :param node:            NodeConnection that relay the gossip to us
+        :param content_type:    type of the gossip payload, frame.CONTENT_*
+        :param packet:          payload of FRAME_GOSSIP frame
+        """
+        message_id, ttl, origin, payload = gossip.unpack_gossip(packet)
+        with payload:
+            if not self.gossip_cache.add(message_id):
+                return
+
+            # * Relay to every neighbour, except the one we got it from
+            if ttl > 1:
+                self.broadcast_frame(
+                    gossip.pack_gossip(
+                        message_id, ttl - 1, origin, payload, content_type
+                    ),
+                    exclude=node,
+                )
+
+            self.node_gossip_message(
+                node, origin, node.parse_packet(payload, content_type)
+            )
+
+    def node_unicast(self, node, content_type: int, packet):
+        """
+        Routed message received, deliver it if it is for us
+        Otherwise forward it to next hop
+
+        :param self:            Instances attributes
+        :param node:            NodeConnection that forward the message to us
+        :param content_type:    type of the routed payload, frame.CONTENT_*
+        :param packet:          payload of FRAME_UNICAST frame
+        """
+        dest_id, source_id, ttl, payload = routing.unpack_unicast(packet)
+        with payload:
+            if dest_id == self.id:
+                self.node_routed_message(
+                    node, source_id, node.parse_packet(payload, content_type)
+                )
+                return
+
+            next_hop = self.connections.get(dest_id)
+            if next_hop is None:
+                next_hop = self.connections.get(self.routing_table.next_hop(dest_id))
+            if next_hop is None or ttl <= 1:
+                self.debug_print(
+                    "node_unicast: Dropped message {} -> {}".format(source_id, dest_id)
+                )
+                return
+
+            next_hop.send_frame(
+                routing.pack_unicast(dest_id, source_id, ttl - 1, payload, content_type)
+            )
+
+    def node_routes(self, node, content_type: int, packet):
+        """
+        Route advertisement received from neighbour
+
+        :param self:            Instances attributes
+        :param node:            NodeConnection of the neighbour
+        :param content_type:    unused, advertisement is always json
+        :param packet:          payload of FRAME_ROUTE frame
+        """
+        routes, full = routing.unpack_routes(packet)
+        with self.routes_lock:
+            self.advertise_routes(
+                self.routing_table.update_neighbour(node.id, routes, full)
+            )
+
+    def advertise_routes(self, changed: set):
+        """
+        Send changed routes to every neighbour after route_update_delay
+        Changes until then are sent together, routes_lock must be held
+
+        :param self:        Instances attributes
+        :param changed:     set of node id whose route changed
+        """
+        if not changed:
+            return
+        self.pending_routes |= changed
+        if self.route_timer is None:
+            self.route_timer = threading.Timer(
+                self.route_update_delay, self.flush_routes
+            )
+            self.route_timer.daemon = True
+            self.route_timer.start()
+
+    def flush_routes(self):
+        """
+        Send pending changed routes to every neighbour, run on route_timer
+        Route is read when it is sent, so neighbour always get the latest one
+        Neighbour that get the same routes share one frame
+
+        :param self:        Instances attributes
+        """
+        with self.routes_lock:
+            changed = self.pending_routes
+            self.pending_routes = set()
+            self.route_timer = None
+            if self.terminate_flag.is_set():
+                return
+
+            frames = list()
+            encoded_frames = dict()
+            for neighbour_id in self.routing_table.neighbours():
+                node = self.connections.get(neighbour_id)
+                if node is None:
+                    continue
+                routes = self.routing_table.advertisement(neighbour_id, changed)
+                if not routes:
+                    continue
+                key = tuple(routes.items())
+                if key not in encoded_frames:
+                    encoded_frames[key] = routing.pack_routes(routes, full=False)
+                frames.append((node, encoded_frames[key]))
+            self.send_frames(frames)
+
+    def update_routes(self, node):
+        """
+        Connection with node is added or removed, update routing table
+        Neighbour is removed only when no connection with it id is left
+
+        :param self:        Instances attributes
+        :param node:        NodeConnection that is connected or disconnected
+        """
+        with self.routes_lock:
+            if node in self.connections:
+                # * New connection always need every route, even if nothing changed
+                changed = self.routing_table.add_neighbour(node.id)
+                node.send_frame(
+                    routing.pack_routes(self.routing_table.advertisement(node.id))
+                )
+                self.advertise_routes(changed)
+            elif self.connections.get(node.id) is None:
+                self.advertise_routes(self.routing_table.remove_neighbour(node.id))
+
+    # * File transfer
+    def node_file(self, node, content_type: int, packet):
+        """
+        File transfer control received from node
+
+        :param self:            Instances attributes
+        :param node:            NodeConnection that send the message
+        :param content_type:    unused, control is always json
+        :param packet:          payload of FRAME_FILE frame
+        """
+        message = filetransfer.unpack_file_control(packet)
+        id = message["id"]
+        match message["type"]:
+            case filetransfer.OFFER:
+                self.file_offered(node, message)
+
+            case filetransfer.ACCEPT:
+                transfer = node.outgoing_files.get(id)
+                offset = message.get("offset", 0)
+                if transfer is None or not isinstance(offset, int):
+                    return
+                transfer.offset = min(max(offset, 0), transfer.size)
+                node.start_file(transfer)
+
+            # * Other node might say done before every queued chunk is sent
+            # * File is closed once none is queued, so fd is never reused
+            case filetransfer.DONE:
+                transfer = node.outgoing_files.pop(id, None)
+                if transfer is None:
+                    return
+                transfer.offset = transfer.size
+                transfer.done = True
+                node.close_file(transfer)
+                self.file_progress(node, transfer, filetransfer.SEND)
+
+            case filetransfer.CANCEL:
+                reason = str(message.get("reason", "cancelled"))
+                transfer = node.incoming_files.pop(id, None)
+                if transfer is not None:
+                    transfer.close()
+                    transfer.error = reason
+                    self.file_progress(node, transfer, filetransfer.RECV)
+
+                # * Forgotten, so same file can be offered again
+                transfer = node.outgoing_files.pop(id, None)
+                if transfer is not None:
+                    transfer.error = reason
+                    node.close_file(transfer)
+                    self.file_progress(node, transfer, filetransfer.SEND)
+
+    def node_file_chunk(self, node, content_type: int, packet):
+        """
+        Part of a file received from node, written to disk right away
+
+        :param self:            Instances attributes
+        :param node:            NodeConnection that send the chunk
+        :param content_type:    unused, chunk is always binary
+        :param packet:          payload of FRAME_FILE_CHUNK frame
+        """
+        id, offset, data = filetransfer.unpack_chunk(packet)
+        with data:
+            transfer = node.incoming_files.get(id)
+
+            # * Chunk queued before other node saw our cancel
+            if transfer is None:
+                return
+
+            try:
+                transfer.write(offset, data)
+            except (filetransfer.FileTransferError, OSError) as e:
+                self.cancel_file(node, transfer, filetransfer.RECV, str(e))
+                return
+
+        if transfer.complete:
+            self.file_received(node, transfer)
+        else:
+            self.file_progress(node, transfer, filetransfer.RECV)
+
+    def file_offered(self, node, message: dict):
+        """
+        Node offer a file, accept it from what is already on disk
+
+        :param self:        Instances attributes
+        :param node:        NodeConnection that offer the file
+        :param message:     offer message, from filetransfer.unpack_file_control
+        """
+        # * Offered again, ex: other node resend it, start over from disk
+        previous = node.incoming_files.pop(message["id"], None)
+        if previous is not None:
+            previous.close()
+
+        size = message.get("size", None)
+        if isinstance(size, int) and size > self.max_file_size:
+            self.refuse_file(
+                node,
+                message["id"],
+                "file is {} bytes, limit is {}".format(size, self.max_file_size),
+            )
+            return
+
+        receiving = sum(len(n.incoming_files) for n in self.all_nodes)
+        if receiving >= self.max_incoming_files:
+            self.refuse_file(
+                node,
+                message["id"],
+                "already receiving {} files, try again later".format(receiving),
+            )
+            return
+
+        try:
+            transfer = filetransfer.IncomingFile(self.download_dir, message)
+        except (filetransfer.FileTransferError, OSError) as e:
+            self.refuse_file(node, message["id"], str(e))
+            return
+
+        node.incoming_files[transfer.id] = transfer
+        if transfer.complete:
+            self.file_received(node, transfer)
+            return
+
+        node.send_frame(
+            filetransfer.pack_file_control(
+                filetransfer.ACCEPT, transfer.id, offset=transfer.offset
+            )
+        )
+        self.file_progress(node, transfer, filetransfer.RECV)
+
+    def refuse_file(self, node, id: bytes, reason: str):
+        """
+        Refuse offer of node, nothing is written to disk
+
+        :param self:        Instances attributes
+        :param node:        NodeConnection that offer the file
+        :param id:          transfer id of the offer
+        :param reason:      str, why it is refused, sent to node
+        """
+        self.debug_print(
+            "refuse_file: Refused file from {}, {}".format(node.id, reason)
+        )
+        node.send_frame(
+            filetransfer.pack_file_control(filetransfer.CANCEL, id, reason=reason)
+        )
+
+    def file_received(self, node, transfer):
+        """
+        Every byte of transfer is written, move it to it name
+
+        :param self:        Instances attributes
+        :param node:        NodeConnection that send the file
+        :param transfer:    filetransfer.IncomingFile that is complete
+        """
+        try:
+            transfer.finish()
+        except OSError as e:
+            self.cancel_file(node, transfer, filetransfer.RECV, str(e))
+            return
+
+        node.incoming_files.pop(transfer.id, None)
+        node.send_frame(filetransfer.pack_file_control(filetransfer.DONE, transfer.id))
+        self.file_progress(node, transfer, filetransfer.RECV)
+
+    def cancel_file(self, node, transfer, direction: str, reason: str):
+        """
+        Stop transfer on both side, partial file is kept so it can be resumed
+
+        :param self:        Instances attributes
+        :param node:        NodeConnection of the transfer
+        :param transfer:    filetransfer.FileTransfer to stop
+        :param direction:   filetransfer.SEND or filetransfer.RECV
+        :param reason:      str, why it is stopped
+        """
+        transfer.error = reason
+        if direction == filetransfer.RECV:
+            node.incoming_files.pop(transfer.id, None)
+            transfer.close()
+        else:
+            if node.outgoing_files.get(transfer.id) is transfer:
+                node.outgoing_files.pop(transfer.id)
+            node.close_file(transfer)
+
+        node.send_frame(
+            filetransfer.pack_file_control(
+                filetransfer.CANCEL, transfer.id, reason=reason
+            )
+        )
+        self.file_progress(node, transfer, direction)
+
+    def file_progress(self, node, transfer, direction: str):
+        """
+        Report progress of transfer, once each file_progress_step
+        Completion and error are always reported
+
+        :param self:        Instances attributes
+        :param node:        NodeConnection of the transfer
+        :param transfer:    filetransfer.FileTransfer
+        :param direction:   filetransfer.SEND or filetransfer.RECV
+        """
+        if transfer.error is None and not transfer.progress_due(
+            self.file_progress_step
+        ):
+            return
+        self.node_file_progress(node, transfer.snapshot(direction))
+
+    def close_files(self, node):
+        """
+        Connection is gone, close every file of it
+        Unfinished transfer is reported, it can be resumed by sending it again
+
+        :param self:    Instances attributes
+        :param node:    NodeConnection that is stopped
+        """
+        for transfers, direction in (
+            (node.incoming_files, filetransfer.RECV),
+            (node.outgoing_files, filetransfer.SEND),
+        ):
+            for transfer in list(transfers.values()):
+                transfer.close()
+                if transfer.error is None:
+                    transfer.error = "connection closed"
+                    self.file_progress(node, transfer, direction)
+            transfers.clear()
+
     # * NodeConnection creation & destruction & reconnection
     def node_disconnected(self, node):
         """
@@ -235,16 +1085,26 @@ class Node(threading.Thread):
         :param node:    NodeConnection instances, want to be disconnected
         """
         self.debug_print("node_disconnected: {}".format(node.id))
+        self.close_files(node)
+
+        # * Series of peer is gone with it, counted into the one without peer
+        self.metrics.remove_label("peer", node.id)
 
-        if node in self.node_inbound:
-            self.node_inbound.remove(node)
+        # * remove is atomic, callback is fired once even on concurrent call
+        direction = self.connections.remove(node)
+        if direction == INBOUND:
             self.inbound_node_disconnected(node)
 
-        if node in self.node_outbound:
-            self.node_outbound.remove(node)
+        elif direction == OUTBOUND:
             self.outbound_node_disconnected(node)
 
-    def create_new_connection(self, conn: socket.socket, id: str, host: str, port: int):
+            # * Only scheduled if reconnect is enabled for this node
+            if not self.terminate_flag.is_set():
+                self.reconnect_scheduler.schedule(node.host, node.port)
+
+    def create_new_connection(
+        self, conn: socket.socket, id: str, host: str, port: int, codec=None
+    ):
         """
         Create new connection to Node
 
@@ -253,14 +1113,231 @@ class Node(threading.Thread):
         :param id:      ID of other client
         :param host:    Host of other client
         :param port:    Port of other client
+        :param codec:   Compression codec agreed on handshake
 
         :return:        NodeConnection intances, an extension of threading.Thread class
         """
-        return NodeConnection(main_node=self, sock=conn, id=id, host=host, port=port)
+        return NodeConnection(
+            main_node=self, sock=conn, id=id, host=host, port=port, codec=codec
+        )
+
+    def hello_info(self) -> dict:
+        """
+        Hello we send when connecting to other node
+
+        :param self:    Instances attributes
+
+        :return:        dict of our id, port and codec we offer
+        """
+        return {"id": self.id, "port": self.port, "compression": self.compression}
+
+    def reply_hello(self, hello: dict):
+        """
+        Reply to hello of node connecting to us, and pick codec from their offer
+        Node that offer nothing, is not compressed
+
+        :param self:    Instances attributes
+        :param hello:   dict, hello info from other node
+
+        :return:        tuple of (reply hello as dict, codec or None)
+        """
+        reply = {"id": self.id}
+        codec_name = compression.negotiate(hello.get("compression"), self.compression)
+        if codec_name is not None:
+            reply["compression"] = codec_name
+        return reply, compression.get_codec(codec_name)
+
+    def hello_codec(self, hello: dict):
+        """
+        Codec picked by other node, from reply to our hello
+
+        :param self:    Instances attributes
+        :param hello:   dict, hello reply from other node
+
+        :return:        codec, None for no compression
+        """
+        codec_name = hello.get("compression")
+        if codec_name is not None and (
+            compression.negotiate([codec_name], self.compression) is None
+        ):
+            raise HandshakeError("Compression {} is not offered".format(codec_name))
+        return compression.get_codec(codec_name)
+
+    def accept_connections(self):
+        """
+        Accept every pending connection, their hello is read later by selector
+
+        :param self:            Instances attributes
+        """
+        while True:
+            try:
+                # * conn:           a socket instance
+                # * client_address: tuple of (host, port)
+                conn, client_adress = self.sock.accept()
+            except BlockingIOError:
+                return
+            except OSError as e:
+                self.debug_print("accept_connections: {}".format(str(e)))
+                return
+
+            #! DEBUG
+            self.debug_print(
+                "Total inbound connection: {}".format(
+                    str(self.connections.count(INBOUND))
+                )
+            )
+
+            total_inbound = self.connections.count(INBOUND) + self.handshake_count
+            if total_inbound >= self.max_connection:
+                self.debug_print("New Connection closed: Exceed connection allowed")
+                conn.close()
+                continue
+
+            conn.setblocking(False)
+            deadline = time.monotonic() + self.handshake_timeout
+            self.pending_handshakes[conn] = [client_adress, deadline, b""]
+            self.selector.register(conn, selectors.EVENT_READ)
+
+    def read_handshake(self, conn: socket.socket):
+        """
+        Read hello of pending handshake, without blocking
+        Complete hello is handed to handshake_pool
+
+        :param self:            Instances attributes
+        :param conn:            socket.socket instances that is accepted
+        """
+        pending = self.pending_handshakes[conn]
+        try:
+            chunk = conn.recv(4096)
+            if chunk == b"":
+                raise HandshakeError("Connection closed during handshake")
+            pending[2] += chunk
+
+            # * Receive info from other node
+            hello = try_unpack_hello(pending[2])
+
+        except BlockingIOError:
+            return
+        except (HandshakeError, OSError) as e:
+            self.debug_print("read_handshake: {}".format(str(e)))
+            self.drop_handshake(conn)
+            return
+
+        if hello is None:
+            return
+
+        # * Counted before it leave pending_handshakes, so its slot is never free
+        with self.handshake_lock:
+            self.inbound_handshakes += 1
+        self.selector.unregister(conn)
+        del self.pending_handshakes[conn]
+        client_adress, deadline, _ = pending
+        self.handshake_pool.submit(
+            self.accept_handshake, conn, client_adress, hello, deadline
+        )
+
+    def handshake_wait(self):
+        """
+        :return:        Second until first pending handshake deadline
+                        None if there is no pending handshake
+        """
+        if not self.pending_handshakes:
+            return None
+        deadline = min(pending[1] for pending in self.pending_handshakes.values())
+        return max(deadline - time.monotonic(), 0)
+
+    def expire_handshakes(self):
+        """
+        Drop pending handshake that passed their deadline
+
+        :param self:            Instances attributes
+        """
+        now = time.monotonic()
+        for conn, pending in list(self.pending_handshakes.items()):
+            if pending[1] <= now:
+                self.debug_print(
+                    "expire_handshakes: Handshake deadline exceeded {}".format(
+                        pending[0]
+                    )
+                )
+                self.drop_handshake(conn)
+
+    def drop_handshake(self, conn: socket.socket):
+        """
+        Close pending handshake
+
+        :param self:            Instances attributes
+        :param conn:            socket.socket instances that is accepted
+        """
+        self.pending_handshakes.pop(conn, None)
+        self.selector.unregister(conn)
+        conn.close()
+
+    def accept_handshake(self, conn: socket.socket, client_adress, hello, deadline):
+        """
+        Finish handshake with new inbound connection, run on handshake_pool
+        Other node already sent id:port, now we send our id
+        It leave inbound_handshakes once it is registered or closed
+
+        :param self:            Instances attributes
+        :param conn:            socket.socket instances that is accepted
+        :param client_adress:   tuple of (host, port)
+        :param hello:           dict, hello info from other node
+        :param deadline:        time.monotonic() value when handshake must be done
+        """
+        try:
+            connected_node_host = client_adress[0]
+            connected_node_id = str(hello["id"])
+            connected_node_port = hello.get("port", client_adress[1])
+
+            try:
+                # * send our ID, they already know our host and port
+                conn.setblocking(True)
+                reply, codec = self.reply_hello(hello)
+                send_hello(conn, reply, deadline)
+                self.handshake_done(deadline, INBOUND)
+
+            except HandshakeError as e:
+                self.debug_print("accept_handshake: {}".format(str(e)))
+                conn.close()
+                return
+
+            # * Create new NodeConnection
+            # * connection between client
+            thread_client = self.create_new_connection(
+                conn=conn,
+                id=connected_node_id,
+                host=connected_node_host,
+                port=connected_node_port,
+                codec=codec,
+            )
+            # * Registered before start, peer that close right after hello
+            # * must find it in registry when its thread run node_disconnected
+            self.connections.add(thread_client, INBOUND)
+        finally:
+            with self.handshake_lock:
+                self.inbound_handshakes -= 1
+
+        self.inbound_node_connected(thread_client)
+        thread_client.start()
+
+    def connect_with_node_async(self, host, port, reconnect=False):
+        """
+        Try to connect with node @host:port on handshake_pool
+        Caller does not wait for connect and handshake
+
+        :param host:        IP address of node we are trying to connect
+        :param port:        Port number
+        :param reconnect:   bool value, a flag for reconnect
+
+        :return:            concurrent.futures.Future of connect_with_node result
+        """
+        return self.handshake_pool.submit(self.connect_with_node, host, port, reconnect)
 
     def connect_with_node(self, host, port, reconnect=False):
         """
         Try to connect with node @host:port
+        Block until connected, or handshake_timeout passed
 
         :param host:        IP address of node we are trying to connect
         :param port:        Port number
@@ -275,126 +1352,141 @@ class Node(threading.Thread):
             print("{}: Cannot connect with yourself".format(func_name))
             return False
 
-        # check if other node already connected to us
-        for node in self.node_outbound:
-            if node.host == host and node.port == port:
-                print(
-                    "{}: Already connected with this node ({})".format(
-                        func_name, node.id
-                    )
-                )
-                return True
+        if self.connections.count(OUTBOUND) >= self.max_connection:
+            self.debug_print(
+                "{}: Exceed outbound connection allowed".format(func_name)
+            )
+            return False
+
+        # check if we already connected to other node, or it connected to us
+        node = self.connections.get_by_address(host, port)
+        if node is not None:
+            print(
+                "{}: Already connected with this node ({})".format(func_name, node.id)
+            )
+            return True
 
+        deadline = time.monotonic() + self.handshake_timeout
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.debug_print("connecting to {}:{}".format(host, port))
 
             # * attempt to connect host:port
-            sock.connect((host, port))
+            sock = socket.create_connection((host, port), timeout=self.handshake_timeout)
+
+        except OSError as e:
+            self.debug_print(
+                "TcpServer.{}: Could not connect with node. {}".format(
+                    func_name, str(e)
+                )
+            )
+            return False
 
+        try:
             # * Basic info exchange
             # * Node trying to connect, aka node that call this function
             # * Will send id:port
-            sock.send("{}:{}".format(self.id, self.port).encode("utf-8"))
+            send_hello(sock, self.hello_info(), deadline)
 
-            # * The other party will send us it's Id
+            # * The other party will send us it's Id, and codec it picked
             # * Since we already know it's host and port
-            connected_node_id = sock.recv(4096).decode("utf-8")
-
-            if self.id == connected_node_id:
-                # ? WHAT, how its possible UUID random, is other use our ID
-                print("{}: You cannot connect with yourself?".format(func_name))
-                sock.send("CLOSING: Already have connection together".encode("utf-8"))
-                sock.close()
-                return True
-
-            for node in self.node_inbound:
-                if node.host == host and node.id == connected_node_id:
-                    print(
-                        "{}: This node ({}) is already connected".format(
-                            func_name, node.id
-                        )
-                    )
-                    sock.send(
-                        "CLOSING: Already have connection together".encode("utf-8")
-                    )
-                    sock.close()
-                    return True
+            hello = recv_hello(sock, deadline)
+            connected_node_id = str(hello["id"])
+            codec = self.hello_codec(hello)
+            self.handshake_done(deadline, OUTBOUND)
 
-            # * Create new NodeConnection
-            # * connection between client
-            thread_client = self.create_new_connection(
-                conn=sock, id=connected_node_id, host=host, port=port
+        except HandshakeError as e:
+            self.debug_print(
+                "TcpServer.{}: Could not connect with node. {}".format(
+                    func_name, str(e)
+                )
             )
+            sock.close()
+            return False
 
-            # * Start the NodeConnection
-            thread_client.start()
-
-            # * Add NodeConnection to node_outbound
-            self.node_outbound.add(thread_client)
-            # * call back, on node_outbound added
-            self.outbound_node_connected(thread_client)
-            if reconnect:
-                self.debug_print(
-                    "{}: Reconnection check is enabled on node {}:{}".format(
-                        func_name, host, port
+        node = self.connections.get(connected_node_id)
+        already_connected = self.id == connected_node_id or (
+            node is not None and node.host == host
+        )
+        if already_connected:
+            print(
+                "{}: This node ({}) is already connected".format(
+                    func_name, connected_node_id
+                )
+            )
+            try:
+                sock.sendall(
+                    frame.pack_frame(
+                        "CLOSING: Already have connection together".encode("utf-8"),
+                        content_type=frame.CONTENT_CONTROL,
                     )
                 )
-                self.reconnect_to_nodes.append({"host": host, "port": port, "tries": 0})
-                return True
+            except OSError:
+                pass
+            sock.close()
+            return True
+
+        # * Create new NodeConnection
+        # * connection between client
+        thread_client = self.create_new_connection(
+            conn=sock, id=connected_node_id, host=host, port=port, codec=codec
+        )
 
-        #! Need to be spesific exception, but I dont know what exception will ever be thrown
-        except Exception as e:
+        # * Add NodeConnection as outbound, before it is started
+        # * so its disconnect always find it in registry
+        self.connections.add(thread_client, OUTBOUND)
+        # * call back, on outbound added
+        self.outbound_node_connected(thread_client)
+
+        # * Start the NodeConnection
+        thread_client.start()
+        if reconnect:
             self.debug_print(
-                "TcpServer.{}: Could not connect with node. {}".format(
-                    func_name, str(e)
+                "{}: Reconnection check is enabled on node {}:{}".format(
+                    func_name, host, port
                 )
             )
-            return False
+            self.reconnect_scheduler.watch(host, port)
+        return True
 
-    def reconnect_nodes(self):
+    def reconnect_node(self, host, port):
         """
-        Try to connect to disconnected nodes
+        Try to connect to disconnected node, called by reconnect_scheduler
+        On failure, next reconnect is scheduled with longer delay
 
         :param self:    Instances object
+        :param host:    IP address of node to reconnect
+        :param port:    Port of node to reconnect
         """
+        self.debug_print("reconnect_node: Reconnecting to {}:{}".format(host, port))
+        try:
+            future = self.connect_with_node_async(host, port)
 
-        func_name = "reconnect_nodes"
-        for node_to_check in self.reconnect_to_nodes:
-            # {"host": host, "port": port, "tries": 0}
-            found_node = False
-            self.debug_print(
-                "{}: checking node {}:{}".format(
-                    func_name, node_to_check["host"], node_to_check["port"]
-                )
-            )
+        # * Node is stopping, no more connection
+        except RuntimeError:
+            return
 
-            for node in self.node_outbound:
-                if (
-                    node.host == node_to_check["host"]
-                    and node.port == node_to_check["port"]
-                ):
-                    found_node = True
-                    node_to_check["tries"] = 0
-                    self.debug_print(
-                        "{}: Node {}:{} is still running".format(
-                            func_name, node.host, node.port
-                        )
-                    )
-            # * Node no longer connected so reconn
-            if not found_node:
-                node_to_check["tries"] += 1
-                if self.node_reconnection_error(
-                    node_to_check["host"].node_to_check["port"], node_to_check["tries"]
-                ):
-                    self.connect_with_node(node_to_check["host"], node_to_check["port"])
-                else:
-                    self.debug_print(
-                        "{}: Removing {}:{} from reconnection list".format(
-                            func_name, node_to_check["host"], node_to_check["port"]
-                        )
+        future.add_done_callback(
+            lambda done: self.reconnect_node_done(host, port, done)
+        )
+
+    def reconnect_node_done(self, host, port, future):
+        """
+        Callback when reconnect to node @host:port is done
+
+        :param self:    Instances object
+        :param host:    IP address of node to reconnect
+        :param port:    Port of node to reconnect
+        :param future:  concurrent.futures.Future of connect_with_node
+        """
+        if not future.cancelled() and future.exception() is None and future.result():
+            self.reconnect_scheduler.reset(host, port)
+        elif not self.terminate_flag.is_set():
+            if not self.reconnect_scheduler.schedule(host, port):
+                self.debug_print(
+                    "reconnect_node_done: Removing {}:{} from reconnection list".format(
+                        host, port
                     )
-                    self.reconnect_to_nodes.remove(node_to_check)
+                )
 
     # ? Callbacks
     def server_started(self):
@@ -421,6 +1513,99 @@ class Node(threading.Thread):
         if self.callback is not None:
             self.callback("node_message", self, node, data)
 
+    def node_frame_error(self, node, error):
+        """
+        Node sent invalid frame, or broke a limit
+        Counted by reason, connection is dropped by caller
+
+        :param self:    Instances attributes
+        :param node:    NodeConnection that sent the frame
+        :param error:   frame.FrameError that was raised
+        """
+        if isinstance(error, frame.FrameSizeError):
+            reason = "oversized_frame"
+        elif isinstance(error, frame.BufferLimitError):
+            reason = "buffer_overflow"
+        else:
+            reason = "invalid_frame"
+        self.metric_dropped.inc(label=reason)
+        self.debug_print(
+            "node_frame_error: Dropping {}, {}".format(node.id, str(error))
+        )
+
+    def node_flow_control(self, node, budget):
+        """
+        Byte budget of node is paused or resumed
+        Application should stop sending to node while send budget is paused
+
+        :param self:    Instances attributes
+        :param node:    NodeConnection that own the budget
+        :param budget:  flowcontrol.ByteBudget that changed
+        """
+        func_name = "node_flow_control"
+        data = {
+            "direction": budget.direction,
+            "paused": budget.paused,
+            "used": budget.used,
+        }
+        self.debug_print("{}: {} : {}".format(func_name, node.id, data))
+        if self.callback is not None:
+            self.callback(func_name, self, node, data)
+
+    def node_control(self, node, data: str):
+        """
+        Control notice received from node, ex: reason it is closing
+
+        :param self:    Instances attributes
+        :param node:    NodeConnection that send the notice
+        :param data:    str, the notice
+        """
+        func_name = "node_control"
+        self.debug_print("{}: {} : {}".format(func_name, node.id, data))
+        if self.callback is not None:
+            self.callback(func_name, self, node, data)
+
+    def node_gossip_message(self, node, origin, data):
+        """
+        Gossip message received, it might be created by node that
+        is not directly connected to us
+
+        :param self:    Instances attributes
+        :param node:    NodeConnection that relay the message to us
+        :param origin:  id of node that create the message
+        :param data:    Data of the message, data is either str, json or bytes
+        """
+        self.debug_print("node_gossip_message {} : {}".format(origin, str(data)))
+        if self.callback is not None:
+            self.callback("node_gossip_message", self, node, (origin, data))
+
+    def node_routed_message(self, node, source, data):
+        """
+        Routed message for us received, it might be created by node
+        that is not directly connected to us
+
+        :param self:    Instances attributes
+        :param node:    NodeConnection that forward the message to us
+        :param source:  id of node that create the message
+        :param data:    Data of the message, data is either str, json or bytes
+        """
+        self.debug_print("node_routed_message {} : {}".format(source, str(data)))
+        if self.callback is not None:
+            self.callback("node_routed_message", self, node, (source, data))
+
+    def node_file_progress(self, node, progress: dict):
+        """
+        File transfer with node made progress, is done, or failed
+
+        :param self:        Instances attributes
+        :param node:        NodeConnection of the transfer
+        :param progress:    dict, from filetransfer.FileTransfer.snapshot
+        """
+        func_name = "node_file_progress"
+        self.debug_print("{}: {} : {}".format(func_name, node.id, progress))
+        if self.callback is not None:
+            self.callback(func_name, self, node, progress)
+
     def outbound_node_connected(self, node):
         """
         Callback for new outbound connection
@@ -430,6 +1615,7 @@ class Node(threading.Thread):
 
         """
         func_name = "outbound_node_connected"
+        self.update_routes(node)
         self.debug_print("{}: Node {} is connecting".format(func_name, node.id))
         if self.callback is not None:
             self.callback(func_name, self, node, "")
@@ -443,6 +1629,7 @@ class Node(threading.Thread):
 
         """
         func_name = "outbound_node_disconnected"
+        self.update_routes(node)
         self.debug_print("{}: Node {} is disconnecting".format(func_name, node.id))
         if self.callback is not None:
             self.callback(func_name, self, node, "")
@@ -455,6 +1642,7 @@ class Node(threading.Thread):
         :param node:    class:NodeConnection Instances
         """
         func_name = "inbound_node_connected"
+        self.update_routes(node)
         self.debug_print("{}: Node {} is connecting".format(func_name, node.id))
         if self.callback is not None:
             self.callback(func_name, self, node, "")
@@ -467,6 +1655,7 @@ class Node(threading.Thread):
         :param node:    class:NodeConnection Instances
         """
         func_name = "inbound_node_disconnected"
+        self.update_routes(node)
         self.debug_print("{}: Node {} is disconnecting".format(func_name, node.id))
         if self.callback is not None:
             self.callback(func_name, self, node, "")
@@ -498,6 +1687,7 @@ class Node(threading.Thread):
     def node_reconnection_error(self, host, port, tries):
         """
         Basic node reconnection logic, it will always reconnect
+        until reconnect_scheduler.max_tries is reached
         Should be overriden on inheritance since it currently have no logic at all
         Logic idea:
             : retry only tries <5
@@ -542,4 +1732,4 @@ class Node(threading.Thread):
 
         :return:        Total number of connection inclusive inbound + outbound
         """
-        return len(self.node_inbound) + len(self.node_outbound)
+        return len(self.connections)
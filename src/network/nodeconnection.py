@@ -1,15 +1,18 @@
-import json
+import collections
+import selectors
 import socket
 import threading
 import time
 
-# ToDo:
-# 1. Implement more of it
-#
+from . import filetransfer, flowcontrol, frame, heartbeat
+from .recvbuffer import RecvBuffer
+from .sendqueue import FileRegion, SendQueue
 
 
 class NodeConnection(threading.Thread):
-    def __init__(self, main_node, sock: socket.socket, id: str, host: str, port: int):
+    def __init__(
+        self, main_node, sock: socket.socket, id: str, host: str, port: int, codec=None
+    ):
         """
         Constructor of NodeConnection class
         Main function is to wait, socket packet
@@ -20,14 +23,23 @@ class NodeConnection(threading.Thread):
         :param id:              ID of other client
         :param host:            IP address of other client
         :param port:            Port of other client
+        :param codec:           Compression codec agreed on handshake, None for no
         """
 
         # * Main node, creator of this NodeConnection instances
         self.main_node = main_node
 
         # * sock, socket instances that connected to other client
+        # * non blocking, selector tell us when it can be used
         self.sock = sock
-        self.sock.settimeout(10.0)
+        self.sock.setblocking(False)
+
+        # * Kernel keep at most notsent_lowat bytes that is not sent yet
+        # * Rest wait in send_queue, where frame of other stream can go first
+        if main_node.notsent_lowat and hasattr(socket, "TCP_NOTSENT_LOWAT"):
+            self.sock.setsockopt(
+                socket.IPPROTO_TCP, socket.TCP_NOTSENT_LOWAT, main_node.notsent_lowat
+            )
 
         # * id   : id of other client
         # * host : host of other client
@@ -36,11 +48,79 @@ class NodeConnection(threading.Thread):
         self.host = host
         self.port = port
 
+        # * codec, compress payload bigger than main_node.compression_threshold
+        self.codec = codec
+
         # * terminate_flag, flag for termination
         self.terminate_flag = threading.Event()
 
-        # * EOT, End of Transmision
-        self.EOT_CHAR = 0x04.to_bytes(1, "big")
+        # * wakeup pair, writing to wakeup_send unblock selector
+        # * used when new data is queued or stop is requested
+        self.wakeup_recv, self.wakeup_send = socket.socketpair()
+        self.wakeup_recv.setblocking(False)
+        self.wakeup_send.setblocking(False)
+
+        # * selector, block until sock is readable instead of polling
+        # * select_timeout, None, wakeup pair unblock it on stop
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.sock, selectors.EVENT_READ)
+        self.selector.register(self.wakeup_recv, selectors.EVENT_READ)
+        self.select_timeout = None
+
+        # * drain, write queued frames before sock is closed, see stop
+        self.drain = True
+
+        # * latency, rtt and jitter from ping, last time node sent anything
+        self.latency = heartbeat.RttEstimator()
+
+        # * parsed_size, encoded bytes of last packet parsed by parse_packet
+        # * event made from it hold that much of recv_budget, whatever it type
+        self.parsed_size = 0
+
+        # * recv_buffer, received bytes that is not processed yet
+        self.recv_buffer = RecvBuffer(
+            max_size=main_node.max_recv_buffer,
+            max_frame_size=main_node.max_frame_size,
+        )
+
+        # * send_queue, frames waiting to be written by this thread
+        # * one queue per stream of frame header, control lane go first
+        # * other streams share sock by weight
+        # * events, what sock is registered for in selector, 0 for nothing
+        self.send_queue = SendQueue(
+            weights=main_node.stream_weights,
+            lanes=main_node.stream_lanes,
+            starvation_limit=main_node.starvation_limit,
+        )
+        self.events = selectors.EVENT_READ
+
+        # * send_budget, bytes in send_queue
+        # * recv_budget, bytes of frame that is being processed
+        self.send_budget = flowcontrol.ByteBudget(
+            flowcontrol.SEND,
+            main_node.send_high_watermark,
+            main_node.send_low_watermark,
+            main_node.send_buffer_limit,
+            on_change=self.budget_changed,
+        )
+        self.recv_budget = flowcontrol.ByteBudget(
+            flowcontrol.RECV,
+            main_node.recv_high_watermark,
+            main_node.recv_low_watermark,
+            on_change=self.budget_changed,
+        )
+
+        # * File transfer, transfer id -> filetransfer.FileTransfer
+        # * sending_files, accepted outgoing file, chunk queued in turn
+        # * chunk is queued only while send budget is not paused
+        # * so a big file never fill send_queue ahead of other frames
+        self.outgoing_files = dict()
+        self.incoming_files = dict()
+        self.sending_files = collections.deque()
+
+        # * Stopped outgoing file, FileRegion of it might still be queued
+        # * it is closed once send_queue is empty, so its fd is never reused
+        self.closing_files = list()
 
         # * init NodeConnection ??
         super(NodeConnection, self).__init__()
@@ -51,148 +131,395 @@ class NodeConnection(threading.Thread):
             )
         )
 
+    @property
+    def queue_depth(self) -> int:
+        """
+        Amount of frames waiting to be sent
+
+        :param self:    Instances attributes
+
+        :return:        Depth of send_queue
+        """
+        return len(self.send_queue)
+
+    @property
+    def reading_paused(self) -> bool:
+        """
+        Reading from other node is paused while it is over recv budget
+        Not on send budget, two node sending to each other would wait forever
+
+        :param self:    Instances attributes
+
+        :return:        True if paused
+        """
+        return self.recv_budget.paused
+
     def run(self):
         """
-        The main loop function is to receive data
+        The main loop function is to receive data, and write queued data
         When data received, node_message from main_node will be invoked
 
         :param self:    Instances attributes
         """
-        buffer = b""
-
         while not self.terminate_flag.is_set():
-            chunk = b""
+            self.close_sent_files()
+            self.queue_file_chunks()
+            self.update_interest()
+
+            # * Wait until there is something to read or write
+            for key, mask in self.selector.select(timeout=self.select_timeout):
+                if key.fileobj is self.wakeup_recv:
+                    self.clear_wakeup()
+                    self.flush_send_queue()
+                    continue
+
+                if mask & selectors.EVENT_WRITE:
+                    self.flush_send_queue()
+
+                if mask & selectors.EVENT_READ:
+                    self.receive_data()
+
+        # Stopping nodeConnection
+        if self.drain:
+            self.drain_send_queue()
+        self.close_sent_files(force=True)
+        self.selector.close()
+        self.wakeup_recv.close()
+        self.wakeup_send.close()
+        self.sock.close()
+        self.main_node.node_disconnected(self)
+        self.main_node.debug_print("NodeConnection: Stopped")
+
+    def receive_data(self):
+        """
+        Receive from sock, and process every complete frame
+
+        :param self:    Instances attributes
+        """
+        try:
+            received = self.recv_buffer.recv_into(self.sock)
+
+        # * Selector woke us, but nothing to read after all
+        except BlockingIOError:
+            return
+
+        #! Need to be more spesific if possible
+        except Exception as e:
+            self.stop(drain=False)
+            self.main_node.debug_print("Unexpected Error: {}".format(str(e)))
+            return
+
+        # * Readable but nothing to read, other side closed the connection
+        if received == 0:
+            self.stop(drain=False)
+            self.main_node.debug_print("NodeConnection: Closed by other side")
+            return
+        self.main_node.metric_recv_calls.inc(1, self.id)
+        self.main_node.metric_bytes_received.inc(received, self.id)
+
+        # * Process every complete frame in buffer
+        # * header tell us the length, so no need to scan for delimiter
+        try:
+            next_frame = self.recv_buffer.next_frame()
+            while next_frame is not None:
+                frame_type, content_type, flags, packet = next_frame
+
+                frame_size = frame.HEADER_SIZE + len(packet)
+                self.main_node.metric_frames_received.inc(1, self.id)
+                self.main_node.metric_message_bytes.observe(
+                    frame_size, flowcontrol.RECV
+                )
+                self.recv_budget.acquire(frame_size)
+                try:
+                    with packet:
+                        self.main_node.node_frame(
+                            self, frame_type, content_type, flags, packet
+                        )
+                finally:
+                    self.recv_budget.release(frame_size)
+
+                next_frame = self.recv_buffer.next_frame()
+
+        except frame.FrameError as e:
+            self.stop(drain=False)
+            self.main_node.node_frame_error(self, e)
+
+        # * Handler failed, ex: OSError of file transfer
+        # * Connection is stopped, so it is still removed from node
+        except Exception as e:
+            self.stop(drain=False)
+            self.main_node.debug_print(
+                "NodeConnection: Frame from {} failed, {}".format(self.id, str(e))
+            )
+
+    def flush_send_queue(self):
+        """
+        Write queued frames to sock
+        Every frame waiting is given to one sendmsg call, scatter-gather
+
+        :param self:    Instances attributes
+        """
+        buffers = self.send_queue.peek()
+        if not buffers:
+            return
+
+        try:
+            if isinstance(buffers[0], FileRegion):
+                # * Kernel copy file to socket, it never pass through us
+                sent = buffers[0].send(self.sock)
+            elif hasattr(self.sock, "sendmsg"):
+                sent = self.sock.sendmsg(buffers)
+            else:
+                # * No sendmsg on windows, join it instead
+                sent = self.sock.send(b"".join(buffers))
+
+        # * Socket buffer is full, wait for EVENT_WRITE
+        except BlockingIOError:
+            return
+
+        except Exception as e:
+            self.main_node.debug_print(
+                "nodeconnetion send: Error sending data to node: {}".format(str(e))
+            )
+            self.stop(drain=False)
+            return
+
+        frames = self.send_queue.consume(sent)
+        self.send_budget.release(sent)
+        self.main_node.metric_send_calls.inc(1, self.id)
+        self.main_node.metric_bytes_sent.inc(sent, self.id)
+        self.main_node.metric_frames_sent.inc(frames, self.id)
+
+    def drain_send_queue(self):
+        """
+        Write frames left in send_queue, before sock is closed
+        Give up after main_node.shutdown_timeout, so stop never hang on a peer
+
+        :param self:    Instances attributes
+        """
+        deadline = time.monotonic() + self.main_node.shutdown_timeout
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.sock, selectors.EVENT_WRITE)
+            while self.drain and len(self.send_queue) > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not selector.select(remaining):
+                    self.main_node.debug_print(
+                        "NodeConnection: {} frames not sent on stop".format(
+                            len(self.send_queue)
+                        )
+                    )
+                    return
+                self.flush_send_queue()
+
+    def start_file(self, transfer):
+        """
+        Start queueing chunk of an accepted file, must run on this thread
+
+        :param self:        Instances attributes
+        :param transfer:    filetransfer.OutgoingFile, from offset
+        """
+        if transfer not in self.sending_files:
+            self.sending_files.append(transfer)
+
+    def close_file(self, transfer):
+        """
+        Close file of a stopped outgoing transfer, once no chunk of it is queued
+
+        :param self:        Instances attributes
+        :param transfer:    filetransfer.OutgoingFile, that is cancelled
+        """
+        self.closing_files.append(transfer)
+        self.close_sent_files()
+
+    def close_sent_files(self, force: bool = False):
+        """
+        Close files in closing_files, when send_queue is empty
+
+        :param self:    Instances attributes
+        :param force:   Close even if queue is not empty, sock is closed already
+        """
+        if self.closing_files and (force or len(self.send_queue) == 0):
+            for transfer in self.closing_files:
+                transfer.close()
+            self.closing_files.clear()
+
+    def queue_file_chunks(self):
+        """
+        Queue chunk of sending files until send budget is paused
+        File is left on disk, chunk is a FileRegion if os.sendfile exist
+
+        :param self:    Instances attributes
+        """
+        while self.sending_files and not self.send_budget.paused:
+            transfer = self.sending_files[0]
+            if transfer.queued_all or transfer.error is not None:
+                self.sending_files.popleft()
+                continue
 
             try:
-                chunk = self.sock.recv(4096)
+                entries, count = transfer.chunk(filetransfer.SENDFILE)
+            except OSError as e:
+                self.main_node.cancel_file(self, transfer, filetransfer.SEND, str(e))
+                continue
+
+            if not self.send_frame(*entries):
+                self.main_node.cancel_file(
+                    self, transfer, filetransfer.SEND, "send buffer is full"
+                )
+                continue
+            transfer.offset += count
+            self.main_node.file_progress(self, transfer, filetransfer.SEND)
 
-            except socket.timeout:
-                self.main_node.debug_print("NodeConnection: timeout")
+    def update_interest(self):
+        """
+        Register sock for EVENT_READ only when reading is not paused
+        And for EVENT_WRITE only when send_queue is not empty
 
-            #! Need to be more spesific if possible
-            except Exception as e:
-                self.terminate_flag.set()
-                self.main_node.debug_print("Unexpected Error: {}".format(str(e)))
+        :param self:    Instances attributes
+        """
+        events = 0
+        if not self.reading_paused:
+            events |= selectors.EVENT_READ
+        if len(self.send_queue) > 0:
+            events |= selectors.EVENT_WRITE
+        if events == self.events:
+            return
+
+        # * Selector does not take empty events, sock is left out instead
+        if events == 0:
+            self.selector.unregister(self.sock)
+        elif self.events == 0:
+            self.selector.register(self.sock, events)
+        else:
+            self.selector.modify(self.sock, events)
+        self.events = events
 
-            if chunk != b"":
-                buffer += chunk
-                eot_pos = buffer.find(self.EOT_CHAR)
+    def budget_changed(self, budget):
+        """
+        Byte budget is paused or resumed, safe to call from any thread
 
-                # * So if eot found in buffer, we process it on while
-                while eot_pos > 0:
-                    # * packet should contain all buffer - EOT
-                    # * buffer is reset to b"" since it slice end of bytes
-                    packet = buffer[:eot_pos]
-                    buffer = buffer[eot_pos + 1 :]
+        :param self:        Instances attributes
+        :param budget:      flowcontrol.ByteBudget that changed
+        """
+        self.main_node.node_flow_control(self, budget)
 
-                    self.main_node.message_count_recv += 1
+        # * Selector interest is updated on this thread
+        self.wakeup()
 
-                    #
-                    self.main_node.node_message(self, self.parse_packet(packet))
+    def wakeup(self):
+        """
+        Unblock selector on this thread, safe to call from any thread
 
-                    # reset EOT_POS
-                    eot_pos = buffer.find(self.EOT_CHAR)
+        :param self:    Instances attributes
+        """
+        try:
+            self.wakeup_send.send(b"\x00")
 
-            time.sleep(0.1)
+        # * Already pending wakeup, or connection closed
+        except OSError:
+            pass
 
-        # Stopping nodeConnection
-        self.sock.settimeout(None)
-        self.sock.close()
-        self.main_node.node_disconnected(self)
-        self.main_node.debug_print("NodeConnection: Stopped")
+    def clear_wakeup(self):
+        """
+        Read every pending wakeup byte
+
+        :param self:    Instances attributes
+        """
+        try:
+            while self.wakeup_recv.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
 
-    def stop(self):
+    def stop(self, drain: bool = True):
         """
-        Stop this thread
+        Stop this thread, safe to call from any thread
 
         :param self:        Instances attributes
+        :param drain:       Write queued frames first, up to shutdown_timeout
+                            False when other node is gone or not responding
         """
+        self.drain = self.drain and drain
         self.terminate_flag.set()
+        self.wakeup()
 
-    def send(self, data, encoding="utf-8"):
+    def send(self, data, encoding="utf-8", stream=None):
         """
         Sending data to connected Node, through NodeConnection Instance on other side
-        No compression
+        Data is queued as a single frame, compressed if codec is agreed
+        Caller never wait for socket, this thread write it
 
         :param self:        Instances attributes
         :param data:        str, dict as json, or bytes
         :param encoding:    encoding method
+        :param stream:      frame.STREAM_*, None to pick by size
+
+        :return:            True if data is queued, False if dropped
         """
 
-        # * If data is str its quite straighforward
-        if isinstance(data, str):
-            try:
-                encoded_data = data.encode(encoding) + self.EOT_CHAR
-                self.sock.sendall(encoded_data)
-                # * Send a callback func
-            except Exception as e:
-                self.main_node.debug_print(
-                    "nodeconnetion send: Error sending data to node: {}".format(str(e))
-                )
-                self.stop()
+        try:
+            payload, content_type = frame.encode_payload(data, encoding)
+            encoded_data = self.main_node.pack_data(
+                payload, self.codec, content_type, stream
+            )
 
-        elif isinstance(data, dict):
-            try:
-                encoded_data = json.dumps(data).encode(encoding) + self.EOT_CHAR
-                self.sock.sendall(encoded_data)
+        # * Invalid datatype, or non serialize data in dict so dumps failed
+        except TypeError as type_error:
+            self.main_node.debug_print(
+                "nodeconnection send: Invalid data, \n{}".format(type_error)
+            )
+            return False
 
-            # * Non serialize data in dict so dumps failed
-            except TypeError as type_error:
-                self.main_node.debug_print(
-                    "nodeconnection send: The dict is invalid, \n{}".format(type_error)
-                )
+        return self.send_frame(encoded_data)
 
-            except Exception as e:
-                self.main_node.debug_print(
-                    "nodeconnetion send: Error sending data to node: {}".format(str(e))
-                )
-                self.stop()
+    def send_frame(self, encoded_frame: bytes, *parts):
+        """
+        Queue a frame that is already packed
+        Same bytes object can be queued on many connection, it is never changed
 
-        elif isinstance(data, bytes):
-            try:
-                encoded_data = data + self.EOT_CHAR
-                self.sock.sendall(encoded_data)
-            except Exception as e:
-                self.main_node.debug_print(
-                    "nodeconnetion send: Error sending data to node: {}".format(str(e))
-                )
-                self.stop()
-        else:
+        :param self:            Instances attributes
+        :param encoded_frame:   bytes, a complete frame from frame.pack_frame
+                                or only it start, if parts is given
+        :param parts:           Rest of the frame, bytes or FileRegion
+
+        :return:                True if frame is queued, False if dropped
+        """
+        frame_size = len(encoded_frame) + sum(len(part) for part in parts)
+        if not self.send_budget.acquire(frame_size):
             self.main_node.debug_print(
-                "nodeconnection send: Invalid datatype, str, dict or bytes is valid"
+                "nodeconnection send: Send budget of {} is full".format(self.id)
             )
+            return False
 
-    def parse_packet(self, packet: bytes):
+        queue_depth = self.send_queue.put(
+            encoded_frame, *parts, stream=frame.frame_stream(encoded_frame)
+        )
+        if queue_depth == 0:
+            self.send_budget.release(frame_size)
+            self.main_node.debug_print(
+                "nodeconnection send: Send queue of {} is full".format(self.id)
+            )
+            return False
+        self.main_node.metric_message_bytes.observe(frame_size, flowcontrol.SEND)
+
+        # * Queue was empty, writer might be waiting only for EVENT_READ
+        if queue_depth == 1:
+            self.wakeup()
+        return True
+
+    def parse_packet(self, packet, content_type: int):
         """
         Parse packet that received
+        packet is a view into recv_buffer, so it must not be kept
 
-        :param self:        Instances attributes
-        :param packet:      packet received type:bytes
+        :param self:            Instances attributes
+        :param packet:          packet received type:memoryview
+        :param content_type:    type of the packet, from frame header
 
-        :return:            parsed data, str or bytes
+        :return:                parsed data, dict, str or bytes
         """
-
-        try:
-            packet_decoded = packet.decode("utf-8")
-            try:
-                # this is dict
-                return json.loads(packet_decoded)
-
-            # * If its not json.dumps
-            # * Probably just a raw string
-            except json.decoder.JSONDecodeError:
-                # this should be str
-                return packet_decoded
-
-            except UnicodeDecodeError:
-                # this is bytes
-                return packet
-
-        # * If its not encoded with utf-8
-        # * Means it serious data
-        except UnicodeDecodeError:
-            # this is bytes
-            return packet
+        self.parsed_size = len(packet)
+        return frame.decode_payload(packet, content_type)
 
     # ? MAGIC FUNCTION
     def __str__(self) -> str:
@@ -0,0 +1,178 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+
+
+class ReconnectScheduler(threading.Thread):
+    def __init__(
+        self,
+        callback,
+        retry_check=None,
+        base_delay=0.5,
+        max_delay=30.0,
+        max_tries=10,
+    ):
+        """
+        Reconnect scheduler, try to reconnect to lost node with exponential backoff
+        Timers are kept in a heap, so each event cost O(log n)
+
+        :param self:            Instances attributes
+        :param callback:        A func (host, port), called when reconnect is due
+        :param retry_check:     A func (host, port, tries) -> bool, False stop retrying
+        :param base_delay:      Delay in second before first reconnect
+        :param max_delay:       Max delay in second between reconnect
+        :param max_tries:       Max amount of reconnect before giving up
+        """
+        self.callback = callback
+        self.retry_check = retry_check
+
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_tries = max_tries
+
+        # * terminate flag, flag for thread termination
+        # * condition, wake up this thread when new timer is added
+        self.terminate_flag = threading.Event()
+        self.condition = threading.Condition()
+
+        # * timers, heap of (due, sequence, (host, port))
+        # * watched, (host, port) -> {"tries": int, "timer": sequence or None}
+        # * timer that is no longer in watched is skipped when popped
+        self.timers = []
+        self.watched = dict()
+        self.sequence = itertools.count()
+
+        super(ReconnectScheduler, self).__init__()
+
+    def watch(self, host, port):
+        """
+        Start watching node @host:port, it will be reconnected when lost
+
+        :param self:        Instances attributes
+        :param host:        IP address of node
+        :param port:        Port of node
+        """
+        with self.condition:
+            self.watched.setdefault((host, port), {"tries": 0, "timer": None})
+
+    def unwatch(self, host, port):
+        """
+        Stop watching node @host:port, pending reconnect is cancelled
+
+        :param self:        Instances attributes
+        :param host:        IP address of node
+        :param port:        Port of node
+        """
+        with self.condition:
+            self.watched.pop((host, port), None)
+
+    def reset(self, host, port):
+        """
+        Node @host:port is connected again, reset it tries
+
+        :param self:        Instances attributes
+        :param host:        IP address of node
+        :param port:        Port of node
+        """
+        with self.condition:
+            state = self.watched.get((host, port), None)
+            if state is not None:
+                state["tries"] = 0
+                state["timer"] = None
+
+    def schedule(self, host, port) -> bool:
+        """
+        Schedule reconnect to node @host:port, if it is watched
+
+        :param self:        Instances attributes
+        :param host:        IP address of node
+        :param port:        Port of node
+
+        :return:            True if reconnect is scheduled
+        """
+        with self.condition:
+            state = self.watched.get((host, port), None)
+            if state is None or state["timer"] is not None:
+                return False
+
+            state["tries"] += 1
+            tries = state["tries"]
+
+        can_retry = tries <= self.max_tries
+        if can_retry and self.retry_check is not None:
+            can_retry = self.retry_check(host, port, tries)
+
+        with self.condition:
+            if not can_retry:
+                self.watched.pop((host, port), None)
+                return False
+
+            sequence = next(self.sequence)
+            due = time.monotonic() + self.backoff_delay(tries)
+            state["timer"] = sequence
+            heapq.heappush(self.timers, (due, sequence, (host, port)))
+            self.condition.notify()
+        return True
+
+    def backoff_delay(self, tries: int) -> float:
+        """
+        Delay before next reconnect, exponential with jitter
+        Jitter is between half and full delay, so node do not reconnect together
+
+        :param self:        Instances attributes
+        :param tries:       Number of tries, 1 for first reconnect
+
+        :return:            Delay in second
+        """
+        delay = min(self.max_delay, self.base_delay * (2 ** (tries - 1)))
+        return random.uniform(delay / 2, delay)
+
+    def next_due(self):
+        """
+        Wait until a timer is due
+
+        :param self:        Instances attributes
+
+        :return:            (host, port) that is due, None if woke up for other reason
+        """
+        with self.condition:
+            if not self.timers:
+                self.condition.wait()
+                return None
+
+            due, sequence, key = self.timers[0]
+            wait_time = due - time.monotonic()
+            if wait_time > 0:
+                self.condition.wait(wait_time)
+                return None
+
+            heapq.heappop(self.timers)
+            state = self.watched.get(key, None)
+            if state is None or state["timer"] != sequence:
+                return None
+
+            state["timer"] = None
+            return key
+
+    def run(self):
+        """
+        Run ReconnectScheduler from threading.Thread parent class
+
+        :param self:        Instances attributes
+        """
+        while not self.terminate_flag.is_set():
+            key = self.next_due()
+            if key is not None and not self.terminate_flag.is_set():
+                self.callback(*key)
+
+    def stop(self):
+        """
+        Stop this ReconnectScheduler
+
+        :param self:        Instances attributes
+        """
+        with self.condition:
+            self.terminate_flag.set()
+            self.condition.notify()
@@ -0,0 +1,120 @@
+from . import frame
+
+
+class RecvBuffer:
+    def __init__(
+        self,
+        size: int = 16384,
+        max_size: int = frame.HEADER_SIZE + frame.MAX_FRAME_SIZE,
+        max_frame_size: int = frame.MAX_FRAME_SIZE,
+    ):
+        """
+        Receive buffer for one connection
+        Socket write directly into a preallocated bytearray with recv_into
+        Frames are handed out as memoryview, without copying the payload
+
+        Data live between self.start and self.end
+        Free space after self.end is filled by recv_into
+        When a frame does not fit, unread bytes are moved to the front,
+        or the buffer grow to fit the whole frame
+
+        :param self:            Instances attributes
+        :param size:            Initial size of the buffer in bytes
+        :param max_size:        Max size the buffer can grow to
+        :param max_frame_size:  Max payload size of one frame
+        """
+        self.max_size = max_size
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray(min(size, max_size))
+        self.start = 0
+        self.end = 0
+
+    def __len__(self) -> int:
+        """
+        :return:        Amount of unread bytes in buffer
+        """
+        return self.end - self.start
+
+    def recv_into(self, sock) -> int:
+        """
+        Receive from sock into free space of buffer
+        Memoryview from next_frame is no longer valid after this call
+
+        :param self:        Instances attributes
+        :param sock:        socket.socket instances to receive from
+
+        :return:            Amount of bytes received, 0 when sock is closed
+        """
+        if self.end == len(self.buffer):
+            self.reserve(len(self) + 1)
+
+        with memoryview(self.buffer) as view:
+            received = sock.recv_into(view[self.end :])
+        self.end += received
+        return received
+
+    def next_frame(self):
+        """
+        Take the next complete frame out of buffer
+
+        :param self:        Instances attributes
+
+        :return:            tuple of (frame_type, content_type, flags, payload)
+                            payload is a memoryview
+                            None if the frame is not complete yet
+        """
+        if len(self) < frame.HEADER_SIZE:
+            return None
+
+        frame_type, content_type, flags, length = frame.unpack_header(
+            self.buffer, self.start
+        )
+
+        # * Checked before buffer grow, length is what other node claim
+        if length > self.max_frame_size:
+            raise frame.FrameSizeError(
+                "Frame of {} bytes, max is {}".format(length, self.max_frame_size)
+            )
+        frame_size = frame.HEADER_SIZE + length
+        if frame_size > self.max_size:
+            raise frame.BufferLimitError(
+                "Frame of {} bytes does not fit in {} bytes buffer".format(
+                    frame_size, self.max_size
+                )
+            )
+        if len(self) < frame_size:
+            # * Make sure the whole frame can be received in place
+            self.reserve(frame_size)
+            return None
+
+        payload_start = self.start + frame.HEADER_SIZE
+        payload = memoryview(self.buffer)[payload_start : payload_start + length]
+
+        self.start += frame_size
+        if self.start == self.end:
+            self.start = self.end = 0
+
+        return frame_type, content_type, flags, payload
+
+    def reserve(self, size: int):
+        """
+        Make sure size bytes fit in buffer, counted from self.start
+
+        :param self:        Instances attributes
+        :param size:        Amount of bytes needed
+        """
+        if self.start + size <= len(self.buffer):
+            return
+
+        unread = len(self)
+        if size <= len(self.buffer):
+            # * Enough space, move unread bytes to the front
+            self.buffer[:unread] = self.buffer[self.start : self.end]
+        else:
+            # * Not enough, grow and copy unread bytes, never over max_size
+            new_buffer = bytearray(min(max(size, len(self.buffer) * 2), self.max_size))
+            new_buffer[:unread] = self.buffer[self.start : self.end]
+            self.buffer = new_buffer
+
+        self.start = 0
+        self.end = unread
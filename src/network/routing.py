@@ -0,0 +1,300 @@
+import json
+import struct
+import threading
+
+from . import frame
+
+# * Distance vector routing, every node tell it neighbours
+# * how far it is from every node it can reach, in hop
+# * Route that reach MAX_DISTANCE is unreachable, so loop can not count forever
+# * New neighbour get every route, after that only changed route is sent
+# * like RIP triggered update, route sent as MAX_DISTANCE is withdrawn
+MAX_DISTANCE = 16
+
+# * Unicast payload layout, inside a FRAME_UNICAST frame
+# *   ttl           : 1 byte, hop left before message is dropped
+# *   dest_length   : 1 byte, length of dest
+# *   source_length : 1 byte, length of source
+# *   dest          : id of node the message is for, utf-8
+# *   source        : id of node that create the message, utf-8
+# *   payload       : same as FRAME_DATA payload
+UNICAST_HEADER = struct.Struct("!BBB")
+UNICAST_HEADER_SIZE = UNICAST_HEADER.size
+
+
+def pack_routes(routes: dict, full: bool = True) -> bytes:
+    """
+    Pack route advertisement into a FRAME_ROUTE frame
+
+    :param routes:      dict of node id -> distance
+    :param full:        True if routes is every route, replacing the previous one
+                        False if it is only changed route
+
+    :return:            bytes ready to be sent
+    """
+    return frame.pack_frame(
+        json.dumps({"full": full, "routes": routes}).encode("utf-8"),
+        frame_type=frame.FRAME_ROUTE,
+        content_type=frame.CONTENT_JSON,
+    )
+
+
+def unpack_routes(packet) -> dict:
+    """
+    Unpack payload of a FRAME_ROUTE frame
+
+    :param packet:      payload of the frame, bytes or memoryview
+
+    :return:            tuple of (dict of node id -> distance, full)
+    """
+    try:
+        advertisement = json.loads(str(packet, "utf-8"))
+        routes = advertisement["routes"]
+        full = advertisement["full"]
+    except (UnicodeDecodeError, json.decoder.JSONDecodeError):
+        raise frame.FrameError("Route advertisement is not json")
+    except (TypeError, KeyError):
+        raise frame.FrameError("Route advertisement is invalid")
+
+    if (
+        not isinstance(routes, dict)
+        or not isinstance(full, bool)
+        or not all(isinstance(distance, int) for distance in routes.values())
+    ):
+        raise frame.FrameError("Route advertisement is invalid")
+    return routes, full
+
+
+def pack_unicast(
+    dest: str,
+    source: str,
+    ttl: int,
+    payload,
+    content_type: int = frame.CONTENT_BINARY,
+) -> bytes:
+    """
+    Pack routed message into a FRAME_UNICAST frame
+
+    :param dest:            id of node the message is for
+    :param source:          id of node that create the message
+    :param ttl:             hop left, 1 to 255
+    :param payload:         encoded payload, bytes or memoryview
+    :param content_type:    type of the payload, frame.CONTENT_*
+
+    :return:                bytes ready to be sent
+    """
+    encoded_dest = dest.encode("utf-8")
+    encoded_source = source.encode("utf-8")
+    if len(encoded_dest) > 255 or len(encoded_source) > 255:
+        raise frame.FrameError("Unicast node id is too long")
+
+    header = UNICAST_HEADER.pack(ttl, len(encoded_dest), len(encoded_source))
+    return frame.pack_frame(
+        b"".join((header, encoded_dest, encoded_source, payload)),
+        frame_type=frame.FRAME_UNICAST,
+        content_type=content_type,
+    )
+
+
+def unpack_unicast(packet):
+    """
+    Unpack payload of a FRAME_UNICAST frame
+
+    :param packet:      payload of the frame, bytes or memoryview
+
+    :return:            tuple of (dest, source, ttl, payload as memoryview)
+    """
+    if len(packet) < UNICAST_HEADER_SIZE:
+        raise frame.FrameError("Unicast frame is too short")
+
+    ttl, dest_length, source_length = UNICAST_HEADER.unpack_from(packet)
+    source_start = UNICAST_HEADER_SIZE + dest_length
+    payload_start = source_start + source_length
+    if len(packet) < payload_start:
+        raise frame.FrameError("Unicast node id is truncated")
+
+    with memoryview(packet) as view:
+        try:
+            dest = str(view[UNICAST_HEADER_SIZE:source_start], "utf-8")
+            source = str(view[source_start:payload_start], "utf-8")
+        except UnicodeDecodeError:
+            raise frame.FrameError("Unicast node id is not utf-8")
+        payload = view[payload_start:]
+
+    return dest, source, ttl, payload
+
+
+class RoutingTable:
+    def __init__(self, id: str):
+        """
+        Distance vector routing table of one node
+        Route to a node id is looked up in O(1)
+        Only route through changed neighbour is recomputed on update
+
+        :param self:        Instances attributes
+        :param id:          ID of the node that own this table
+        """
+        self.id = id
+        self.lock = threading.Lock()
+
+        # * vectors, neighbour id -> {node id: distance from that neighbour}
+        # * routes, node id -> (next hop neighbour id, distance from us)
+        self.vectors = dict()
+        self.routes = dict()
+
+    def __len__(self) -> int:
+        """
+        :return:        Amount of node we have route to
+        """
+        return len(self.routes)
+
+    def next_hop(self, dest: str):
+        """
+        Get neighbour that is on shortest path to dest
+
+        :param self:        Instances attributes
+        :param dest:        id of node
+
+        :return:            neighbour id, None if dest is unreachable
+        """
+        route = self.routes.get(dest, None)
+        return None if route is None else route[0]
+
+    def distance(self, dest: str):
+        """
+        :return:        Amount of hop to dest, None if dest is unreachable
+        """
+        route = self.routes.get(dest, None)
+        return None if route is None else route[1]
+
+    def neighbours(self) -> list:
+        """
+        :return:        Snapshot of neighbour id
+        """
+        with self.lock:
+            return list(self.vectors.keys())
+
+    def add_neighbour(self, neighbour_id: str) -> set:
+        """
+        Neighbour is connected to us, it is 1 hop away
+
+        :param self:            Instances attributes
+        :param neighbour_id:    id of the neighbour
+
+        :return:                set of node id whose route changed
+        """
+        with self.lock:
+            if neighbour_id in self.vectors:
+                return set()
+            self.vectors[neighbour_id] = dict()
+            return self.recompute({neighbour_id})
+
+    def remove_neighbour(self, neighbour_id: str) -> set:
+        """
+        Neighbour is disconnected, route through it is recomputed
+
+        :param self:            Instances attributes
+        :param neighbour_id:    id of the neighbour
+
+        :return:                set of node id whose route changed
+        """
+        with self.lock:
+            vector = self.vectors.pop(neighbour_id, None)
+            if vector is None:
+                return set()
+            return self.recompute({neighbour_id} | vector.keys())
+
+    def update_neighbour(self, neighbour_id: str, vector: dict, full=True) -> set:
+        """
+        Neighbour advertise it routes
+        Full advertisement replace the previous one, other only update it
+        Connection might send it before it is registered, so it add neighbour too
+
+        :param self:            Instances attributes
+        :param neighbour_id:    id of the neighbour
+        :param vector:          dict of node id -> distance from neighbour
+        :param full:            True if vector is every route of neighbour
+
+        :return:                set of node id whose route changed
+        """
+        new_vector = {
+            dest: distance
+            for dest, distance in vector.items()
+            if dest != self.id and 0 < distance < MAX_DISTANCE - 1
+        }
+        with self.lock:
+            if full:
+                old_vector = self.vectors.get(neighbour_id, dict())
+                self.vectors[neighbour_id] = new_vector
+                return self.recompute(
+                    {neighbour_id} | old_vector.keys() | new_vector.keys()
+                )
+
+            # * Route that is left out of new_vector is withdrawn
+            old_vector = self.vectors.setdefault(neighbour_id, dict())
+            for dest in vector:
+                old_vector.pop(dest, None)
+            old_vector.update(new_vector)
+            return self.recompute({neighbour_id} | vector.keys())
+
+    def recompute(self, dests) -> set:
+        """
+        Recompute route of dests, lock must be held
+
+        :param self:        Instances attributes
+        :param dests:       iterable of node id
+
+        :return:            set of node id whose route changed
+        """
+        changed = set()
+        for dest in dests:
+            # * Direct neighbour is always shortest
+            if dest in self.vectors:
+                best = (dest, 1)
+            else:
+                best = None
+                for neighbour_id, vector in self.vectors.items():
+                    distance = vector.get(dest, None)
+                    if distance is not None and (
+                        best is None or distance + 1 < best[1]
+                    ):
+                        best = (neighbour_id, distance + 1)
+
+            if best is None:
+                if self.routes.pop(dest, None) is not None:
+                    changed.add(dest)
+            elif self.routes.get(dest, None) != best:
+                self.routes[dest] = best
+                changed.add(dest)
+        return changed
+
+    def advertisement(self, neighbour_id: str, dests=None) -> dict:
+        """
+        Routes to tell a neighbour
+        Route that go through that neighbour is left out, split horizon
+
+        :param self:            Instances attributes
+        :param neighbour_id:    id of the neighbour
+        :param dests:           iterable of node id that changed, None for all
+                                Unreachable one is sent as MAX_DISTANCE
+
+        :return:                dict of node id -> distance
+        """
+        with self.lock:
+            if dests is None:
+                return {
+                    dest: distance
+                    for dest, (next_hop, distance) in self.routes.items()
+                    if next_hop != neighbour_id
+                }
+
+            routes = dict()
+            for dest in dests:
+                if dest == neighbour_id:
+                    continue
+                route = self.routes.get(dest, None)
+                if route is None or route[0] == neighbour_id:
+                    routes[dest] = MAX_DISTANCE
+                else:
+                    routes[dest] = route[1]
+            return routes
@@ -0,0 +1,288 @@
+import collections
+import itertools
+import os
+import threading
+
+from . import frame
+
+
+# * Weight of each stream, share of socket it get while other stream is busy
+# * Control and chat get 4 turns worth of bytes for every 1 of bulk
+# * Stream that is not listed have weight 1
+STREAM_WEIGHTS = {
+    frame.STREAM_CONTROL: 4,
+    frame.STREAM_CHAT: 4,
+    frame.STREAM_BULK: 1,
+}
+
+# * Priority lane of stream, frame of high lane always go before low lane
+# * Streams in the same lane share it by weight
+# * Stream that is not listed is in LANE_LOW
+LANE_HIGH = 0
+LANE_LOW = 1
+STREAM_LANES = {
+    frame.STREAM_CONTROL: LANE_HIGH,
+}
+
+
+class FileRegion:
+    def __init__(self, fd: int, offset: int, count: int):
+        """
+        Part of a file that is queued like a frame, but never read into memory
+        Writer give it to os.sendfile, kernel copy it from page cache to socket
+        fd must stay open until region is sent
+
+        :param self:        Instances attributes
+        :param fd:          File descriptor, opened for reading
+        :param offset:      Position of first byte in file
+        :param count:       Amount of bytes
+        """
+        self.fd = fd
+        self.offset = offset
+        self.count = count
+
+    def __len__(self) -> int:
+        """
+        :return:        Amount of bytes
+        """
+        return self.count
+
+    def skip(self, amount: int):
+        """
+        :return:        FileRegion without the first amount of bytes
+        """
+        return FileRegion(self.fd, self.offset + amount, self.count - amount)
+
+    def send(self, sock) -> int:
+        """
+        Write region to non blocking sock, as much as it take
+
+        :param self:        Instances attributes
+        :param sock:        socket.socket
+
+        :return:            Amount of bytes sent
+        """
+        sent = os.sendfile(sock.fileno(), self.fd, self.offset, self.count)
+
+        # * File is shorter than when region is made, frame can't be finished
+        if sent == 0:
+            raise OSError("File ended {} bytes before region".format(self.count))
+        return sent
+
+
+class SendQueue:
+    def __init__(
+        self,
+        max_frames: int = 4096,
+        max_iov: int = 512,
+        weights: dict = None,
+        quantum: int = 16 * 1024,
+        max_batch: int = 256 * 1024,
+        lanes: dict = None,
+        starvation_limit: int = 64 * 1024,
+    ):
+        """
+        Bounded outbound queue for one connection, one queue per stream
+        Producer put frames from any thread, one writer take them out
+        High lane go first, so control is never stuck behind bulk data
+        Inside a lane, streams take turn by weight, weighted round robin
+        over bytes, so a big frame of one stream never hold back other stream
+        Writer take many frames at once, so they can be sent in one syscall
+
+        :param self:                Instances attributes
+        :param max_frames:          Max amount of frames waiting to be sent
+        :param max_iov:             Max amount of buffers given to writer at once
+        :param weights:             stream -> weight, default STREAM_WEIGHTS
+        :param quantum:             Bytes a stream of weight 1 send on it turn
+        :param max_batch:           Bytes picked for writer at once, after that
+                                    frame queued on any stream can go next
+        :param lanes:               stream -> LANE_*, default STREAM_LANES
+        :param starvation_limit:    Bytes high lane can send in a row while
+                                    low lane wait, then low lane get a turn
+        """
+        self.lock = threading.Lock()
+
+        self.max_frames = max_frames
+        self.max_iov = max_iov
+        self.weights = STREAM_WEIGHTS if weights is None else weights
+        self.quantum = quantum
+        self.max_batch = max_batch
+        self.lanes = STREAM_LANES if lanes is None else lanes
+        self.starvation_limit = starvation_limit
+
+        # * streams, stream -> deque of (size, entries), entries is one frame
+        # * active, lane -> stream that has frame waiting, in turn order
+        # * deficit, stream -> bytes it can still send on it turn
+        # * on_turn, lane -> first stream in active got it quantum already
+        # * high_run, bytes high lane sent in a row while low lane wait
+        self.streams = dict()
+        self.active = (collections.deque(), collections.deque())
+        self.deficit = dict()
+        self.on_turn = [False, False]
+        self.high_run = 0
+
+        # * wire, (buffer, end of frame) picked for writer, sent in this order
+        self.wire = collections.deque()
+
+        # * frames, amount of frames in queue, including the one being sent
+        # * queued_bytes, size of every frame in queue
+        # * offset, bytes of the first buffer in wire that is already sent
+        self.frames = 0
+        self.queued_bytes = 0
+        self.offset = 0
+
+    def __len__(self) -> int:
+        """
+        :return:        Queue depth, amount of frames waiting to be sent
+        """
+        return self.frames
+
+    def put(self, data: bytes, *parts, stream: int = frame.STREAM_CHAT) -> int:
+        """
+        Add a frame to the end of it stream queue
+
+        :param self:        Instances attributes
+        :param data:        bytes of a complete frame, or of it start
+        :param parts:       Rest of the frame, bytes or FileRegion
+                            Sent right after data, nothing can come between
+        :param stream:      Stream of the frame, frame.STREAM_*
+
+        :return:            Queue depth after data is added
+                            0 if queue is full and data is dropped
+        """
+        size = len(data) + sum(len(part) for part in parts)
+        with self.lock:
+            if self.frames >= self.max_frames:
+                return 0
+
+            queue = self.streams.get(stream, None)
+            if queue is None:
+                queue = self.streams[stream] = collections.deque()
+                self.deficit[stream] = 0
+            if not queue:
+                self.active[self.lanes.get(stream, LANE_LOW)].append(stream)
+            queue.append((size, (data,) + parts))
+
+            self.frames += 1
+            self.queued_bytes += size
+            return self.frames
+
+    def schedule(self):
+        """
+        Move frames from stream queues to wire, up to max_batch bytes
+        High lane first, low lane only get a turn when high lane is empty
+        or has sent starvation_limit bytes in a row while low lane wait
+        Lock must be held
+
+        :param self:        Instances attributes
+        """
+        batch = 0
+        while batch < self.max_batch and len(self.wire) < self.max_iov:
+            high, low = self.active
+            if not low:
+                self.high_run = 0
+                if not high:
+                    return
+
+            if high and not (low and self.high_run >= self.starvation_limit):
+                size = self.schedule_lane(LANE_HIGH)
+                self.high_run += size
+            else:
+                size = self.schedule_lane(LANE_LOW)
+                self.high_run = 0
+            batch += size
+
+    def schedule_lane(self, lane: int) -> int:
+        """
+        One step of deficit round robin in lane
+        Stream get quantum * weight bytes each turn, unused bytes is kept
+        for next turn, unless stream become empty
+        Lock must be held
+
+        :param self:        Instances attributes
+        :param lane:        LANE_HIGH or LANE_LOW, must have active stream
+
+        :return:            Bytes of frame moved to wire, 0 if turn is passed
+        """
+        active = self.active[lane]
+        stream = active[0]
+        queue = self.streams[stream]
+        if not self.on_turn[lane]:
+            self.deficit[stream] += self.quantum * self.weights.get(stream, 1)
+            self.on_turn[lane] = True
+
+        # * Frame bigger than what is left, it wait for next turn
+        size, entries = queue[0]
+        if size > self.deficit[stream]:
+            active.rotate(-1)
+            self.on_turn[lane] = False
+            return 0
+
+        queue.popleft()
+        self.deficit[stream] -= size
+        for entry in entries[:-1]:
+            self.wire.append((entry, False))
+        self.wire.append((entries[-1], True))
+
+        if not queue:
+            self.deficit[stream] = 0
+            active.popleft()
+            self.on_turn[lane] = False
+        return size
+
+    def peek(self) -> list:
+        """
+        Get buffers waiting to be sent, without removing it
+        Next frames are picked from streams only when wire is empty
+
+        :param self:        Instances attributes
+
+        :return:            list of buffers, first one skip bytes already sent
+                            FileRegion is always alone, it is sent by itself
+        """
+        buffers = []
+        with self.lock:
+            if not self.wire:
+                self.schedule()
+
+            for entry, _ in itertools.islice(self.wire, self.max_iov):
+                if isinstance(entry, FileRegion):
+                    if not buffers:
+                        buffers.append(entry)
+                    break
+                buffers.append(entry)
+
+        if buffers and self.offset > 0:
+            if isinstance(buffers[0], FileRegion):
+                buffers[0] = buffers[0].skip(self.offset)
+            else:
+                buffers[0] = memoryview(buffers[0])[self.offset :]
+        return buffers
+
+    def consume(self, amount: int):
+        """
+        Remove amount of bytes that is sent from the front of wire
+
+        :param self:        Instances attributes
+        :param amount:      Amount of bytes sent
+
+        :return:            Amount of frames fully sent
+        """
+        frames = 0
+        with self.lock:
+            while amount > 0:
+                entry, frame_end = self.wire[0]
+                remaining = len(entry) - self.offset
+                if amount < remaining:
+                    self.offset += amount
+                    return frames
+
+                amount -= remaining
+                self.wire.popleft()
+                self.queued_bytes -= len(entry)
+                self.offset = 0
+
+                if frame_end:
+                    self.frames -= 1
+                    frames += 1
+        return frames
@@ -162,6 +162,9 @@ class TerminalUi(threading.Thread):
             log_window.refresh()
             self.prev_text_buffer = self.text_buffer.copy()
 
+            # * Tell controller what it gave is on screen, for latency tracing
+            self.callback("log_painted", None)
+
     def update_fps_counter(self, win, fps: float):
         """
         Paint FPS amount in around top left
@@ -223,9 +226,10 @@ class TerminalUi(threading.Thread):
             win.addnstr(y, x, info, max_len)
             win.refresh()
 
-    def update_peer_info(self, win, info=None, location=(2, 37)):
+    def update_peer_info(self, win, info=None, location=(2, 37), peer_count=1):
         """
         Paint our connected peer id, in an easily readable format
+        Or amount of peer, if connected with more than one
 
         Occupy from col 37 - 58 on row 2
                         21 col
@@ -234,6 +238,7 @@ class TerminalUi(threading.Thread):
         :param win:         log_win_border
         :param info:        str to paint, max 5 char, default: None
         :param location:    location of row,col in win to paint on
+        :param peer_count:  amount of connected peer, default: 1
         """
         y, x = location
         # since uname limited to 5, hardcoded
@@ -242,7 +247,10 @@ class TerminalUi(threading.Thread):
         erasure = " " * max_len
         win.addnstr(y, x, erasure, max_len)
 
-        if info is not None:
+        if peer_count > 1:
+            info = " Peers connected: {}".format(peer_count)
+            win.addnstr(y, x, info, max_len)
+        elif info is not None:
             info = " Connected with " + info[:5]
             win.addnstr(y, x, info, max_len)
         win.refresh()
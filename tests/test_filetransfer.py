@@ -0,0 +1,169 @@
+import os
+import queue
+import socket
+import tempfile
+import time
+import unittest
+
+from src.network import NetworkHandler
+from src.network import filetransfer, frame
+from src.network.node import Node
+
+
+class FileTransferTest(unittest.TestCase):
+    port = 21950
+
+    def start_handler(self, id, port, use_asyncio):
+        """
+        Start NetworkHandler on loopback, file progress go to self.progress
+
+        :return:        NetworkHandler that is running
+        """
+        handler = NetworkHandler(
+            "127.0.0.1",
+            port,
+            callback=self.callback,
+            id=id,
+            max_connection=4,
+            use_asyncio=use_asyncio,
+        )
+        handler.debug = False
+        handler.node.debug = False
+        handler.start()
+        self.addCleanup(handler.join)
+        self.addCleanup(handler.stop)
+        return handler
+
+    def callback(self, event_type, source_id, dest_id, data):
+        if event_type == "node_file_progress":
+            self.progress.put((dest_id, data))
+
+    def wait_progress(self, id, direction, timeout=10.0):
+        """
+        :return:        first progress of id in direction that is done or failed
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                node_id, data = self.progress.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if node_id == id and data["direction"] == direction:
+                if data["done"] or data["error"] is not None:
+                    return data
+        self.fail("No {} progress on {}".format(direction, id))
+
+    def connect_pair(self, use_asyncio):
+        """
+        Start sender and receiver, connected, with a 1 MiB file to send
+
+        :return:        tuple of (sender, receiver, directory, path, content)
+        """
+        self.progress = queue.Queue()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        path = os.path.join(directory.name, "file.bin")
+        content = os.urandom(1024 * 1024 + 7)
+        with open(path, "wb") as f:
+            f.write(content)
+
+        port = FileTransferTest.port
+        FileTransferTest.port += 2
+        sender = self.start_handler("sender", port, use_asyncio)
+        receiver = self.start_handler("receiver", port + 1, use_asyncio)
+        receiver.node.download_dir = os.path.join(directory.name, "downloads")
+
+        sender.connect_to_node("127.0.0.1", port + 1)
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            if len(sender.connections) and len(receiver.connections):
+                break
+            time.sleep(0.01)
+        return sender, receiver, directory.name, path, content
+
+    def check_resend_after_cancel(self, use_asyncio):
+        sender, receiver, directory, path, content = self.connect_pair(use_asyncio)
+        download_dir = receiver.node.download_dir
+
+        # * download_dir is a file, receiver can't open it and cancel the offer
+        blocker = os.path.join(directory, "blocker")
+        open(blocker, "w").close()
+        receiver.node.download_dir = blocker
+
+        sender.send_file(path)
+        self.assertIsNotNone(self.wait_progress("sender", "send")["error"])
+
+        receiver.node.download_dir = download_dir
+        sender.send_file(path)
+        self.assertTrue(self.wait_progress("sender", "send")["done"])
+
+        with open(os.path.join(download_dir, "file.bin"), "rb") as f:
+            self.assertEqual(f.read(), content)
+
+    def test_refuse_file_over_max_size(self):
+        sender, receiver, directory, path, content = self.connect_pair(False)
+        receiver.node.max_file_size = len(content) - 1
+
+        sender.send_file(path)
+        self.assertIn("limit", self.wait_progress("sender", "send")["error"])
+        self.assertFalse(os.path.exists(receiver.node.download_dir))
+
+    def test_done_while_chunks_queued(self):
+        port = FileTransferTest.port
+        FileTransferTest.port += 2
+        node = Node("127.0.0.1", port, id="sender")
+        node.notsent_lowat = None
+        node.start()
+        self.addCleanup(node.join)
+        self.addCleanup(node.stop)
+
+        # * Connection is not started, test thread drive it instead
+        local, remote = socket.socketpair()
+        remote.setblocking(False)
+        self.addCleanup(remote.close)
+        connection = node.create_new_connection(local, "receiver", "127.0.0.1", 0)
+        self.addCleanup(connection.sock.close)
+        self.addCleanup(connection.selector.close)
+        self.addCleanup(connection.wakeup_recv.close)
+        self.addCleanup(connection.wakeup_send.close)
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "file.bin")
+        with open(path, "wb") as f:
+            f.write(os.urandom(1024 * 1024))
+
+        transfer = filetransfer.OutgoingFile(path, chunk_size=64 * 1024)
+        self.addCleanup(transfer.close)
+        connection.outgoing_files[transfer.id] = transfer
+        connection.start_file(transfer)
+        connection.queue_file_chunks()
+        self.assertGreater(connection.queue_depth, 0)
+
+        done = filetransfer.pack_file_control(filetransfer.DONE, transfer.id)
+        node.node_file(connection, frame.CONTENT_JSON, done[frame.HEADER_SIZE :])
+        self.assertTrue(transfer.done)
+        self.assertNotIn(transfer.id, connection.outgoing_files)
+        self.assertFalse(transfer.file.closed)
+
+        # * Once every queued chunk is written, file is closed
+        while connection.queue_depth > 0:
+            connection.flush_send_queue()
+            try:
+                while remote.recv(1024 * 1024):
+                    pass
+            except BlockingIOError:
+                pass
+        connection.close_sent_files()
+        self.assertTrue(transfer.file.closed)
+
+    def test_resend_after_cancel(self):
+        self.check_resend_after_cancel(use_asyncio=False)
+
+    def test_resend_after_cancel_asyncio(self):
+        self.check_resend_after_cancel(use_asyncio=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import time
+import unittest
+
+from src.network import heartbeat
+
+
+class FakeConnection:
+    def __init__(self, id, reading_paused):
+        self.id = id
+        self.reading_paused = reading_paused
+        self.latency = heartbeat.RttEstimator()
+        self.stopped = False
+
+    def stop(self, drain=True):
+        self.stopped = True
+
+
+class FakeNode:
+    def __init__(self, connections):
+        self.all_nodes = connections
+        self.heartbeat_interval = 0.01
+        self.heartbeat_timeout = 0.05
+
+    def broadcast_frame(self, encoded_frame):
+        pass
+
+    def debug_print(self, message):
+        pass
+
+
+class HeartbeatMonitorTest(unittest.TestCase):
+    def run_monitor(self, connections, duration=0.2):
+        """
+        Run HeartbeatMonitor on connections for duration, every one silent
+        """
+        for connection in connections:
+            connection.latency.last_seen -= 1.0
+
+        monitor = heartbeat.HeartbeatMonitor(FakeNode(connections))
+        monitor.start()
+        time.sleep(duration)
+        monitor.stop()
+        monitor.join()
+
+    def test_silent_connection_is_stopped(self):
+        connection = FakeConnection("silent", reading_paused=False)
+        self.run_monitor([connection])
+        self.assertTrue(connection.stopped)
+
+    def test_paused_connection_is_kept(self):
+        paused = FakeConnection("paused", reading_paused=True)
+        self.run_monitor([paused])
+        self.assertFalse(paused.stopped)
+
+        # * Resumed, it get a whole timeout before it is silent again
+        self.assertLess(paused.latency.idle(), 0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import time
+import unittest
+
+from src.network import NetworkHandler, routing
+
+
+class RoutingTableTest(unittest.TestCase):
+    def test_partial_update_change_only_given_route(self):
+        table = routing.RoutingTable("a")
+        table.add_neighbour("b")
+        table.update_neighbour("b", {"c": 1, "d": 2})
+
+        changed = table.update_neighbour("b", {"e": 1}, full=False)
+        self.assertEqual(changed, {"e"})
+        self.assertEqual(table.distance("c"), 2)
+        self.assertEqual(table.distance("e"), 2)
+
+        # * Route sent as MAX_DISTANCE is withdrawn
+        changed = table.update_neighbour("b", {"c": routing.MAX_DISTANCE}, full=False)
+        self.assertEqual(changed, {"c"})
+        self.assertIsNone(table.next_hop("c"))
+        self.assertEqual(table.next_hop("d"), "b")
+
+    def test_advertisement_of_changed_route(self):
+        table = routing.RoutingTable("a")
+        table.add_neighbour("b")
+        table.add_neighbour("c")
+        table.update_neighbour("b", {"d": 1})
+
+        # * Split horizon, route through b is withdrawn from b only
+        self.assertEqual(table.advertisement("c", {"d"}), {"d": 2})
+        self.assertEqual(table.advertisement("b", {"d"}), {"d": routing.MAX_DISTANCE})
+
+        changed = table.remove_neighbour("b")
+        self.assertEqual(changed, {"b", "d"})
+        self.assertEqual(
+            table.advertisement("c", changed),
+            {"b": routing.MAX_DISTANCE, "d": routing.MAX_DISTANCE},
+        )
+
+
+class RoutedMessageTest(unittest.TestCase):
+    port = 22950
+
+    def start_handler(self, id):
+        """
+        Start NetworkHandler on loopback, routed message go to self.received
+
+        :return:        NetworkHandler that is running
+        """
+        handler = NetworkHandler(
+            "127.0.0.1",
+            RoutedMessageTest.port,
+            callback=self.callback,
+            id=id,
+            max_connection=4,
+        )
+        RoutedMessageTest.port += 1
+        handler.debug = False
+        handler.node.debug = False
+        handler.start()
+        self.addCleanup(handler.join)
+        self.addCleanup(handler.stop)
+        return handler
+
+    def callback(self, event_type, source_id, dest_id, data):
+        # * Routed message is handed to user as a node_message from source
+        if event_type == "node_message":
+            self.received.append((source_id, dest_id, data))
+
+    def wait_for(self, condition, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if condition():
+                return True
+            time.sleep(0.01)
+        return False
+
+    def test_route_learned_and_withdrawn_over_chain(self):
+        self.received = list()
+        a = self.start_handler("a")
+        b = self.start_handler("b")
+        c = self.start_handler("c")
+
+        # * a - b - c, a only reach c through b
+        a.connect_to_node("127.0.0.1", b.node.port)
+        b.connect_to_node("127.0.0.1", c.node.port)
+        self.assertTrue(self.wait_for(lambda: a.node.routing_table.distance("c") == 2))
+        self.assertTrue(self.wait_for(lambda: c.node.routing_table.distance("a") == 2))
+
+        a.send_to_node_with_id("c", "hello c")
+        self.assertTrue(self.wait_for(lambda: self.received))
+        self.assertEqual(self.received[0], ("a", "c", "hello c"))
+
+        # * c leave, b withdraw it route from a
+        c.stop()
+        table = a.node.routing_table
+        self.assertTrue(self.wait_for(lambda: table.next_hop("c") is None))
+
+
+if __name__ == "__main__":
+    unittest.main()